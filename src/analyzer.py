@@ -1,57 +1,64 @@
 import os
+import sys
+import time
 import logging
-import requests
+import multiprocessing
 from bs4 import BeautifulSoup
-from typing import Dict, List
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import chain
+from typing import Dict, Iterable, Iterator, List, Optional
 from urllib.parse import urlparse
 import json
 import re
+from .fetcher import Fetcher, ResponseTooLarge, get_default_fetcher
+from .inputs import iter_config_entries
+from .profiling import ConversionProfiler
+from .minify import estimate_minified_tokens, estimate_prompt_tokens
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class HTMLAnalyzer:
-    def __init__(self):
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        })
+    def __init__(self, fetcher: Optional[Fetcher] = None):
+        self.fetcher = fetcher or get_default_fetcher()
     
-    def analyze_url(self, url: str) -> Dict:
+    def analyze_url(self, url: str, max_body_size: Optional[int] = None) -> Dict:
         """Analyze HTML content and structure of a URL"""
         try:
-            html_content = self._fetch_content(url)
-            
-            # Pre-filter JSX content if detected
-            if '_jsx' in html_content or 'react' in html_content.lower():
-                html_content = self._filter_jsx(html_content)
-            
-            soup = BeautifulSoup(html_content, 'html.parser')
-            
-            analysis = {
-                'url': url,
-                'stats': self._get_content_stats(soup),
-                'tag_distribution': self._analyze_tag_distribution(soup),
-                'content_quality': self._assess_content_quality(soup),
-                'token_estimate': self._estimate_tokens(soup),
-                'recommendations': [],
-                'processing_strategy': None  # Will be filled below
-            }
-            
-            self._generate_recommendations(analysis)
-            analysis['processing_strategy'] = self.determine_processing_strategy(analysis)
-            return analysis
-            
+            return self.analyze_html(self._fetch_content(url, max_body_size), url)
+        except ResponseTooLarge:
+            # Not a failure: callers use this to switch to streaming
+            raise
         except Exception as e:
             logger.error(f"Analysis failed: {e}")
             raise
 
-    def _fetch_content(self, url: str) -> str:
+    def analyze_html(self, html_content: str, url: str) -> Dict:
+        """Analyze already-fetched HTML (no network access, so it can run in a worker process)"""
+        # Pre-filter JSX content if detected
+        if '_jsx' in html_content or 'react' in html_content.lower():
+            html_content = self._filter_jsx(html_content)
+        
+        soup = BeautifulSoup(html_content, 'html.parser')
+        
+        analysis = {
+            'url': url,
+            'stats': self._get_content_stats(soup),
+            'tag_distribution': self._analyze_tag_distribution(soup),
+            'content_quality': self._assess_content_quality(soup),
+            'token_estimate': self._estimate_tokens(soup, html_content),
+            'recommendations': [],
+            'processing_strategy': None  # Will be filled below
+        }
+        
+        self._generate_recommendations(analysis)
+        analysis['processing_strategy'] = self.determine_processing_strategy(analysis)
+        return analysis
+
+    def _fetch_content(self, url: str, max_body_size: Optional[int] = None) -> str:
         """Fetch HTML content from URL"""
-        response = self.session.get(url)
-        response.raise_for_status()
-        return response.text
+        return self.fetcher.fetch(url, max_body_size=max_body_size, source='analyzer').text
 
     def _filter_jsx(self, html_content: str) -> str:
         """Filter JSX/React specific content"""
@@ -123,14 +130,18 @@ class HTMLAnalyzer:
             'total_sections': len(headings)
         }
 
-    def _estimate_tokens(self, soup: BeautifulSoup) -> Dict:
+    def _estimate_tokens(self, soup: BeautifulSoup, html_content: str) -> Dict:
         """Estimate token count for content processing"""
         text = soup.get_text(strip=True)
         # Rough estimate: 1 token ≈ 4 characters
         estimated_tokens = len(text) // 4
+        # The drafting prompt carries markup, not just visible text; the minified size is
+        # estimated from this parse (conversion measures the real minified markup)
         return {
             'estimated_total_tokens': estimated_tokens,
-            'estimated_chunks_needed': (estimated_tokens // 2000) + 1  # GPT-4 context window
+            'estimated_chunks_needed': (estimated_tokens // 2000) + 1,  # GPT-4 context window
+            'estimated_prompt_tokens': estimate_prompt_tokens(html_content),
+            'estimated_minified_prompt_tokens': estimate_minified_tokens(soup)
         }
     
     def _detect_framework(self, soup: BeautifulSoup) -> str:
@@ -202,15 +213,161 @@ class HTMLAnalyzer:
         
         return strategy
 
+_process_analyzer: Optional[HTMLAnalyzer] = None
+
+
+def analyze_html(url: str, html_content: str) -> Dict:
+    """Analyze fetched HTML with a per-process analyzer (the process pool entry point)"""
+    global _process_analyzer
+    if _process_analyzer is None:
+        _process_analyzer = HTMLAnalyzer()
+    return _process_analyzer.analyze_html(html_content, url)
+
+
+def _bulk_error(url: str, error: Exception) -> Dict:
+    return {'url': url, 'error': f"{type(error).__name__}: {error}", 'too_large': isinstance(error, ResponseTooLarge)}
+
+
+def analyze_many(urls: Iterable[str], workers: Optional[int] = None, fetch_workers: int = 32,
+                 fetcher: Optional[Fetcher] = None, max_body_size: Optional[int] = None) -> Iterator[Dict]:
+    """Analyze many URLs, yielding one record per URL in completion order
+    
+    Pages are fetched on threads and parsed on a process pool, since the
+    BeautifulSoup passes are CPU-bound and hold the GIL. URLs are consumed
+    lazily and at most a few pages per worker wait to be parsed, so memory
+    stays bounded for site-sized lists. Failed URLs yield a record with 'error'.
+    """
+    fetcher = fetcher or get_default_fetcher()
+    workers = workers or os.cpu_count() or 1
+    max_pending = workers * 4
+    # Workers are started while fetch threads are running, which forking does not survive safely
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as executor:
+        pending = {}
+
+        def collect(return_when):
+            done, _ = wait(pending, return_when=return_when)
+            for future in done:
+                url = pending.pop(future)
+                try:
+                    yield future.result()
+                except Exception as e:
+                    logger.warning(f"Analysis failed for {url}: {e}")
+                    yield _bulk_error(url, e)
+
+        for url, result in fetcher.fetch_many(urls, max_workers=fetch_workers, max_body_size=max_body_size,
+                                              source='analyzer'):
+            if isinstance(result, Exception):
+                yield _bulk_error(url, result)
+                continue
+            if 'html' not in (result.content_type or 'html'):
+                yield {'url': url, 'error': f"Not HTML: {result.content_type}", 'too_large': False}
+                continue
+            pending[executor.submit(analyze_html, url, result.text)] = url
+            if len(pending) >= max_pending:
+                yield from collect(FIRST_COMPLETED)
+        while pending:
+            yield from collect(ALL_COMPLETED)
+
+
+class TriageSummary:
+    """Running totals over bulk analysis records"""
+
+    def __init__(self):
+        self.started = time.time()
+        self.pages = 0
+        self.failed = 0
+        self.too_large = 0
+        self.strategies: Dict[str, int] = {}
+        self.frameworks: Dict[str, int] = {}
+        self.tokens = {'estimated_total_tokens': 0, 'estimated_chunks_needed': 0,
+                       'estimated_prompt_tokens': 0, 'estimated_minified_prompt_tokens': 0}
+
+    def add(self, record: Dict):
+        self.pages += 1
+        if 'error' in record:
+            self.failed += 1
+            self.too_large += int(record.get('too_large', False))
+            return
+        strategy = record['processing_strategy']
+        name = strategy['chunking_method'] + ('+ocr' if strategy['use_ocr'] else '')
+        self.strategies[name] = self.strategies.get(name, 0) + 1
+        framework = record['content_quality']['framework_hints']
+        self.frameworks[framework] = self.frameworks.get(framework, 0) + 1
+        for key in self.tokens:
+            self.tokens[key] += record['token_estimate'][key]
+
+    def as_dict(self) -> Dict:
+        elapsed = time.time() - self.started
+        analyzed = self.pages - self.failed
+        return {
+            'pages': self.pages,
+            'analyzed': analyzed,
+            'failed': self.failed,
+            'too_large': self.too_large,
+            'strategies': dict(sorted(self.strategies.items(), key=lambda x: x[1], reverse=True)),
+            'frameworks': dict(sorted(self.frameworks.items(), key=lambda x: x[1], reverse=True)),
+            'tokens': self.tokens,
+            'mean_prompt_tokens': self.tokens['estimated_minified_prompt_tokens'] // analyzed if analyzed else 0,
+            'elapsed_seconds': round(elapsed, 2),
+            'pages_per_second': round(self.pages / elapsed, 2) if elapsed > 0 else 0.0,
+        }
+
+
+def run_bulk(urls: Iterable[str], output: Optional[str] = None, **kwargs) -> Dict:
+    """Write one JSONL analysis record per URL (to stdout without output) and return the summary"""
+    summary = TriageSummary()
+    out = open(output, 'w', encoding='utf-8') if output else sys.stdout
+    try:
+        for record in analyze_many(urls, **kwargs):
+            out.write(json.dumps(record) + '\n')
+            summary.add(record)
+            if summary.pages % 500 == 0:
+                logger.info(f"Analyzed {summary.pages} pages ({summary.failed} failed)")
+    finally:
+        if output:
+            out.close()
+    return summary.as_dict()
+
+
 def main():
+    """Main function to analyze one URL, or many in bulk"""
     import argparse
-    parser = argparse.ArgumentParser(description='Analyze HTML content of a URL')
-    parser.add_argument('url', help='URL to inspect')
-    parser.add_argument('--output', '-o', help='Output file for analysis')
+    parser = argparse.ArgumentParser(description='Analyze HTML content of a URL, or triage many URLs in bulk')
+    parser.add_argument('urls', nargs='*', metavar='url', help='URL(s) to inspect; more than one runs bulk mode')
+    parser.add_argument('--config', help='URL list to triage in bulk: YAML config, .txt or .jsonl (optionally .gz)')
+    parser.add_argument('--output', '-o', help='Output file for analysis (JSONL in bulk mode)')
+    parser.add_argument('--summary', help='Bulk mode: write the summary JSON here (default: <output>.summary.json)')
+    parser.add_argument('--workers', type=int, help='Bulk mode: parsing processes (default: one per core)')
+    parser.add_argument('--fetch-workers', type=int, default=32, help='Bulk mode: concurrent fetches (default: 32)')
+    parser.add_argument('--profile', action='store_true',
+                        help='Write a cProfile dump and collapsed stacks (bulk mode: the fetching process, not the parsers)')
+    parser.add_argument('--trace-memory', action='store_true',
+                        help='Write a tracemalloc top-N report (bulk mode: the fetching process, not the parsers)')
+    parser.add_argument('--profile-dir', default=os.path.join('output', 'profiles'),
+                        help='Directory for profiling output (default: output/profiles)')
     args = parser.parse_args()
+    profiler = ConversionProfiler(args.profile_dir, cpu=args.profile, memory=args.trace_memory)
+    
+    if args.config or len(args.urls) > 1:
+        urls = args.urls
+        if args.config:
+            urls = chain(urls, (url for _, url in iter_config_entries(args.config)))
+        # One report for the whole run; parsing happens in worker processes the profiler cannot see
+        with profiler.profile('bulk'):
+            summary = run_bulk(urls, args.output, workers=args.workers, fetch_workers=args.fetch_workers)
+        summary_path = args.summary or (f"{args.output}.summary.json" if args.output else None)
+        if summary_path:
+            with open(summary_path, 'w') as f:
+                json.dump(summary, f, indent=2)
+        logger.info(f"Triage summary: {json.dumps(summary)}")
+        return
+    if not args.urls:
+        parser.error('give a URL, several URLs or --config')
     
+    url = args.urls[0]
     analyzer = HTMLAnalyzer()
-    analysis = analyzer.analyze_url(args.url)
+    with profiler.profile(url):
+        analysis = analyzer.analyze_url(url)
     
     if args.output:
         with open(args.output, 'w') as f:
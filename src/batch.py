@@ -0,0 +1,519 @@
+"""
+Deferred Batch Conversion
+Runs the LLM drafting and validation stages of a config batch as bulk jobs
+instead of one blocking request per chunk. Each stage writes its rendered
+prompts to JSONL files in the OpenAI Batch API format, submits them, polls
+until they finish and resumes the pipeline from the results. All state lives
+in a work directory, so an interrupted run picks up where it stopped.
+Per-URL progress is appended to a journal and folded into state.json at the
+end of each phase, so a large batch is not rewritten once per URL. Finished
+pages go through the same output sink and search index as direct conversion.
+"""
+
+import os
+import json
+import time
+import logging
+import argparse
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional, Tuple
+from .metrics import metrics
+from . import deadlines
+from .deadlines import Deadline
+from .inputs import iter_config_entries
+from .sinks import FileSink, OutputSink, open_sink
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(message)s',
+    datefmt='%H:%M:%S'
+)
+logger = logging.getLogger(__name__)
+
+BATCH_ENDPOINT = '/v1/chat/completions'
+DEFAULT_MODEL = 'gpt-4o-mini'
+
+# Phases run in this order; the current one is recorded in state.json
+PHASES = ['prepare', 'draft', 'validate', 'finalize', 'done']
+
+TERMINAL_STATUSES = {'completed', 'failed', 'expired', 'cancelled'}
+
+
+def batch_request(custom_id: str, system: str, user: str, model: str = DEFAULT_MODEL) -> Dict:
+    """One line of a batch input file"""
+    return {
+        'custom_id': custom_id,
+        'method': 'POST',
+        'url': BATCH_ENDPOINT,
+        'body': {
+            'model': model,
+            'messages': [{'role': 'system', 'content': system}, {'role': 'user', 'content': user}],
+        },
+    }
+
+
+def read_results(path: str) -> Dict[str, Tuple[Optional[str], Optional[str]]]:
+    """Map custom_id to (completion text, error) from a batch output file"""
+    results = {}
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            response = record.get('response') or {}
+            body = response.get('body') or {}
+            if record.get('error') or response.get('status_code', 200) >= 400:
+                error = record.get('error') or body.get('error')
+                results[record['custom_id']] = (None, json.dumps(error))
+                continue
+            results[record['custom_id']] = (body['choices'][0]['message']['content'], None)
+    return results
+
+
+class BatchBackend(ABC):
+    """Interface for anything that runs a JSONL file of chat completion requests"""
+
+    @abstractmethod
+    def submit(self, input_path: str) -> str:
+        """Submit a batch input file and return its batch id"""
+
+    @abstractmethod
+    def status(self, batch_id: str) -> str:
+        """Return the batch status (validating, in_progress, completed, failed, expired, ...)"""
+
+    @abstractmethod
+    def download(self, batch_id: str, output_path: str):
+        """Write the results and per-request errors of a finished batch to output_path"""
+
+
+class OpenAIBatchBackend(BatchBackend):
+    """OpenAI Batch API: results within the completion window at a lower price per token"""
+
+    def __init__(self, client=None, completion_window: str = '24h'):
+        if client is None:
+            import openai
+            client = openai.Client(api_key=os.getenv("OPENAI_API_KEY"))
+        self.client = client
+        self.completion_window = completion_window
+
+    def submit(self, input_path: str) -> str:
+        with open(input_path, 'rb') as f:
+            input_file = self.client.files.create(file=f, purpose='batch')
+        batch = self.client.batches.create(input_file_id=input_file.id, endpoint=BATCH_ENDPOINT,
+                                           completion_window=self.completion_window)
+        return batch.id
+
+    def status(self, batch_id: str) -> str:
+        return self.client.batches.retrieve(batch_id).status
+
+    def download(self, batch_id: str, output_path: str):
+        batch = self.client.batches.retrieve(batch_id)
+        with open(output_path, 'wb') as f:
+            for file_id in (batch.output_file_id, batch.error_file_id):
+                if not file_id:
+                    continue
+                for line in self.client.files.content(file_id).content.splitlines():
+                    if not line.strip():
+                        continue
+                    # These requests bypass the instrumented client, so count their tokens here
+                    body = (json.loads(line).get('response') or {}).get('body') or {}
+                    usage, model = body.get('usage') or {}, body.get('model', 'unknown')
+                    metrics.inc('llm_requests', model=model)
+                    metrics.inc('prompt_tokens', usage.get('prompt_tokens', 0), model=model)
+                    metrics.inc('completion_tokens', usage.get('completion_tokens', 0), model=model)
+                    f.write(line + b'\n')
+
+
+class LocalBatchBackend(BatchBackend):
+    """Stand-in that runs a batch file through the regular chat completions API from a thread pool
+
+    Results are written in the Batch API output format, so the rest of the
+    pipeline is identical. Submission blocks until the file is done.
+    """
+
+    def __init__(self, client=None, max_workers: int = 8):
+        if client is None:
+            from .convert import openai_client
+            client = openai_client
+        self.client = client
+        self.max_workers = max_workers
+
+    def _output_path(self, input_path: str) -> str:
+        return f"{input_path}.local-results"
+
+    def _run(self, request: Dict) -> Dict:
+        try:
+            response = self.client.chat.completions.create(**request['body'])
+            return {'custom_id': request['custom_id'], 'error': None,
+                    'response': {'status_code': 200, 'body': response.model_dump()}}
+        except Exception as e:
+            return {'custom_id': request['custom_id'], 'response': None,
+                    'error': {'code': type(e).__name__, 'message': str(e)}}
+
+    def submit(self, input_path: str) -> str:
+        with open(input_path, encoding='utf-8') as f:
+            requests = [json.loads(line) for line in f if line.strip()]
+        output_path = self._output_path(input_path)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor, \
+                open(f"{output_path}.tmp", 'w', encoding='utf-8') as out:
+            for result in executor.map(self._run, requests):
+                out.write(json.dumps(result) + '\n')
+        os.replace(f"{output_path}.tmp", output_path)
+        return input_path
+
+    def status(self, batch_id: str) -> str:
+        # Nothing survives a restart except the results file itself
+        return 'completed' if os.path.exists(self._output_path(batch_id)) else 'expired'
+
+    def download(self, batch_id: str, output_path: str):
+        os.replace(self._output_path(batch_id), output_path)
+
+
+class BatchRun:
+    """A resumable deferred conversion of one config file"""
+
+    def __init__(self, work_dir: str, backend: BatchBackend, processor=None, model: str = DEFAULT_MODEL,
+                 poll_interval: float = 60.0, max_requests_per_file: int = 50000,
+                 url_timeout: Optional[float] = None, max_resubmits: int = 3,
+                 sink: Optional[OutputSink] = None, flush_every: int = 50):
+        self.work_dir = work_dir
+        self.backend = backend
+        self._processor = processor
+        self._sink = sink
+        # Completed pages are journaled in groups, each right after the sink is flushed
+        self.flush_every = flush_every
+        self._written: List[Tuple[int, str]] = []
+        self.model = model
+        self.poll_interval = poll_interval
+        self.max_requests_per_file = max_requests_per_file
+        # Times a batch that ends as failed, expired or cancelled is submitted again before
+        # its requests fall back to direct calls
+        self.max_resubmits = max_resubmits
+        # Budget for the synchronous stages of one URL (fetch, browser, vision, OCR)
+        self.url_timeout = url_timeout
+        self.state_path = os.path.join(work_dir, 'state.json')
+        self.journal_path = os.path.join(work_dir, 'pages.journal.jsonl')
+        self.pages_dir = os.path.join(work_dir, 'pages')
+        os.makedirs(self.pages_dir, exist_ok=True)
+        self.state = self._load_state()
+
+    @property
+    def processor(self):
+        if self._processor is None:
+            from .convert import ContentProcessor
+            self._processor = ContentProcessor()
+        return self._processor
+
+    @property
+    def sink(self) -> OutputSink:
+        if self._sink is None:
+            self._sink = FileSink(self.processor.output_dir)
+        return self._sink
+
+    def _load_state(self) -> Dict:
+        state = {'phase': 'prepare', 'config': None, 'prefix': 'doc', 'pages': {}, 'batches': {}, 'outputs': []}
+        if os.path.exists(self.state_path):
+            with open(self.state_path, encoding='utf-8') as f:
+                state = json.load(f)
+        if os.path.exists(self.journal_path):
+            # Replay the page updates made since state.json was last written
+            outputs = set(state['outputs'])
+            with open(self.journal_path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        break  # A line torn by a crash; the URL is simply processed again
+                    state['pages'][str(entry['number'])] = entry['status']
+                    if entry.get('output') and entry['output'] not in outputs:
+                        state['outputs'].append(entry['output'])
+                        outputs.add(entry['output'])
+        return state
+
+    def _save_state(self):
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f)
+        os.replace(tmp_path, self.state_path)
+        # Every journaled update is in state.json now
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+
+    def _set_page(self, number: int, status: str, output: Optional[str] = None):
+        """Record a page's status (and output file) in the state and append it to the journal"""
+        self.state['pages'][str(number)] = status
+        entry = {'number': number, 'status': status}
+        if output:
+            self.state['outputs'].append(output)
+            entry['output'] = output
+        with open(self.journal_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry) + '\n')
+
+    def _page_path(self, number: int) -> str:
+        return os.path.join(self.pages_dir, f"{number:05d}.json")
+
+    def _load_page(self, number: int) -> Dict:
+        with open(self._page_path(number), encoding='utf-8') as f:
+            return json.load(f)
+
+    def _save_page(self, page: Dict):
+        with open(self._page_path(page['number']), 'w', encoding='utf-8') as f:
+            json.dump(page, f)
+
+    def _pending_pages(self) -> Iterator[Dict]:
+        """Pages that were prepared and still need the batch stages, loaded one at a time"""
+        for number, status in sorted(self.state['pages'].items(), key=lambda item: int(item[0])):
+            if status == 'prepared':
+                yield self._load_page(int(number))
+
+    def run(self, config_file: Optional[str] = None, prefix: Optional[str] = None) -> List[str]:
+        """Run or resume every phase until the batch is done, returning the output files"""
+        if config_file and self.state['config'] is None:
+            self.state['config'] = config_file
+            self.state['prefix'] = prefix or self.state['prefix']
+            self._save_state()
+        if self.state['config'] is None:
+            raise ValueError(f"No config recorded in {self.work_dir}; pass --config to start a batch")
+
+        while self.state['phase'] != 'done':
+            phase = self.state['phase']
+            logger.info(f"Batch phase: {phase}")
+            getattr(self, f"_phase_{phase}")()
+            self.state['phase'] = PHASES[PHASES.index(phase) + 1]
+            self._save_state()
+
+        failed = [number for number, status in self.state['pages'].items() if status == 'failed']
+        if failed:
+            logger.error(f"Failed to process {len(failed)} URLs: {sorted(failed, key=int)}")
+        logger.info(f"Batch processing completed. Generated {len(self.state['outputs'])} files")
+        return self.state['outputs']
+
+    def _phase_prepare(self):
+        """Run the non-LLM stages (and vision) for every URL, then write the draft requests"""
+        for number, url in iter_config_entries(self.state['config']):
+            if str(number) in self.state['pages']:
+                continue
+            try:
+                with metrics.page(url) as page, deadlines.scope(Deadline(self.url_timeout, label=url)):
+                    prepared = self.processor.prepare(url, page)
+                    if prepared.get('large_page') or prepared.get('pdf'):
+                        # Streamed pages never hold their chunks and PDFs are drafted page group by
+                        # page group as they are read, so both are converted right away
+                        result = self.processor.convert_streamed(url, page, prepared)
+                if prepared.get('large_page') or prepared.get('pdf'):
+                    self._write_output(number, result)
+                else:
+                    prepared.pop('html')
+                    prepared.pop('screenshot')
+                    prepared['number'] = number
+                    self._save_page(prepared)
+                    self._set_page(number, 'prepared')
+            except Exception as e:
+                logger.error(f"Preparing URL {number}, {url} failed: {e}")
+                self._set_page(number, 'failed')
+        self._flush_outputs()
+        self.processor.save_boilerplate_indexes()
+
+        from .convert import DRAFT_SYSTEM_PROMPT, OCR_SYSTEM_PROMPT, draft_user_prompt, ocr_user_prompt
+
+        def draft_requests():
+            for page in self._pending_pages():
+                if page['ocr_text'] is not None:
+                    yield batch_request(f"{page['number']}-ocr-0", OCR_SYSTEM_PROMPT,
+                                        ocr_user_prompt(page['ocr_text'], page['visual_analysis']), self.model)
+                for i, chunk in enumerate(page['chunks']):
+                    yield batch_request(f"{page['number']}-draft-{i}", DRAFT_SYSTEM_PROMPT,
+                                        draft_user_prompt(chunk, page['visual_analysis']), self.model)
+
+        self._write_requests('draft', draft_requests())
+
+    def _phase_draft(self):
+        """Submit the draft requests, then assemble each page's draft and write the validation requests"""
+        results = self._run_batches('draft')
+        from .convert import VALIDATE_SYSTEM_PROMPT, generate_markdown_from_ocr, prevalidate_markdown, validate_user_prompt
+
+        def validate_requests():
+            for page in self._pending_pages():
+                if page['ocr_text'] is not None:
+                    markdown_draft = self._result(results, f"{page['number']}-ocr-0",
+                                                  lambda: generate_markdown_from_ocr(page['ocr_text'], page['visual_analysis']))
+                else:
+                    markdown_parts = []
+                    for i, chunk in enumerate(page['chunks']):
+                        custom_id = f"{page['number']}-draft-{i}"
+                        if results.get(custom_id, (None, None))[0] is not None:
+                            markdown_parts.append(results[custom_id][0])
+                        else:
+                            # Includes chunks that overflowed the context; split and draft them directly
+                            logger.warning(f"Drafting {custom_id} directly: {results.get(custom_id, (None, 'missing'))[1]}")
+                            markdown_parts.extend(self.processor.draft_chunk(chunk, page['visual_analysis']))
+                    markdown_draft = '\n\n'.join(filter(None, markdown_parts))
+                page['draft'] = prevalidate_markdown(markdown_draft)
+                self._save_page(page)
+                yield batch_request(f"{page['number']}-validate-0", VALIDATE_SYSTEM_PROMPT,
+                                    validate_user_prompt(page['draft']), self.model)
+
+        self._write_requests('validate', validate_requests())
+
+    def _phase_validate(self):
+        self._run_batches('validate')
+
+    def _phase_finalize(self):
+        """Apply title checks to the validated markdown and write the output files"""
+        from .convert import validate_document_title, validate_markdown_format
+        results = read_results(self._results_path('validate'))
+        for page in self._pending_pages():
+            try:
+                markdown = self._result(results, f"{page['number']}-validate-0",
+                                        lambda: validate_markdown_format(page['draft']))
+                markdown = validate_document_title(markdown, page['visual_analysis'], page['title'])
+                self._write_output(page['number'], {
+                    'url': page['url'],
+                    'markdown': markdown,
+                    'title': page['title'],
+                    'strategy': page['strategy'],
+                    'chunk_fingerprints': page['fingerprints'],
+                })
+            except Exception as e:
+                logger.error(f"Finalizing URL {page['number']}, {page['url']} failed: {e}")
+                self._set_page(page['number'], 'failed')
+        self._flush_outputs()
+
+    def _result(self, results: Dict, custom_id: str, fallback) -> str:
+        """The batch result for a request, or a direct call when the request failed in the batch"""
+        content, error = results.get(custom_id, (None, 'missing from batch output'))
+        if content is not None:
+            return content
+        logger.warning(f"Running {custom_id} directly: {error}")
+        metrics.inc('retries', stage='batch')
+        return fallback()
+
+    def _write_output(self, number: int, result: Dict):
+        """Write a finished page to the sink; it is marked complete once the sink is flushed"""
+        output = self.processor.write_result(result, number, self.state['prefix'], self.sink)
+        logger.info(f"Saved to: {output}")
+        self._written.append((number, output))
+        if len(self._written) >= self.flush_every:
+            self._flush_outputs()
+
+    def _flush_outputs(self):
+        """Flush the sink, then journal the pages written since the last flush as complete"""
+        self.sink.flush()
+        for number, output in self._written:
+            self._set_page(number, 'complete', output)
+        self._written.clear()
+
+    def _results_path(self, stage: str) -> str:
+        return os.path.join(self.work_dir, f"{stage}.results.jsonl")
+
+    def _write_requests(self, stage: str, requests: Iterator[Dict]):
+        """Write requests to one or more input files, each within the per-file request limit"""
+        files = []
+        out = None
+        count = 0
+        for request in requests:
+            if out is None or count >= self.max_requests_per_file:
+                if out:
+                    out.close()
+                files.append(os.path.join(self.work_dir, f"{stage}-{len(files):03d}.jsonl"))
+                out = open(files[-1], 'w', encoding='utf-8')
+                count = 0
+            out.write(json.dumps(request) + '\n')
+            count += 1
+        if out:
+            out.close()
+        self.state['batches'][stage] = [{'input': path, 'id': None, 'status': None} for path in files]
+        logger.info(f"Wrote {len(files)} {stage} batch files")
+
+    def _run_batches(self, stage: str) -> Dict[str, Tuple[Optional[str], Optional[str]]]:
+        """Submit, poll and download every batch file of a stage, resuming where a previous run stopped
+
+        A batch that ends as failed, expired or cancelled is resubmitted after
+        poll_interval, up to max_resubmits times. After that it is abandoned and
+        its requests are missing from the results, so they run as direct calls.
+        """
+        results_path = self._results_path(stage)
+        for batch in self.state['batches'].get(stage, []):
+            while batch['status'] not in ('downloaded', 'abandoned'):
+                if batch['id'] is None or batch['status'] in ('failed', 'expired', 'cancelled'):
+                    if batch.get('submits', 0) > self.max_resubmits:
+                        logger.error(f"Batch {batch['input']} ended as {batch['status']} "
+                                     f"{batch['submits']} times; running its requests directly")
+                        batch['status'] = 'abandoned'
+                        self._save_state()
+                        break
+                    with metrics.stage('batch_submit', batch=stage):
+                        batch['id'] = self.backend.submit(batch['input'])
+                    batch['submits'] = batch.get('submits', 0) + 1
+                    batch['status'] = 'submitted'
+                    logger.info(f"Submitted {batch['input']} as {batch['id']}")
+                    self._save_state()
+                status = self.backend.status(batch['id'])
+                if status == 'completed':
+                    part_path = f"{batch['input']}.results"
+                    self.backend.download(batch['id'], part_path)
+                    batch['status'] = 'downloaded'
+                elif status in TERMINAL_STATUSES:
+                    batch['status'] = status
+                    if batch.get('submits', 1) <= self.max_resubmits:
+                        logger.warning(f"Batch {batch['id']} ended as {status}; "
+                                       f"resubmitting in {self.poll_interval:.0f}s")
+                        with metrics.stage('batch_wait', batch=stage):
+                            time.sleep(self.poll_interval)
+                else:
+                    logger.info(f"Batch {batch['id']} is {status}; checking again in {self.poll_interval:.0f}s")
+                    with metrics.stage('batch_wait', batch=stage):
+                        time.sleep(self.poll_interval)
+                self._save_state()
+
+        with open(results_path, 'w', encoding='utf-8') as out:
+            for batch in self.state['batches'].get(stage, []):
+                if batch['status'] == 'abandoned':
+                    continue
+                with open(f"{batch['input']}.results", encoding='utf-8') as f:
+                    for line in f:
+                        out.write(line)
+        return read_results(results_path)
+
+
+def main():
+    """Main function to run or resume a deferred batch conversion"""
+    parser = argparse.ArgumentParser(description='Convert a config batch with deferred (bulk) LLM requests')
+    parser.add_argument('--work-dir', required=True, help='Directory holding the batch state; reuse it to resume')
+    parser.add_argument('--config', help='URL list to process: YAML config, .txt or .jsonl (first run only)')
+    parser.add_argument('--prefix', default='doc', help='Prefix for output filenames (default: doc)')
+    parser.add_argument('--backend', choices=['openai', 'local'], default='openai',
+                        help='openai: Batch API; local: concurrent regular requests (default: openai)')
+    parser.add_argument('--model', default=DEFAULT_MODEL, help=f'Model for drafting and validation (default: {DEFAULT_MODEL})')
+    parser.add_argument('--poll-interval', type=float, default=60.0, help='Seconds between status checks (default: 60)')
+    parser.add_argument('--max-resubmits', type=int, default=3,
+                        help='Resubmissions of a failed or expired batch before its requests run directly (default: 3)')
+    parser.add_argument('--metrics-json', help='Write a JSON metrics summary to this file')
+    parser.add_argument('--url-timeout', type=float,
+                        help='Seconds the prepare stages of one URL may take before the URL is marked failed')
+    parser.add_argument('--output',
+                        help='Output directory, or a single archive: *.db (SQLite) or *.jsonl[.gz] (default: output)')
+    parser.add_argument('--search-index', help='SQLite full-text index to update with each converted page')
+    args = parser.parse_args()
+
+    from .convert import ContentProcessor
+    processor = ContentProcessor()
+    sink = open_sink(args.output, processor.output_dir)
+    if args.search_index:
+        from .search_index import SearchIndex
+        processor.search_index = SearchIndex(args.search_index)
+    backend = OpenAIBatchBackend() if args.backend == 'openai' else LocalBatchBackend()
+    run = BatchRun(args.work_dir, backend, processor=processor, model=args.model, poll_interval=args.poll_interval,
+                   url_timeout=args.url_timeout, max_resubmits=args.max_resubmits, sink=sink)
+    try:
+        run.run(args.config, args.prefix)
+    finally:
+        sink.close()
+        if args.metrics_json:
+            metrics.write_json(args.metrics_json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,545 @@
+"""
+Offline Benchmark Suite
+Measures throughput and latency of the analyzer, the chunker, the combiner and
+the full conversion pipeline without touching the network, Chrome or OpenAI.
+A fixture corpus is served from a local HTTP server and the LLM calls, the
+browser capture and Tesseract are replaced with deterministic local fakes.
+"""
+
+import os
+import io
+import re
+import gc
+import sys
+import html
+import json
+import time
+import random
+import shutil
+import platform
+import logging
+import argparse
+import tempfile
+import threading
+import statistics
+import subprocess
+import tracemalloc
+from contextlib import contextmanager, ExitStack
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterator, List, Optional
+from unittest import mock
+
+# The OpenAI client refuses to construct without a key; the benchmarks never call it
+os.environ.setdefault('OPENAI_API_KEY', 'benchmark-offline')
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(message)s',
+    datefmt='%H:%M:%S'
+)
+logger = logging.getLogger(__name__)
+
+DEMO_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'archive', 'demo')
+
+
+def _markdown_to_html(markdown_text: str, title: str) -> str:
+    """Render a markdown document into a plausible documentation page"""
+    body = []
+    in_code = False
+    in_list = False
+    for line in markdown_text.splitlines():
+        if line.startswith('```'):
+            body.append('</code></pre>' if in_code else f'<pre><code class="language-{line[3:].strip() or "text"}">')
+            in_code = not in_code
+            continue
+        if in_code:
+            body.append(html.escape(line))
+            continue
+        if in_list and not re.match(r'\s*[-*+] ', line):
+            body.append('</ul>')
+            in_list = False
+        heading = re.match(r'(#{1,6}) (.*)', line)
+        if heading:
+            level = len(heading.group(1))
+            body.append(f'<h{level}>{html.escape(heading.group(2))}</h{level}>')
+        elif re.match(r'\s*[-*+] ', line):
+            if not in_list:
+                body.append('<ul>')
+                in_list = True
+            body.append(f'<li>{html.escape(line.strip()[2:])}</li>')
+        elif line.strip():
+            body.append(f'<p>{html.escape(line)}</p>')
+    if in_list:
+        body.append('</ul>')
+    return _page(title, '\n'.join(body))
+
+
+def _page(title: str, main: str, head_extra: str = '', nav_items: int = 40) -> str:
+    nav = '\n'.join(f'<li><a class="nav-link sidebar-item" href="/docs/page-{i}">Section {i}</a></li>'
+                    for i in range(nav_items))
+    return f"""<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>{html.escape(title)}</title>
+<style>body {{ font-family: sans-serif; }} .sidebar {{ width: 240px; }}</style>
+{head_extra}
+</head>
+<body>
+<header class="site-header"><a href="/">Docs</a><nav><a href="/guides">Guides</a> <a href="/api">API</a></nav></header>
+<aside class="sidebar"><ul>
+{nav}
+</ul></aside>
+<main class="markdown">
+{main}
+</main>
+<footer class="site-footer"><p>Copyright Example Inc.</p></footer>
+</body>
+</html>
+"""
+
+
+def _paragraphs(rng: random.Random, count: int) -> str:
+    words = ('request model token stream batch latency markdown document section config '
+             'parameter response client server cache index page render layout').split()
+    return '\n'.join(
+        '<p>' + ' '.join(rng.choice(words) for _ in range(rng.randint(30, 80))) + '.</p>'
+        for _ in range(count))
+
+
+def build_corpus(huge_sections: int = 2000) -> Dict[str, str]:
+    """Build the fixture corpus keyed by URL path"""
+    rng = random.Random(42)
+    corpus = {
+        '/small.html': _page('Small Page', '<h1>Small Page</h1>\n' + _paragraphs(rng, 3), nav_items=5),
+    }
+
+    sections = []
+    for i in range(huge_sections):
+        sections.append(f'<h2>Section {i}</h2>\n{_paragraphs(rng, 3)}\n'
+                        f'<table><tr><th>Key</th><th>Value</th></tr><tr><td>k{i}</td><td>{i}</td></tr></table>')
+    corpus['/huge.html'] = _page('Huge Page', '<h1>Huge Page</h1>\n' + '\n'.join(sections))
+
+    scripts = '\n'.join(
+        f'<script>function Component{i}(props) {{ return _jsx("div", {{ className: "c{i}", children: props.x }}); }}</script>'
+        for i in range(300))
+    react_main = '\n'.join(
+        f'<div className="card card-{i}" data-reactroot=""><h3 className="title">Card {i}</h3>'
+        f'<div className="body">{_paragraphs(rng, 1)}</div></div>'
+        for i in range(200))
+    corpus['/react.html'] = _page('React Page', '<h1>React Page</h1>\n' + react_main,
+                                  head_extra=scripts + '\n<script src="/static/react.production.min.js"></script>')
+
+    methods = []
+    for i in range(40):
+        methods.append(
+            f'<h2>client.method_{i}()</h2>\n<p>Calls endpoint {i}.</p>\n<h3>Parameters</h3>\n'
+            f'<ul><li><code>name</code> (str): resource name</li><li><code>limit</code> (int): page size</li></ul>\n'
+            f'<h3>Returns</h3>\n<p>A response object.</p>\n<h3>Examples</h3>\n'
+            f'<pre><code class="language-python">client.method_{i}(name="x", limit=10)</code></pre>')
+    corpus['/api.html'] = _page('API Reference', '<h1>API Reference</h1>\n' + '\n'.join(methods))
+
+    if os.path.isdir(DEMO_DIR):
+        for filename in sorted(os.listdir(DEMO_DIR)):
+            if filename.endswith('.md'):
+                with open(os.path.join(DEMO_DIR, filename), encoding='utf-8') as f:
+                    name = os.path.splitext(filename)[0]
+                    corpus[f'/demo/{name}.html'] = _markdown_to_html(f.read(), name.replace('_', ' '))
+    return corpus
+
+
+class FixtureServer:
+    """Serves an in-memory corpus over HTTP on an ephemeral local port"""
+
+    def __init__(self, corpus: Dict[str, str]):
+        self.corpus = {path: body.encode('utf-8') for path, body in corpus.items()}
+        corpus_bytes = self.corpus
+
+        class FixtureHandler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                body = corpus_bytes.get(self.path.split('?', 1)[0])
+                if body is None:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        class QuietServer(ThreadingHTTPServer):
+            def handle_error(self, request, client_address):
+                pass  # Clients aborting oversized downloads is expected
+
+        self.server = QuietServer(('127.0.0.1', 0), FixtureHandler)
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def url(self, path: str) -> str:
+        return self.base_url + path
+
+    def __enter__(self) -> 'FixtureServer':
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class FakeLLM:
+    """Deterministic stand-in for the OpenAI-backed ell functions in convert.py"""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _call(self, prompt_chars: int, completion: str) -> str:
+        from .metrics import metrics
+        with self._lock:
+            self.calls += 1
+        metrics.inc('llm_requests', model='fake')
+        metrics.inc('prompt_tokens', prompt_chars // 4, model='fake')
+        metrics.inc('completion_tokens', len(completion) // 4, model='fake')
+        if self.latency:
+            time.sleep(self.latency)
+        return completion
+
+    def analyze_page_content(self, screenshot, *args, **kwargs) -> str:
+        analysis = {
+            'main_content': {'top': 0.1, 'bottom': 0.95, 'left': 0.2, 'right': 0.95},
+            'hierarchy': [{'type': 'heading', 'level': 1, 'position': 0.1}],
+            'visual_elements': [],
+            'exclude': [{'type': 'navigation', 'position': 0.0}, {'type': 'sidebar', 'position': 0.2}]
+        }
+        return self._call(1000, json.dumps(analysis))
+
+    def generate_markdown_draft(self, html_content: str, visual_analysis, *args, **kwargs) -> str:
+        from markdownify import markdownify as md
+        return self._call(len(html_content) + len(str(visual_analysis)), md(html_content).strip())
+
+    def generate_markdown_from_ocr(self, ocr_text: str, visual_analysis, *args, **kwargs) -> str:
+        return self._call(len(ocr_text) + len(str(visual_analysis)), ocr_text.strip())
+
+    def generate_markdown_from_pdf(self, pdf_markdown: str, pages: str, *args, **kwargs) -> str:
+        return self._call(len(pdf_markdown), pdf_markdown.strip())
+
+    def validate_markdown_format(self, content: str, *args, **kwargs) -> str:
+        return self._call(len(content), re.sub(r'\n{3,}', '\n\n', content).strip() + '\n')
+
+
+class FakeVisualScraper:
+    """Returns a synthetic screenshot instead of driving Chrome"""
+
+    def __init__(self, output_dir: str, size=(1280, 2000), latency: float = 0.0):
+        from PIL import Image, ImageDraw
+        self.output_dir = output_dir
+        # Seconds each capture sleeps, standing in for the browser's page load
+        self.latency = latency
+        image = Image.new('RGB', size, 'white')
+        draw = ImageDraw.Draw(image)
+        for y in range(120, size[1] - 100, 60):
+            draw.rectangle([300, y, 1180, y + 24], fill=(40, 40, 40))
+        buffer = io.BytesIO()
+        image.save(buffer, format='PNG')
+        self.png = buffer.getvalue()
+
+    def capture(self, url: str) -> bytes:
+        return self.png
+
+    def capture_with_layout(self, url: str, record_layout: bool = True):
+        if self.latency:
+            time.sleep(self.latency)
+        # Matches the fixture template: <html> > <body> > [header, aside, main, footer]
+        layout = {
+            'viewport': {'width': 1280, 'height': 2000},
+            'elements': [
+                {'path': [1], 'tag': 'body', 'id': None, 'rect': [0, 0, 1280, 2000]},
+                {'path': [1, 0], 'tag': 'header', 'id': None, 'rect': [0, 0, 1280, 80]},
+                {'path': [1, 1], 'tag': 'aside', 'id': None, 'rect': [0, 80, 260, 1920]},
+                {'path': [1, 2], 'tag': 'main', 'id': None, 'rect': [300, 100, 880, 1800]},
+            ]
+        }
+        return self.png, layout if record_layout else None
+
+    def save_screenshot(self, screenshot_data: bytes, url: str) -> str:
+        path = os.path.join(self.output_dir, 'screenshot.png')
+        with open(path, 'wb') as f:
+            f.write(screenshot_data)
+        return path
+
+
+@contextmanager
+def offline_pipeline(llm_latency: float = 0.0) -> Iterator[FakeLLM]:
+    """Patch convert.py so conversions run fully offline"""
+    from . import convert
+    fake = FakeLLM(llm_latency)
+    with ExitStack() as stack:
+        for name in ('analyze_page_content', 'generate_markdown_draft',
+                     'generate_markdown_from_ocr', 'generate_markdown_from_pdf', 'validate_markdown_format'):
+            stack.enter_context(mock.patch.object(convert, name, getattr(fake, name)))
+        stack.enter_context(mock.patch.object(
+            convert.pytesseract, 'image_to_string', lambda image, *a, **k: 'Fake OCR text\n' * 50))
+        yield fake
+
+
+def _stats(timings: List[float], bytes_processed: int = 0) -> Dict:
+    ordered = sorted(timings)
+    result = {
+        'runs': len(ordered),
+        'mean': statistics.fmean(ordered),
+        'median': statistics.median(ordered),
+        'p95': ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))],
+        'min': ordered[0],
+        'max': ordered[-1],
+        'ops_per_sec': len(ordered) / sum(ordered) if sum(ordered) else 0,
+    }
+    if bytes_processed:
+        result['mb_per_sec'] = bytes_processed * len(ordered) / sum(ordered) / 1e6 if sum(ordered) else 0
+    return result
+
+
+def measure(fn: Callable[[], object], iterations: int, warmup: int = 1,
+            trace_memory: bool = False, bytes_processed: int = 0) -> Dict:
+    """Time fn over several iterations, optionally recording peak traced memory"""
+    for _ in range(warmup):
+        fn()
+    gc.collect()
+    timings = []
+    peak = 0
+    for _ in range(iterations):
+        if trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+        if trace_memory:
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+    result = _stats(timings, bytes_processed)
+    if trace_memory:
+        result['peak_memory_bytes'] = peak
+    return result
+
+
+class BenchmarkContext:
+    """Everything a benchmark needs: the server, the corpus and run options"""
+
+    def __init__(self, server: FixtureServer, corpus: Dict[str, str], iterations: int,
+                 llm_latency: float, trace_memory: bool, work_dir: str, capture_latency: float = 0.0):
+        self.server = server
+        self.corpus = corpus
+        self.iterations = iterations
+        self.llm_latency = llm_latency
+        self.capture_latency = capture_latency
+        self.trace_memory = trace_memory
+        self.work_dir = work_dir
+
+
+def bench_analyze_url(ctx: BenchmarkContext) -> Dict[str, Dict]:
+    from .analyzer import HTMLAnalyzer
+    analyzer = HTMLAnalyzer()
+    return {path: measure(lambda: analyzer.analyze_url(ctx.server.url(path)), ctx.iterations,
+                          trace_memory=ctx.trace_memory, bytes_processed=len(body))
+            for path, body in ctx.corpus.items()}
+
+
+def bench_analyze_bulk(ctx: BenchmarkContext) -> Dict[str, Dict]:
+    from .analyzer import analyze_many
+    urls = [ctx.server.url(path) for path in ctx.corpus] * 10
+    total_bytes = sum(len(body) for body in ctx.corpus.values()) * 10
+
+    def analyze_all(workers: int):
+        for record in analyze_many(urls, workers=workers):
+            if 'error' in record:
+                raise RuntimeError(record['error'])
+
+    cores = os.cpu_count() or 1
+    return {f'{len(urls)}_urls_{workers}_workers': measure(lambda: analyze_all(workers), ctx.iterations,
+                                                           trace_memory=ctx.trace_memory,
+                                                           bytes_processed=total_bytes)
+            for workers in sorted({1, cores})}
+
+
+def bench_fetch_many(ctx: BenchmarkContext) -> Dict[str, Dict]:
+    from .fetcher import Fetcher
+    fetcher = Fetcher()
+    urls = [ctx.server.url(path) for path in ctx.corpus] * 20
+    total_bytes = sum(len(body) for body in ctx.corpus.values()) * 20
+
+    def fetch_all():
+        for url, result in fetcher.fetch_many(urls, max_workers=16):
+            if isinstance(result, Exception):
+                raise result
+
+    results = {f'{len(urls)}_urls': measure(fetch_all, ctx.iterations, trace_memory=ctx.trace_memory,
+                                            bytes_processed=total_bytes)}
+    fetcher.close()
+    return results
+
+
+def bench_filter_and_chunk(ctx: BenchmarkContext) -> Dict[str, Dict]:
+    from .convert import filter_and_chunk_content
+    results = {}
+    for method in ('size', 'content'):
+        for path, body in ctx.corpus.items():
+            key = path if method == 'size' else f"{path} ({method})"
+            results[key] = measure(lambda: filter_and_chunk_content(body, method=method), ctx.iterations,
+                                   trace_memory=ctx.trace_memory, bytes_processed=len(body))
+    return results
+
+
+def bench_combiner(ctx: BenchmarkContext) -> Dict[str, Dict]:
+    from markdownify import markdownify as md
+    from .combine import MarkdownCombiner
+    input_dir = os.path.join(ctx.work_dir, 'combine')
+    os.makedirs(input_dir, exist_ok=True)
+    documents = [md(body) for body in ctx.corpus.values()]
+    for i in range(200):
+        with open(os.path.join(input_dir, f'bench-{i:03d}.md'), 'w', encoding='utf-8') as f:
+            f.write(documents[i % len(documents)])
+    total_bytes = sum(os.path.getsize(os.path.join(input_dir, name)) for name in os.listdir(input_dir))
+    combiner = MarkdownCombiner(input_dir=input_dir)
+    output_file = os.path.join(ctx.work_dir, 'combined.md')
+    return {'200_files': measure(lambda: combiner.process('bench', output_file), ctx.iterations,
+                                 trace_memory=ctx.trace_memory, bytes_processed=total_bytes)}
+
+
+def bench_process_url(ctx: BenchmarkContext) -> Dict[str, Dict]:
+    from .convert import ContentProcessor
+    results = {}
+    with offline_pipeline(ctx.llm_latency):
+        processor = ContentProcessor()
+        processor.visual_scraper = FakeVisualScraper(ctx.work_dir, latency=ctx.capture_latency)
+        for path, body in ctx.corpus.items():
+            results[path] = measure(lambda: processor.process_url(ctx.server.url(path)), ctx.iterations,
+                                    trace_memory=ctx.trace_memory, bytes_processed=len(body))
+    return results
+
+
+def bench_large_page(ctx: BenchmarkContext) -> Dict[str, Dict]:
+    """Peak memory of converting a page above the streaming threshold, streamed and parsed whole"""
+    from .convert import ContentProcessor
+    page = build_corpus(huge_sections=6000)['/huge.html']
+    results = {}
+    with FixtureServer({'/large.html': page}) as server, offline_pipeline(ctx.llm_latency):
+        processor = ContentProcessor()
+        processor.visual_scraper = FakeVisualScraper(ctx.work_dir, latency=ctx.capture_latency)
+        url = server.url('/large.html')
+        for mode, threshold in (('streamed', 5 * 1024 * 1024), ('in_memory', 64 * 1024 * 1024)):
+            processor.large_page_threshold = threshold
+            # Memory is the point of this benchmark, so it is always traced
+            results[mode] = measure(lambda: processor.process_url(url), ctx.iterations, warmup=0,
+                                    trace_memory=True, bytes_processed=len(page))
+    return results
+
+
+BENCHMARKS: Dict[str, Callable[[BenchmarkContext], Dict[str, Dict]]] = {
+    'analyze_url': bench_analyze_url,
+    'analyze_bulk': bench_analyze_bulk,
+    'fetch_many': bench_fetch_many,
+    'filter_and_chunk': bench_filter_and_chunk,
+    'combiner': bench_combiner,
+    'process_url': bench_process_url,
+    'large_page': bench_large_page,
+}
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True, cwd=os.path.dirname(DEMO_DIR)).stdout.strip()
+    except Exception:
+        return None
+
+
+def run_benchmarks(names: List[str], iterations: int = 5, llm_latency: float = 0.0,
+                   trace_memory: bool = False, capture_latency: float = 0.0) -> Dict:
+    """Run the selected benchmarks and return a results document"""
+    corpus = build_corpus()
+    work_dir = tempfile.mkdtemp(prefix='webtomd-bench-')
+    results = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'git_revision': _git_revision(),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'iterations': iterations,
+            'llm_latency': llm_latency,
+            'capture_latency': capture_latency,
+            'corpus': {path: len(body) for path, body in corpus.items()},
+        },
+        'benchmarks': {}
+    }
+    try:
+        with FixtureServer(corpus) as server:
+            ctx = BenchmarkContext(server, corpus, iterations, llm_latency, trace_memory, work_dir, capture_latency)
+            for name in names:
+                logger.info(f"Running benchmark: {name}")
+                results['benchmarks'][name] = BENCHMARKS[name](ctx)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+
+def compare_results(current: Dict, baseline: Dict) -> List[str]:
+    """Describe the change in median latency for every case present in both runs"""
+    lines = [f"{'benchmark':<40} {'baseline':>10} {'current':>10} {'change':>8}"]
+    for name, cases in current['benchmarks'].items():
+        for case, stats in cases.items():
+            before = baseline.get('benchmarks', {}).get(name, {}).get(case)
+            if not before:
+                continue
+            change = (stats['median'] - before['median']) / before['median'] * 100 if before['median'] else 0
+            lines.append(f"{name + ' ' + case:<40} {before['median'] * 1000:>8.2f}ms "
+                         f"{stats['median'] * 1000:>8.2f}ms {change:>+7.1f}%")
+    return lines
+
+
+def main():
+    """Main function to run the benchmarks"""
+    parser = argparse.ArgumentParser(description='Run the offline benchmark suite')
+    parser.add_argument('--only', help=f"Comma-separated benchmarks to run ({', '.join(BENCHMARKS)})")
+    parser.add_argument('--iterations', type=int, default=5, help='Timed iterations per case (default: 5)')
+    parser.add_argument('--llm-latency', type=float, default=0.0,
+                        help='Seconds each fake LLM call sleeps (default: 0)')
+    parser.add_argument('--capture-latency', type=float, default=0.0,
+                        help='Seconds each fake browser capture sleeps (default: 0)')
+    parser.add_argument('--trace-memory', action='store_true', help='Record peak traced memory per case')
+    parser.add_argument('--output', help='Results file (default: output/benchmarks/<timestamp>.json)')
+    parser.add_argument('--compare', help='Previous results file to compare against')
+    args = parser.parse_args()
+
+    names = args.only.split(',') if args.only else list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"Unknown benchmarks: {', '.join(unknown)}")
+
+    results = run_benchmarks(names, args.iterations, args.llm_latency, args.trace_memory, args.capture_latency)
+
+    output = args.output or os.path.join('output', 'benchmarks', time.strftime('%Y%m%d-%H%M%S') + '.json')
+    if os.path.dirname(output):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    logger.info(f"Results written to {output}")
+
+    for name, cases in results['benchmarks'].items():
+        for case, stats in cases.items():
+            logger.info(f"{name} {case}: median {stats['median'] * 1000:.2f}ms, "
+                        f"p95 {stats['p95'] * 1000:.2f}ms, {stats['ops_per_sec']:.1f} ops/s")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        print('\n'.join(compare_results(results, baseline)))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+"""
+Cross-Page Boilerplate Index
+Hashes DOM subtrees (tag, normalized text and child structure, ignoring
+attributes) across the pages of a site. Blocks that repeat on a large share of
+pages, such as the shared header, sidebar navigation and footer, are treated
+as template and stripped before chunking and drafting. Conversions record
+each page's blocks as they go, from the HTML they already fetched; the index
+is stored as JSON per host so later runs of the same site can reuse it.
+"""
+
+import os
+import re
+import json
+import hashlib
+import logging
+import argparse
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from urllib.parse import urlparse
+from bs4 import BeautifulSoup
+from bs4.element import NavigableString, Tag
+from .fetcher import Fetcher, get_default_fetcher
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION = 1
+
+# Pages a host's index needs before it strips anything
+MIN_PAGES = 3
+
+# Elements that can be a template block; headings, paragraphs and code are never stripped on their own
+CANDIDATE_TAGS = {'nav', 'header', 'footer', 'aside', 'div', 'section', 'ul', 'ol', 'table', 'form', 'dl'}
+
+# Never stripped, even if identical across pages
+PROTECTED_TAGS = {'html', 'body', 'head', 'main', 'article', 'title', 'h1'}
+
+IGNORED_TAGS = {'script', 'style', 'noscript', 'template'}
+
+
+def _normalize_text(text: str) -> str:
+    return re.sub(r'\s+', ' ', text).strip().lower()
+
+
+def hash_blocks(soup: BeautifulSoup, min_text: int = 40) -> List[Tuple[str, Tag]]:
+    """Return (hash, element) for every candidate block, innermost first
+
+    Each subtree is hashed once from its children's hashes (post-order, without
+    recursion so deeply nested documents are fine).
+    """
+    blocks = []
+    results: Dict[int, Tuple[str, int, bool]] = {}
+    root = soup.find('html') or soup
+    stack: List[Tuple[Tag, bool]] = [(root, False)]
+    while stack:
+        tag, visited = stack.pop()
+        if not visited:
+            stack.append((tag, True))
+            stack.extend((child, False) for child in reversed(list(tag.children))
+                         if isinstance(child, Tag) and child.name not in IGNORED_TAGS)
+            continue
+
+        digest = hashlib.sha1((tag.name or '').encode('utf-8'))
+        text_length = 0
+        protected = tag.name in PROTECTED_TAGS
+        for child in tag.children:
+            if isinstance(child, Tag):
+                if child.name in IGNORED_TAGS:
+                    continue
+                child_hash, child_length, child_protected = results.pop(id(child))
+                digest.update(b'<' + child_hash.encode('ascii'))
+                text_length += child_length
+                protected = protected or child_protected
+            elif type(child) is NavigableString:
+                text = _normalize_text(child)
+                if text:
+                    digest.update(b'"' + text.encode('utf-8'))
+                    text_length += len(text)
+        block_hash = digest.hexdigest()[:20]
+        if tag.name in CANDIDATE_TAGS and text_length >= min_text and not protected:
+            blocks.append((block_hash, tag))
+        results[id(tag)] = (block_hash, text_length, protected)
+    return blocks
+
+
+class BoilerplateIndex:
+    """Per-site counts of how many pages each block hash appears on"""
+
+    def __init__(self, path: Optional[str] = None, threshold: float = 0.5,
+                 min_pages: int = MIN_PAGES, min_text: int = 40):
+        self.path = path
+        self.threshold = threshold
+        self.min_pages = min_pages
+        self.min_text = min_text
+        self.counts: Dict[str, int] = {}
+        self.pages: Set[str] = set()
+        # Pages were observed since the index was loaded or saved
+        self.changed = False
+        self._template: Optional[Set[str]] = None
+
+    @classmethod
+    def load(cls, path: str, **kwargs) -> 'BoilerplateIndex':
+        """Load an index from disk, or start an empty one at that path"""
+        index = cls(path, **kwargs)
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == INDEX_VERSION:
+                index.counts = data['counts']
+                index.pages = set(data['pages'])
+            else:
+                logger.warning(f"Ignoring boilerplate index with unknown version: {path}")
+        return index
+
+    def save(self):
+        """Write the index to its path"""
+        if not self.path:
+            raise ValueError("Boilerplate index has no path to save to")
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': INDEX_VERSION, 'pages': sorted(self.pages), 'counts': self.counts}, f)
+        os.replace(tmp_path, self.path)
+        self.changed = False
+
+    @property
+    def ready(self) -> bool:
+        """Whether enough pages have been seen for the counts to mean anything"""
+        return len(self.pages) >= self.min_pages
+
+    def observe(self, url: str, html_content: str) -> bool:
+        """Count the blocks of one page; pages already in the index are skipped"""
+        if url in self.pages:
+            return False
+        soup = BeautifulSoup(html_content, 'html.parser')
+        for block_hash in {block_hash for block_hash, _ in hash_blocks(soup, self.min_text)}:
+            self.counts[block_hash] = self.counts.get(block_hash, 0) + 1
+        self.pages.add(url)
+        self.changed = True
+        self._template = None
+        return True
+
+    def template_hashes(self) -> Set[str]:
+        """Hashes of blocks that appear on at least the threshold share of pages"""
+        if self._template is None:
+            if not self.ready:
+                self._template = set()
+            else:
+                minimum = max(2, self.threshold * len(self.pages))
+                self._template = {h for h, count in self.counts.items() if count >= minimum}
+        return self._template
+
+    def strip(self, html_content: str) -> Tuple[str, int]:
+        """Remove template blocks from a page, returning the HTML and the number of blocks removed"""
+        template = self.template_hashes()
+        if not template:
+            return html_content, 0
+        soup = BeautifulSoup(html_content, 'html.parser')
+        removed = 0
+        # Outermost first, so an outer template block takes its children with it
+        for block_hash, tag in reversed(hash_blocks(soup, self.min_text)):
+            if block_hash in template and not tag.decomposed:
+                tag.decompose()
+                removed += 1
+        return (str(soup), removed) if removed else (html_content, 0)
+
+
+def index_path(url: str, directory: str) -> str:
+    """Path of the index file for the host serving a URL"""
+    host = re.sub(r'[^\w.-]', '_', urlparse(url).netloc)
+    return os.path.join(directory, f"{host}.json")
+
+
+def build_indexes(urls: Iterable[str], directory: str, fetcher: Optional[Fetcher] = None,
+                  max_workers: int = 16, pages_per_host: Optional[int] = None,
+                  **kwargs) -> Dict[str, BoilerplateIndex]:
+    """Fetch the pages not yet in their host's index, count their blocks and save the indexes
+
+    With pages_per_host, a host stops getting fetches once its index holds
+    (or is being sent) that many pages. URLs are read lazily either way.
+    """
+    fetcher = fetcher or get_default_fetcher()
+    indexes: Dict[str, BoilerplateIndex] = {}
+    queued: Dict[str, int] = {}
+
+    def missing() -> Iterator[str]:
+        for url in urls:
+            path = index_path(url, directory)
+            if path not in indexes:
+                indexes[path] = BoilerplateIndex.load(path, **kwargs)
+            index = indexes[path]
+            if url in index.pages:
+                continue
+            if pages_per_host is not None and len(index.pages) + queued.get(path, 0) >= pages_per_host:
+                continue
+            queued[path] = queued.get(path, 0) + 1
+            yield url
+
+    observed = 0
+    for url, result in fetcher.fetch_many(missing(), max_workers=max_workers, source='boilerplate'):
+        if isinstance(result, Exception):
+            logger.warning(f"Skipping {url} for the boilerplate index: {result}")
+            continue
+        if 'html' not in (result.content_type or 'html'):
+            continue
+        indexes[index_path(url, directory)].observe(url, result.text)
+        observed += 1
+
+    for index in indexes.values():
+        index.save()
+    logger.info(f"Boilerplate indexes updated with {observed} new pages "
+                f"({sum(len(index.template_hashes()) for index in indexes.values())} template blocks)")
+    return {os.path.splitext(os.path.basename(path))[0]: index for path, index in indexes.items()}
+
+
+def main():
+    """Main function to build or inspect boilerplate indexes"""
+    from .inputs import iter_config_entries
+
+    parser = argparse.ArgumentParser(description='Build per-site boilerplate indexes from a URL config')
+    parser.add_argument('--config', required=True, help='URL list to index: YAML config, .txt or .jsonl')
+    parser.add_argument('--index-dir', default=os.path.join('output', 'boilerplate'),
+                        help='Directory for the per-host index files (default: output/boilerplate)')
+    parser.add_argument('--threshold', type=float, default=0.5,
+                        help='Share of pages a block must appear on to count as template (default: 0.5)')
+    parser.add_argument('--workers', type=int, default=16, help='Concurrent fetches (default: 16)')
+    args = parser.parse_args()
+
+    urls = (url for _, url in iter_config_entries(args.config))
+    indexes = build_indexes(urls, args.index_dir, max_workers=args.workers, threshold=args.threshold)
+    for host, index in indexes.items():
+        print(f"{host}: {len(index.pages)} pages, {len(index.template_hashes())} template blocks")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Content-Defined Chunking
+Chooses chunk boundaries from the content around each structural break
+(headings and block elements) instead of from the running size since the top
+of the page, so a local edit only moves the boundaries next to it. Chunks are
+fingerprinted, and drafts are cached by fingerprint so unchanged chunks are
+not drafted again when a page is re-converted.
+"""
+
+import os
+import re
+import zlib
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import List, Optional
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Candidate boundaries: before markdown headings and block-level HTML elements starting a line
+CANDIDATE_BOUNDARY = re.compile(
+    r'\n(?=#{1,3} |<(?:h[1-6]|p|ul|ol|table|pre|section|article|div|blockquote|dl|figure)[\s>])')
+HEADING_START = re.compile(r'#{1,3} |<h[1-3][\s>]')
+
+# Bytes of content before a boundary that decide whether it is cut
+HASH_WINDOW = 256
+
+# Headings are preferred cut points
+HEADING_WEIGHT = 4.0
+
+
+def estimate_tokens(text: str) -> int:
+    """Same 1 token ≈ 4 characters estimate the size-based chunker uses"""
+    return len(text) // 4
+
+
+def content_defined_chunks(content: str, min_size: int = 2000, target_size: int = 8000,
+                           max_size: int = 100000) -> List[str]:
+    """Split content at structural boundaries chosen by a hash of the content before each one
+
+    Sizes are in estimated tokens. A boundary is cut when the chunk has reached
+    min_size and a crc32 of the preceding window falls under a probability
+    proportional to the segment's size (higher for headings), which gives chunks
+    of about target_size on average. Chunks never grow past max_size unless a
+    single segment is larger. The decision depends only on nearby content, so
+    boundaries resynchronise right after an edit. A max_size under twice the
+    target lowers the target (and min_size) with it, so the cap rarely decides
+    a boundary.
+    """
+    target_size = min(target_size, max_size // 2)
+    min_size = min(min_size, target_size // 4)
+    segments = CANDIDATE_BOUNDARY.split(content)
+    spread = max(1, target_size - min_size)
+    chunks = []
+    current: List[str] = []
+    current_size = 0
+
+    for i, segment in enumerate(segments):
+        segment_size = estimate_tokens(segment)
+        if current and current_size + segment_size > max_size:
+            chunks.append('\n'.join(current))
+            current, current_size = [], 0
+        current.append(segment)
+        current_size += segment_size
+
+        if i + 1 == len(segments) or current_size < min_size:
+            continue
+        window = segment[-HASH_WINDOW:].encode('utf-8')
+        probability = max(segment_size, 1) / spread
+        if HEADING_START.match(segments[i + 1]):
+            probability *= HEADING_WEIGHT
+        if zlib.crc32(window) / 2 ** 32 < probability:
+            chunks.append('\n'.join(current))
+            current, current_size = [], 0
+
+    if current:
+        chunks.append('\n'.join(current))
+    return chunks
+
+
+def chunk_fingerprint(chunk: str) -> str:
+    """Stable identifier of a chunk's exact content"""
+    return hashlib.sha256(chunk.encode('utf-8')).hexdigest()[:32]
+
+
+class DraftCache:
+    """SQLite store of drafted markdown keyed by chunk fingerprint, model and prompt version
+
+    The visual analysis is deliberately not part of the key: it is regenerated on
+    every conversion and rarely changes what a given chunk of HTML should become.
+    """
+
+    def __init__(self, path: str, model: str, prompt_version: str):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.path = path
+        self.model = model
+        self.prompt_version = prompt_version
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS drafts (
+                    key TEXT PRIMARY KEY,
+                    fingerprint TEXT NOT NULL,
+                    markdown TEXT NOT NULL,
+                    created REAL NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            """)
+
+    def _connect(self) -> sqlite3.Connection:
+        # One connection per thread; the crawler and server draft from several threads
+        if getattr(self._local, 'conn', None) is None:
+            self._local.conn = sqlite3.connect(self.path, timeout=30)
+            self._local.conn.execute('PRAGMA journal_mode=WAL')
+        return self._local.conn
+
+    def _key(self, fingerprint: str) -> str:
+        return f"{fingerprint}:{self.model}:{self.prompt_version}"
+
+    def get(self, chunk: str) -> Optional[str]:
+        """Return the cached draft for a chunk, if any"""
+        key = self._key(chunk_fingerprint(chunk))
+        conn = self._connect()
+        row = conn.execute("SELECT markdown FROM drafts WHERE key = ?", (key,)).fetchone()
+        if row:
+            with conn:
+                conn.execute("UPDATE drafts SET last_used = ? WHERE key = ?", (time.time(), key))
+        return row[0] if row else None
+
+    def put(self, chunk: str, markdown: str):
+        fingerprint = chunk_fingerprint(chunk)
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO drafts VALUES (?, ?, ?, ?, ?)",
+                         (self._key(fingerprint), fingerprint, markdown, now, now))
+
+    def prune(self, max_age: float) -> int:
+        """Drop drafts not used for max_age seconds"""
+        with self._connect() as conn:
+            return conn.execute("DELETE FROM drafts WHERE last_used < ?", (time.time() - max_age,)).rowcount
@@ -20,8 +20,10 @@ logger = logging.getLogger(__name__)
 class MarkdownCombiner:
     """Combines multiple markdown files into a single document"""
     
-    def __init__(self, input_dir: str = "output"):
+    def __init__(self, input_dir: str = "output", search_index=None):
         self.input_dir = input_dir
+        # Optional SearchIndex kept in step with the files being combined
+        self.search_index = search_index
         
     def find_markdown_files(self, prefix: str) -> List[str]:
         """Find all markdown files with given prefix"""
@@ -51,6 +53,10 @@ class MarkdownCombiner:
                         
                         outfile.write(content)
                         outfile.write('\n')  # Ensure newline at end of file
+                    
+                    # Only files changed since the last build are re-indexed
+                    if self.search_index is not None:
+                        self.search_index.index_file(file)
                         
             logger.info(f"Successfully combined {len(files)} files into {output_file}")
             
@@ -86,6 +92,7 @@ def main():
     parser.add_argument('--prefix', help='Prefix of files to combine')
     parser.add_argument('--output', help='Output file path (optional)')
     parser.add_argument('--input-dir', help='Input directory (default: output)', default='output')
+    parser.add_argument('--search-index', help='SQLite full-text index to update with the combined files')
     args = parser.parse_args()
     
     prefix = args.prefix
@@ -96,13 +103,21 @@ def main():
         logger.error("No prefix provided")
         return
     
-    combiner = MarkdownCombiner(input_dir=args.input_dir)
+    search_index = None
+    if args.search_index:
+        from .search_index import SearchIndex
+        search_index = SearchIndex(args.search_index)
+    
+    combiner = MarkdownCombiner(input_dir=args.input_dir, search_index=search_index)
     try:
         output_file = combiner.process(prefix, args.output)
         logger.info(f"Files successfully combined into: {output_file}")
     except Exception as e:
         logger.error(f"Combination failed: {e}")
         raise
+    finally:
+        if search_index is not None:
+            search_index.close()
 
 if __name__ == "__main__":
     main()
@@ -8,8 +8,7 @@ Read the README.md!
 
 import os
 import logging
-from typing import Optional, Dict, List, Tuple
-import requests
+from typing import Optional, Dict, Iterable, Iterator, List, Tuple, Union
 from bs4 import BeautifulSoup
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
@@ -23,11 +22,29 @@ from PIL import Image
 import io
 import openai
 import base64
-import yaml
+import hashlib
 from urllib.parse import urlparse
 import time
+from contextlib import contextmanager
 import pytesseract
 from .analyzer import HTMLAnalyzer
+from .metrics import metrics, instrument_openai_client
+from .profiling import ConversionProfiler
+from .minify import estimate_prompt_tokens, minify_html, minification_report
+from .dom_crop import LAYOUT_SCRIPT, crop_to_main_content
+from .fetcher import Fetcher, ResponseTooLarge, get_default_fetcher
+from .layout import crop_margins, remap_visual_analysis, split_sections
+from .chunking import DraftCache, chunk_fingerprint, content_defined_chunks
+from .boilerplate import MIN_PAGES as BOILERPLATE_MIN_PAGES, BoilerplateIndex, build_indexes, index_path
+from .streaming import StreamingChunker, stream_chunks, build_stream_analysis
+from .inputs import iter_config_entries
+from .screenshots import ScreenshotStore
+from .search_index import SearchIndex
+from .pipeline import StageGraph
+from .pdf import PDFDocument, document_image_dir, is_pdf
+from . import deadlines
+from .deadlines import Deadline, DeadlineExceeded
+from .sinks import FileSink, OutputSink, build_record, open_sink, sequence_filename
 import json
 
 # Load environment variables from .env file
@@ -43,7 +60,7 @@ logger = logging.getLogger(__name__)
 # Configure Ell logging
 ell_logger = logging.getLogger('ell')
 ell_logger.setLevel(logging.WARNING)  
-ell.init(verbose=True, store='./logs', autocommit=True)
+ell.init(verbose=True, store=os.getenv('ELL_STORE', './logs'), autocommit=True)
 
 # Add a custom handler for our application logs
 console_handler = logging.StreamHandler()
@@ -54,7 +71,7 @@ console_handler.setFormatter(logging.Formatter(
 logger.handlers = [console_handler]
 
 # Configure OpenAI client
-openai_client = openai.Client(api_key=os.getenv("OPENAI_API_KEY"))
+openai_client = instrument_openai_client(openai.Client(api_key=os.getenv("OPENAI_API_KEY")))
 
 # Add progress logging in key functions
 def process_url(self, url: str) -> str:
@@ -124,16 +141,25 @@ def process_url(self, url: str) -> str:
         logger.error(f"Conversion failed: {e}")
         raise
 
-def filter_and_chunk_content(content: str, max_chunk_size: int = 100000) -> List[str]:
-    """Filter JSX/React components and split content into chunks"""
+def filter_and_chunk_content(content: str, max_chunk_size: int = 100000, method: str = 'size') -> List[str]:
+    """Filter JSX/React components and split content into chunks
+    
+    method='size' fills chunks up to max_chunk_size from the top of the page;
+    method='content' picks content-defined boundaries that stay put when the page is edited.
+    Content-defined chunks aim for about 8000 tokens each (see content_defined_chunks);
+    max_chunk_size caps them, and only moves the target when under twice that.
+    """
     # First filter out unnecessary content
     filtered_content = re.sub(r'<script\b[^>]*>[\s\S]*?</script>', '', content)
     filtered_content = re.sub(r'_jsx\([^)]+\)|_jsxs\([^)]+\)', '', filtered_content)
     filtered_content = re.sub(r'className="[^"]*"', '', filtered_content)
     filtered_content = re.sub(r'children=\{[^}]*\}', '', filtered_content)
     
-    # Then split into chunks using existing logic
-    sections = re.split(r'\n(?=# |\## |\### )', filtered_content)
+    if method == 'content':
+        return content_defined_chunks(filtered_content, max_size=max_chunk_size)
+    
+    # Then split into chunks at markdown or HTML headings
+    sections = re.split(r'\n(?=# |\## |\### |<h[1-3][\s>])', filtered_content)
     chunks = []
     current_chunk = []
     current_size = 0
@@ -155,22 +181,49 @@ def filter_and_chunk_content(content: str, max_chunk_size: int = 100000) -> List
 class HTMLScraper:
     """Handles HTML content extraction using requests and BeautifulSoup"""
     
-    def __init__(self):
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        })
+    def __init__(self, fetcher: Optional[Fetcher] = None):
+        self.fetcher = fetcher or get_default_fetcher()
 
-    def scrape(self, url: str) -> str:
+    def scrape(self, url: str, max_body_size: Optional[int] = None) -> str:
         """Scrape HTML content from URL"""
         try:
-            response = self.session.get(url)
-            response.raise_for_status()
-            return response.text
+            return self.fetcher.fetch(url, max_body_size=max_body_size, source='scrape').text
+        except ResponseTooLarge:
+            # Not a failure: callers use this to switch to streaming
+            raise
         except Exception as e:
             logger.error(f"HTML scraping failed: {e}")
             raise
 
+    def scrape_document(self, url: str, max_body_size: Optional[int] = None,
+                        max_pdf_size: Optional[int] = None,
+                        spool_size: Optional[int] = None) -> Tuple[str, Union[str, bytes]]:
+        """Fetch a URL once: ('pdf', bytes) for a PDF document, ('html', text) for anything else
+        
+        A PDF over max_body_size is fetched again with max_pdf_size as its limit.
+        Any other page over it raises ResponseTooLarge, carrying the spooled body
+        when spool_size is given (see Fetcher.fetch).
+        """
+        try:
+            try:
+                result = self.fetcher.fetch(url, max_body_size=max_body_size, source='scrape',
+                                            spool_size=spool_size)
+            except ResponseTooLarge as e:
+                if max_pdf_size is None or not is_pdf(e.content_type):
+                    raise
+                if e.spooled is not None:
+                    e.spooled.close()
+                logger.info(f"{e}; fetching the PDF with a {max_pdf_size} byte limit")
+                result = self.fetcher.fetch(url, max_body_size=max_pdf_size, source='scrape')
+        except ResponseTooLarge:
+            raise
+        except Exception as e:
+            logger.error(f"HTML scraping failed: {e}")
+            raise
+        if is_pdf(result.content_type, result.content):
+            return 'pdf', result.content
+        return 'html', result.text
+
     def get_page_title(self, html_content: str) -> str:
         """Extract page title from HTML content"""
         soup = BeautifulSoup(html_content, 'html.parser')
@@ -182,10 +235,12 @@ class HTMLScraper:
 class VisualScraper:
     """Handles visual content capture using Selenium"""
     
-    def __init__(self, max_retries=3, output_dir="output"):
+    def __init__(self, max_retries=3, output_dir="output", page_load_timeout: float = 60):
         self.driver = None
         self.max_retries = max_retries
         self.output_dir = output_dir
+        # Upper bound for driver.get; the active deadline can lower it per page
+        self.page_load_timeout = page_load_timeout
     
     def _ensure_driver(self):
         """Ensure we have a working WebDriver instance"""
@@ -222,16 +277,37 @@ class VisualScraper:
     
     def capture(self, url):
         """Capture screenshot with retries"""
+        return self.capture_with_layout(url, record_layout=False)[0]
+    
+    def capture_with_layout(self, url, record_layout: bool = True) -> Tuple[bytes, Optional[Dict]]:
+        """Capture screenshot with retries, plus element bounding rects for mapping regions to the DOM"""
         for attempt in range(self.max_retries):
+            if attempt:
+                metrics.inc('retries', stage='capture')
             try:
+                timeout = deadlines.cap(self.page_load_timeout, 'capture')
                 self._ensure_driver()
+                self.driver.set_page_load_timeout(timeout)
+                self.driver.set_script_timeout(timeout)
                 self.driver.get(url)
-                time.sleep(2)  # Wait for page load
-                return self.driver.get_screenshot_as_png()
+                time.sleep(deadlines.cap(2, 'capture'))  # Wait for page load
+                screenshot = self.driver.get_screenshot_as_png()
+                layout = None
+                if record_layout:
+                    try:
+                        layout = self.driver.execute_script(LAYOUT_SCRIPT)
+                    except Exception as e:
+                        logger.warning(f"Could not record element layout: {e}")
+                return screenshot, layout
                 
+            except deadlines.DeadlineExceeded:
+                raise
             except Exception as e:
                 logger.warning(f"Screenshot attempt {attempt + 1} failed: {e}")
+                # A tab still loading would hold the browser, so it is closed with the driver
                 self._quit_driver()
+                # Out of budget: report the deadline instead of retrying
+                deadlines.check('capture')
                 if attempt == self.max_retries - 1:
                     raise
                 time.sleep(1)  # Wait before retry
@@ -270,10 +346,11 @@ def split_content(screenshot):
     Returns:
         List of section images
     """
-    # Basic implementation - can be enhanced based on needs
-    return [screenshot]  # For now, return full screenshot as single section
+    return split_sections(screenshot)
 
-@ell.simple(model="gpt-4o-mini", client=openai_client)
+VISION_MODEL = "gpt-4o-mini"
+
+@ell.simple(model=VISION_MODEL, client=openai_client)
 def analyze_page_content(screenshot: Image.Image) -> Dict:
     """Analyze webpage screenshot to identify main content and structure."""
     # Convert to RGB if image is in RGBA mode
@@ -317,18 +394,18 @@ def analyze_page_content(screenshot: Image.Image) -> Dict:
         ell.user(["Analyze this webpage screenshot and provide the structured analysis.", screenshot])
     ]
 
-@ell.simple(model="gpt-4o-mini", client=openai_client)
-def generate_markdown_from_ocr(ocr_text: str, visual_analysis: Dict) -> str:
-    """Convert OCR-extracted text to markdown using visual analysis for structure"""
-    return [
-        ell.system("""You are a documentation converter specializing in API documentation. 
+# Prompts are plain strings so the deferred batch mode (batch.py) sends exactly what the ell functions send
+OCR_SYSTEM_PROMPT = """You are a documentation converter specializing in API documentation. 
         Convert OCR-extracted text to clean, structured markdown while preserving:
         1. Code blocks (maintain language-specific syntax)
         2. Parameter descriptions and types
         3. Visual hierarchy from the analysis
         4. Tables and lists
-        """),
-        ell.user(f"""Using this visual structure analysis:
+        """
+
+def ocr_user_prompt(ocr_text: str, visual_analysis: Dict) -> str:
+    """Render the user message for generate_markdown_from_ocr"""
+    return f"""Using this visual structure analysis:
         {json.dumps(visual_analysis, indent=2)}
         
         Convert this OCR-extracted text to markdown, ensuring proper formatting:
@@ -340,22 +417,20 @@ def generate_markdown_from_ocr(ocr_text: str, visual_analysis: Dict) -> str:
         3. Preserve parameter types and descriptions in consistent format
         4. Maintain proper spacing between sections
         5. Clean up any OCR artifacts or misalignments
-        """)
-    ]
+        """
 
-@ell.simple(model="gpt-4o-mini", client=openai_client)
-def generate_markdown_draft(html_content: str, visual_analysis: Dict) -> str:
-    """Generate initial markdown content using HTML and visual analysis results."""
-    return [
-        ell.system("""You are a content converter specializing in creating clean, 
+DRAFT_SYSTEM_PROMPT = """You are a content converter specializing in creating clean, 
         well-structured markdown. Focus only on the main content areas identified 
         in the visual analysis. Follow these line break rules strictly:
         1. Single line break after each heading
         2. No extra line breaks between list items
         3. Single line break between different sections
         4. No multiple consecutive line breaks
-        5. Single line break at end of document"""),
-        ell.user(f"""
+        5. Single line break at end of document"""
+
+def draft_user_prompt(html_content: str, visual_analysis: Dict) -> str:
+    """Render the user message for generate_markdown_draft"""
+    return f"""
         Using this visual analysis:
         {visual_analysis}
         
@@ -377,23 +452,9 @@ def generate_markdown_draft(html_content: str, visual_analysis: Dict) -> str:
            - Single break before and after list
         7. For tables, links, references, and images:
            [Previous rules remain the same...]
-        """)
-    ]
+        """
 
-@ell.simple(model="gpt-4o-mini", client=openai_client)
-def validate_markdown_format(content: str) -> str:
-    """Ensure markdown content follows proper formatting rules."""
-    # First clean up multiple line breaks
-    content = re.sub(r'\n{3,}', '\n\n', content)  # Replace 3+ newlines with 2
-    content = re.sub(r'\n+$', '\n', content)      # Single newline at end
-    
-    # Apply specific validation functions
-    content = validate_table_format(content)
-    content = validate_list_format(content)
-    content = validate_code_blocks(content)
-    
-    return [
-        ell.system("""You are a markdown validator that enforces strict formatting rules:
+VALIDATE_SYSTEM_PROMPT = """You are a markdown validator that enforces strict formatting rules:
         1. Line breaks:
            - Single break after headings
            - No breaks between list items
@@ -410,8 +471,11 @@ def validate_markdown_format(content: str) -> str:
            - No extra breaks unless followed by list/code
         
         IMPORTANT: Never add unnecessary line breaks. The document should be compact 
-        but readable."""),
-        ell.user(f"""
+        but readable."""
+
+def validate_user_prompt(content: str) -> str:
+    """Render the user message for validate_markdown_format"""
+    return f"""
         Format this pre-validated markdown content according to the rules above:
         {content}
         
@@ -419,7 +483,73 @@ def validate_markdown_format(content: str) -> str:
         1. Output only the formatted content
         2. Start immediately with the content
         3. Do not wrap in markdown fences
-        4. Single newline at end""")
+        4. Single newline at end"""
+
+def prevalidate_markdown(content: str) -> str:
+    """Apply the rule-based fixes that run before the LLM validation pass"""
+    # First clean up multiple line breaks
+    content = re.sub(r'\n{3,}', '\n\n', content)  # Replace 3+ newlines with 2
+    content = re.sub(r'\n+$', '\n', content)      # Single newline at end
+    
+    # Apply specific validation functions
+    content = validate_table_format(content)
+    content = validate_list_format(content)
+    content = validate_code_blocks(content)
+    return content
+
+@ell.simple(model="gpt-4o-mini", client=openai_client)
+def generate_markdown_from_ocr(ocr_text: str, visual_analysis: Dict) -> str:
+    """Convert OCR-extracted text to markdown using visual analysis for structure"""
+    return [
+        ell.system(OCR_SYSTEM_PROMPT),
+        ell.user(ocr_user_prompt(ocr_text, visual_analysis))
+    ]
+
+DRAFT_MODEL = "gpt-4o-mini"
+
+# Changes whenever the draft prompt text changes, so cached drafts from older prompts are not reused
+DRAFT_PROMPT_VERSION = hashlib.sha1((DRAFT_SYSTEM_PROMPT + draft_user_prompt('', '')).encode('utf-8')).hexdigest()[:12]
+
+@ell.simple(model=DRAFT_MODEL, client=openai_client)
+def generate_markdown_draft(html_content: str, visual_analysis: Dict) -> str:
+    """Generate initial markdown content using HTML and visual analysis results."""
+    return [
+        ell.system(DRAFT_SYSTEM_PROMPT),
+        ell.user(draft_user_prompt(html_content, visual_analysis))
+    ]
+
+PDF_SYSTEM_PROMPT = """You are a documentation converter. You receive markdown extracted 
+        from the text layer of a PDF, a few pages at a time. Headings, lists, code 
+        blocks, tables and image links are already marked up. Clean it into 
+        well-structured markdown:
+        1. Keep all content; do not summarize
+        2. Fix heading levels that do not fit the document hierarchy
+        3. Join paragraphs split by page breaks or columns
+        4. Drop running headers, footers and page numbers
+        5. Keep tables, code blocks and image links as they are"""
+
+def pdf_user_prompt(pdf_markdown: str, pages: str) -> str:
+    """Render the user message for generate_markdown_from_pdf"""
+    return f"""
+        Clean up this markdown extracted from PDF pages {pages}:
+        {pdf_markdown}
+        
+        IMPORTANT: Output only the markdown, without wrapping it in fences."""
+
+@ell.simple(model=DRAFT_MODEL, client=openai_client)
+def generate_markdown_from_pdf(pdf_markdown: str, pages: str) -> str:
+    """Turn markdown pre-structured from a PDF's text layer into the final draft"""
+    return [
+        ell.system(PDF_SYSTEM_PROMPT),
+        ell.user(pdf_user_prompt(pdf_markdown, pages))
+    ]
+
+@ell.simple(model="gpt-4o-mini", client=openai_client)
+def validate_markdown_format(content: str) -> str:
+    """Ensure markdown content follows proper formatting rules."""
+    return [
+        ell.system(VALIDATE_SYSTEM_PROMPT),
+        ell.user(validate_user_prompt(prevalidate_markdown(content)))
     ]
 
 def get_markdown_rules() -> str:
@@ -464,76 +594,531 @@ class ContentProcessor:
         self.html_scraper = HTMLScraper()
         self.visual_scraper = VisualScraper()
         self.analyzer = HTMLAnalyzer()
+        self.profiler = ConversionProfiler()
+        self.crop_to_main_content = True
+        # Pages larger than this are streamed in bounded chunks instead of parsed whole
+        self.large_page_threshold = 5 * 1024 * 1024
+        self.large_page_chunk_size = 100000
+        # Largest page the streaming path downloads (spooled to disk, not memory)
+        self.max_large_page_size = 1024 * 1024 * 1024
+        # PDFs are read from their text layer (see pdf.py) and may be larger than HTML pages
+        self.max_pdf_size = 100 * 1024 * 1024
+        self.pdf_chunk_size = 25000
+        # Directory to save embedded PDF images into (linked from the markdown); None skips them
+        self.pdf_image_dir: Optional[str] = None
+        # Directory of per-host boilerplate indexes; None disables template stripping
+        self.boilerplate_dir: Optional[str] = None
+        self._boilerplate_indexes: Dict[str, BoilerplateIndex] = {}
+        # Crop blank screenshot margins before the vision and OCR calls
+        self.crop_screenshots = True
+        # 'size' or 'content' (content-defined boundaries, see chunking.py)
+        self.chunking = 'size'
+        self.draft_cache: Optional[DraftCache] = None
+        # Write a PNG per capture; off when the output archive keeps the screenshots itself
+        self.save_screenshots = True
+        # Content-addressed store replacing the per-capture PNGs and caching vision analyses; None disables it
+        self.screenshot_store: Optional[ScreenshotStore] = None
+        # Section index updated as batch outputs are written; None disables indexing
+        self.search_index: Optional[SearchIndex] = None
+        # Time budget per URL and the batch deadline it is nested in; None means unbounded
+        self.url_timeout: Optional[float] = None
+        self.batch_deadline: Optional[Deadline] = None
         self.output_dir = "output"
         os.makedirs(self.output_dir, exist_ok=True)
 
     def process_url(self, url: str) -> str:
         """Process URL through conversion pipeline with OCR fallback"""
+        return self.convert(url)['markdown']
+
+    def convert(self, url: str) -> Dict:
+        """Convert a URL and return the markdown along with the fetched HTML, title and strategy
+        
+        Runs under the per-URL deadline (nested in the batch deadline). When the
+        budget runs out after some chunks were drafted, the result carries that
+        partial, unvalidated markdown with timed_out set; otherwise
+        DeadlineExceeded is raised.
+        """
+        deadline = Deadline(self.url_timeout, parent=self.batch_deadline, label=url)
         try:
-            logger.info(f"Starting conversion for URL: {url}")
-            
-            # Stage 1: Analysis & Strategy
-            logger.info("Stage 1/3: Analyzing content...")
-            analysis = self.analyzer.analyze_url(url)
-            logger.info(f"Analysis complete: {analysis['recommendations']}")
-            
-            # Stage 2: Visual Analysis & Content Capture
-            logger.info("Stage 2/3: Performing visual analysis...")
-            screenshot = self.visual_scraper.capture(url)
-            screenshot_path = self.visual_scraper.save_screenshot(screenshot, url)
-            logger.info(f"Screenshot saved to: {screenshot_path}")
-            
-            # Determine processing strategy
-            if analysis['processing_strategy']['use_ocr']:
-                logger.info("Using OCR-based extraction...")
-                image = Image.open(io.BytesIO(screenshot))
-                visual_analysis = analyze_page_content(image)
-                
-                # Extract text using OCR
-                ocr_text = pytesseract.image_to_string(image)
-                markdown_draft = generate_markdown_from_ocr(ocr_text, visual_analysis)
-                # Get page title from HTML for consistency
-                html_content = self.html_scraper.scrape(url)
-                page_title = self.html_scraper.get_page_title(html_content)
-            else:
-                logger.info("Using HTML-based extraction...")
-                visual_analysis = analyze_page_content(Image.open(io.BytesIO(screenshot)))
-                html_content = self.html_scraper.scrape(url)
-                page_title = self.html_scraper.get_page_title(html_content)
-                
-                # Process HTML content
-                html_content_chunks = filter_and_chunk_content(html_content)
+            with self.profiler.profile(url), metrics.page(url) as page, deadlines.scope(deadline):
+                logger.info(f"Starting conversion for URL: {url}")
                 markdown_parts = []
+                try:
+                    prepared = self.prepare(url, page)
+                    if prepared.get('large_page') or prepared.get('pdf'):
+                        return self.convert_streamed(url, page, prepared)
+                    visual_analysis = prepared['visual_analysis']
+                    
+                    # Stage 2: Drafting
+                    logger.info("Stage 2/3: Drafting markdown...")
+                    
+                    if prepared['ocr_text'] is not None:
+                        with metrics.stage('draft'):
+                            markdown_parts.append(deadlines.call(generate_markdown_from_ocr, prepared['ocr_text'],
+                                                                 visual_analysis, stage='draft'))
+                    else:
+                        for chunk in prepared['chunks']:
+                            markdown_parts.extend(self.draft_chunk(chunk, visual_analysis))
+                    markdown_draft = '\n\n'.join(filter(None, markdown_parts))
+                    
+                    # Stage 3: Markdown Validation
+                    logger.info("Stage 3/3: Validating markdown format...")
+                    with metrics.stage('validate'):
+                        final_markdown = deadlines.call(validate_markdown_format, markdown_draft, stage='validate')
+                        final_markdown = validate_document_title(final_markdown, visual_analysis, prepared['title'])
+                    timed_out = False
                 
-                for i, chunk in enumerate(html_content_chunks, 1):
-                    try:
-                        markdown_part = generate_markdown_draft(chunk, visual_analysis)
-                        if markdown_part:
-                            markdown_parts.append(markdown_part)
-                    except openai.BadRequestError as e:
-                        if "context_length_exceeded" in str(e):
-                            smaller_chunks = filter_and_chunk_content(chunk, max_chunk_size=50000)
-                            for smaller_chunk in smaller_chunks:
-                                markdown_part = generate_markdown_draft(smaller_chunk, visual_analysis)
-                                if markdown_part:
-                                    markdown_parts.append(markdown_part)
-                        else:
-                            raise e
+                except DeadlineExceeded as e:
+                    page['status'] = 'timeout'
+                    if not any(markdown_parts):
+                        raise
+                    logger.warning(f"{e}; keeping {len(markdown_parts)} drafted parts of {url}")
+                    final_markdown = '\n\n'.join(filter(None, markdown_parts))
+                    timed_out = True
                 
-                markdown_draft = '\n\n'.join(filter(None, markdown_parts))
-            
-            # Stage 3: Markdown Validation
-            logger.info("Stage 3/3: Validating markdown format...")
-            final_markdown = validate_markdown_format(markdown_draft)
-            final_markdown = validate_document_title(final_markdown, visual_analysis, page_title)
-            
-            # Remove the save operation from here since it's handled in process_urls_from_config
-            return final_markdown
+                # Remove the save operation from here since it's handled in process_urls_from_config
+                return {
+                    'url': url,
+                    'markdown': final_markdown,
+                    'title': prepared['title'],
+                    'html': prepared['html'],
+                    'strategy': page['strategy'],
+                    'chunk_fingerprints': prepared['fingerprints'],
+                    'timings': dict(page['stages']),
+                    'screenshot': prepared['screenshot'],
+                    'timed_out': timed_out
+                }
             
         except Exception as e:
             logger.error(f"Conversion failed: {e}")
             raise
 
+    def prepare(self, url: str, page: Dict) -> Dict:
+        """Run every stage up to drafting: fetch, analysis, capture, vision and OCR or HTML chunking
+        
+        The stages run as a dependency graph (see pipeline.py): one fetch feeds the
+        analysis and the title, the browser capture runs alongside them, and OCR
+        or (with the DOM crop off) chunking overlaps the vision call. The critical
+        path is logged and kept in the page metrics.
+        
+        Pages above the large page threshold come back as {'large_page': True}
+        with their capture and (unless the size was declared up front) the body
+        spooled to disk, for _convert_large_page to stream. PDF documents come
+        back as {'pdf': True} with their bytes, for _convert_pdf; URLs ending in
+        .pdf wait for the fetch before deciding whether to start the browser.
+        """
+        logger.info("Stage 1/3: Analyzing content and capturing the page...")
+        
+        def fetch():
+            with metrics.stage('fetch'):
+                try:
+                    return self.html_scraper.scrape_document(url, max_body_size=self.large_page_threshold,
+                                                             max_pdf_size=self.max_pdf_size,
+                                                             spool_size=self.max_large_page_size)
+                except ResponseTooLarge as e:
+                    logger.info(f"{e}; switching to streaming conversion")
+                    return 'large', e.spooled
+        
+        def analyze(fetched):
+            with metrics.stage('analyze'):
+                analysis = self.analyzer.analyze_html(fetched[1], url)
+            page['strategy'] = 'ocr' if analysis['processing_strategy']['use_ocr'] else 'html'
+            logger.info(f"Analysis complete: {analysis['recommendations']}")
+            return analysis
+        
+        def capture(*_):
+            with metrics.stage('capture'):
+                screenshot, layout = self.visual_scraper.capture_with_layout(url)
+            return screenshot, layout, self._save_screenshot(screenshot, url)
+        
+        def crop(captured, fetched):
+            return self._crop_screenshot(captured[0])
+        
+        def vision(captured, cropped):
+            return self._vision(cropped, captured[2])
+        
+        def ocr(cropped, analysis):
+            logger.info("Using OCR-based extraction...")
+            with metrics.stage('ocr'):
+                return self._ocr(cropped[0])
+        
+        def chunk(fetched, analysis, captured=None, visual_analysis=None):
+            logger.info("Using HTML-based extraction...")
+            return self._chunk_html(url, fetched[1], captured[1] if captured else None, visual_analysis)
+        
+        use_ocr = lambda analysis: analysis['processing_strategy']['use_ocr']
+        is_html = lambda fetched, *_: fetched[0] == 'html'
+        graph = StageGraph()
+        graph.add('fetch', fetch)
+        graph.add('analyze', analyze, ('fetch',), when=is_html)
+        graph.add('title', lambda fetched: self.html_scraper.get_page_title(fetched[1]), ('fetch',), when=is_html)
+        if urlparse(url).path.lower().endswith('.pdf'):
+            # Most likely a PDF, which needs no capture; only start the browser if it turns out not to be
+            graph.add('capture', capture, ('fetch',), when=lambda fetched: fetched[0] != 'pdf')
+        else:
+            graph.add('capture', capture)
+        graph.add('crop', crop, ('capture', 'fetch'), when=lambda captured, fetched: is_html(fetched))
+        graph.add('vision', vision, ('capture', 'crop'))
+        graph.add('ocr', ocr, ('crop', 'analyze'), when=lambda cropped, analysis: use_ocr(analysis))
+        # The DOM crop needs the main content box, so only without it can chunking overlap the vision call
+        chunk_deps = ('fetch', 'analyze', 'capture', 'vision') if self.crop_to_main_content else ('fetch', 'analyze')
+        graph.add('chunk', chunk, chunk_deps, when=lambda html_content, analysis, *_: not use_ocr(analysis))
+        run = graph.run()
+        
+        page['critical_path'] = run.report()
+        logger.info(f"Critical path: {run.describe()}")
+        kind, body = run.results['fetch']
+        if kind == 'pdf':
+            return {'url': url, 'pdf': True, 'content': body}
+        screenshot, _, screenshot_hash = run.results['capture']
+        if kind == 'large':
+            return {'url': url, 'large_page': True, 'body': body, 'screenshot': screenshot,
+                    'screenshot_hash': screenshot_hash}
+        
+        chunks = run.results['chunk'] or []
+        return {
+            'url': url,
+            'strategy': page['strategy'],
+            'chunks': chunks,
+            'fingerprints': [chunk_fingerprint(chunk) for chunk in chunks],
+            'ocr_text': run.results['ocr'],
+            'screenshot': screenshot,
+            'title': run.results['title'],
+            'html': body,
+            'visual_analysis': run.results['vision'],
+        }
+
+    def _chunk_html(self, url: str, html_content: str, layout: Optional[Dict], visual_analysis) -> List[str]:
+        """Crop to the main content (given a layout and vision analysis), strip boilerplate, minify and chunk"""
+        # Send only the DOM subtree behind the visual main content box
+        draft_html = html_content
+        if self.crop_to_main_content and layout:
+            with metrics.stage('crop'):
+                cropped_html = crop_to_main_content(html_content, layout, visual_analysis)
+            if cropped_html:
+                logger.info(f"Cropped HTML to main content: {len(html_content)} -> {len(cropped_html)} characters")
+                draft_html = cropped_html
+        
+        # Drop the header, sidebar and footer blocks shared by the rest of the site
+        boilerplate = self._boilerplate_index(url)
+        if boilerplate is not None:
+            with metrics.stage('boilerplate'):
+                # Counted from the whole page, since the crop has usually dropped the template already
+                boilerplate.observe(url, html_content)
+                draft_html, removed_blocks = boilerplate.strip(draft_html)
+            if removed_blocks:
+                metrics.inc('boilerplate_blocks_removed', removed_blocks)
+                logger.info(f"Stripped {removed_blocks} template blocks shared across the site")
+        
+        # Strip markup noise before it costs prompt tokens
+        with metrics.stage('minify'):
+            minified_html = minify_html(draft_html)
+        # Minification is measured against its own input, so crop and strip savings are not counted twice
+        raw_tokens = estimate_prompt_tokens(html_content)
+        token_report = minification_report(draft_html, minified_html)
+        metrics.inc('prompt_tokens_estimated_raw', raw_tokens)
+        metrics.inc('prompt_tokens_estimated_cropped', token_report['tokens_before'])
+        metrics.inc('prompt_tokens_estimated_minified', token_report['tokens_after'])
+        if token_report['tokens_before'] < raw_tokens:
+            logger.info(f"Crop and boilerplate strip: ~{raw_tokens} -> ~{token_report['tokens_before']} prompt tokens")
+        logger.info(f"Minified HTML: ~{token_report['tokens_before']} -> ~{token_report['tokens_after']} "
+                    f"prompt tokens ({token_report['reduction']:.0%} reduction)")
+        
+        # Process HTML content
+        with metrics.stage('chunk'):
+            return filter_and_chunk_content(minified_html, method=self.chunking)
+
+    def _ocr(self, image: Image.Image) -> str:
+        """Run tesseract, killing it when the active deadline runs out"""
+        # pytesseract treats a timeout of 0 as unbounded
+        timeout = deadlines.cap(None, 'ocr') or 0
+        try:
+            return pytesseract.image_to_string(image, timeout=timeout)
+        except RuntimeError as e:
+            if 'timeout' not in str(e).lower():
+                raise
+            deadlines.check('ocr')
+            raise
+
+    def _save_screenshot(self, screenshot: bytes, url: str) -> Optional[str]:
+        """Hand the capture to the screenshot store, or write it to output/screenshots unless it is archived
+        
+        Returns the store's content hash for the capture (None without a store).
+        """
+        if self.screenshot_store is not None:
+            with metrics.stage('save_screenshot'):
+                stored = self.screenshot_store.put(screenshot, url)
+            if stored['duplicate']:
+                logger.info(f"Screenshot unchanged ({stored['duplicate']} duplicate): {stored['path']}")
+            else:
+                logger.info(f"Screenshot queued for: {stored['path']}")
+            return stored['hash']
+        if not self.save_screenshots:
+            return None
+        with metrics.stage('save_screenshot'):
+            screenshot_path = self.visual_scraper.save_screenshot(screenshot, url)
+        logger.info(f"Screenshot saved to: {screenshot_path}")
+        return None
+
+    def _analyze_screenshot(self, screenshot: bytes, screenshot_hash: Optional[str] = None) -> Tuple[Image.Image, Dict]:
+        """Crop blank margins off the screenshot, then run the vision analysis on what is left
+        
+        Returns the (possibly cropped) image for OCR and the analysis with its
+        positions mapped back to the full frame, which the DOM crop expects.
+        With a screenshot store, an analysis of the same rendering is reused.
+        """
+        cropped = self._crop_screenshot(screenshot)
+        return cropped[0], self._vision(cropped, screenshot_hash)
+
+    def _crop_screenshot(self, screenshot: bytes) -> Tuple[Image.Image, Optional[Tuple], Tuple[int, int]]:
+        """Decode the screenshot and crop its blank margins: (image, crop box or None, full frame size)"""
+        image = Image.open(io.BytesIO(screenshot))
+        # Decode now: OCR and the vision call read the image from different threads
+        image.load()
+        frame_size = image.size
+        crop_box = None
+        if self.crop_screenshots:
+            with metrics.stage('layout'):
+                image, crop_box = crop_margins(image)
+            if crop_box:
+                logger.info(f"Cropped screenshot margins: {frame_size[0]}x{frame_size[1]} -> {image.size[0]}x{image.size[1]}")
+        return image, crop_box, frame_size
+
+    def _vision(self, cropped: Tuple[Image.Image, Optional[Tuple], Tuple[int, int]],
+                screenshot_hash: Optional[str] = None):
+        """Run (or reuse) the vision analysis of a cropped screenshot, mapped back to the full frame"""
+        image, crop_box, frame_size = cropped
+        cache_key = f"{VISION_MODEL}:crop={int(self.crop_screenshots)}"
+        if self.screenshot_store is not None and screenshot_hash:
+            cached = self.screenshot_store.get_analysis(screenshot_hash, cache_key)
+            if cached is not None:
+                metrics.inc('vision_cache_hits')
+                logger.info("Rendering unchanged; reusing the stored vision analysis")
+                return cached
+            metrics.inc('vision_cache_misses')
+        with metrics.stage('vision'):
+            # The vision call resizes its input in place, so keep the OCR copy intact
+            visual_analysis = deadlines.call(analyze_page_content, image.copy(), stage='vision')
+        if crop_box:
+            visual_analysis = remap_visual_analysis(visual_analysis, crop_box, frame_size)
+        if self.screenshot_store is not None and screenshot_hash:
+            self.screenshot_store.put_analysis(screenshot_hash, cache_key, visual_analysis)
+        return visual_analysis
+
+    def _boilerplate_index(self, url: str) -> Optional[BoilerplateIndex]:
+        """Return the boilerplate index for the URL's host when stripping is enabled
+        
+        It only strips anything once it has seen enough pages (see BoilerplateIndex.ready).
+        """
+        if not self.boilerplate_dir:
+            return None
+        path = index_path(url, self.boilerplate_dir)
+        if path not in self._boilerplate_indexes:
+            self._boilerplate_indexes[path] = BoilerplateIndex.load(path)
+        return self._boilerplate_indexes[path]
+
+    def save_boilerplate_indexes(self):
+        """Write the boilerplate indexes that recorded new pages"""
+        for index in self._boilerplate_indexes.values():
+            if index.changed:
+                index.save()
+
+    def draft_chunk(self, chunk: str, visual_analysis) -> List[str]:
+        """Draft markdown for one HTML chunk, reusing a cached draft of identical content when available"""
+        if self.draft_cache is None:
+            return self._draft_uncached(chunk, visual_analysis)
+        cached = self.draft_cache.get(chunk)
+        if cached is not None:
+            metrics.inc('draft_cache_hits')
+            return [cached] if cached else []
+        metrics.inc('draft_cache_misses')
+        markdown_parts = self._draft_uncached(chunk, visual_analysis)
+        self.draft_cache.put(chunk, '\n\n'.join(markdown_parts))
+        return markdown_parts
+
+    def _draft_uncached(self, chunk: str, visual_analysis) -> List[str]:
+        """Draft markdown for one HTML chunk, splitting it further if it overflows the context"""
+        try:
+            with metrics.stage('draft'):
+                markdown_part = deadlines.call(generate_markdown_draft, chunk, visual_analysis, stage='draft')
+            return [markdown_part] if markdown_part else []
+        except openai.BadRequestError as e:
+            if "context_length_exceeded" not in str(e):
+                raise
+            metrics.inc('retries', stage='draft')
+            markdown_parts = []
+            for smaller_chunk in filter_and_chunk_content(chunk, max_chunk_size=50000):
+                with metrics.stage('draft'):
+                    markdown_part = deadlines.call(generate_markdown_draft, smaller_chunk, visual_analysis,
+                                                   stage='draft')
+                if markdown_part:
+                    markdown_parts.append(markdown_part)
+            return markdown_parts
+
+    @contextmanager
+    def _large_page_text(self, url: str, prepared: Optional[Dict]) -> Iterator[str]:
+        """Yield the text chunks of a large page, from prepare()'s spooled body or a fresh download"""
+        spooled = prepared.get('body') if prepared else None
+        if spooled is not None:
+            with spooled:
+                yield spooled.text_chunks()
+        else:
+            with self.html_scraper.fetcher.stream_text(url, max_body_size=self.max_large_page_size,
+                                                       source='scrape') as (_, text_chunks):
+                yield text_chunks
+
+    def convert_streamed(self, url: str, page: Dict, prepared: Dict) -> Dict:
+        """Convert a large page or a PDF from prepare(), drafting each part as it is read"""
+        if prepared.get('pdf'):
+            return self._convert_pdf(url, page, prepared)
+        return self._convert_large_page(url, page, prepared)
+
+    def _convert_large_page(self, url: str, page: Dict, prepared: Optional[Dict] = None) -> Dict:
+        """Convert a page too large to hold in memory by streaming it through the chunker
+        
+        The body is parsed and minified as it downloads and each chunk is drafted
+        and validated on its own, so peak memory tracks the chunk size instead of
+        the page size. Analysis statistics come from the same pass. The capture
+        and spooled body from prepare() are reused when given, so the page is
+        not downloaded twice.
+        """
+        page['strategy'] = 'html-streamed'
+        if prepared is not None:
+            screenshot, screenshot_hash = prepared['screenshot'], prepared['screenshot_hash']
+        else:
+            with metrics.stage('capture'):
+                screenshot, _ = self.visual_scraper.capture_with_layout(url, record_layout=False)
+            screenshot_hash = self._save_screenshot(screenshot, url)
+        _, visual_analysis = self._analyze_screenshot(screenshot, screenshot_hash)
+        
+        chunker = StreamingChunker(chunk_chars=self.large_page_chunk_size)
+        markdown_parts = []
+        timed_out = False
+        try:
+            with self._large_page_text(url, prepared) as text_chunks:
+                for i, chunk in enumerate(stream_chunks(text_chunks, chunker), 1):
+                    logger.info(f"Drafting streamed chunk {i} ({len(chunk)} characters)")
+                    metrics.inc('prompt_tokens_estimated_minified', len(chunk) // 4)
+                    for markdown_part in self.draft_chunk(chunk, visual_analysis):
+                        with metrics.stage('validate'):
+                            markdown_parts.append(deadlines.call(validate_markdown_format, markdown_part,
+                                                                 stage='validate'))
+        except DeadlineExceeded as e:
+            # Chunks already drafted and validated are kept; the rest of the page is dropped
+            page['status'] = 'timeout'
+            if not markdown_parts:
+                raise
+            logger.warning(f"{e}; keeping {len(markdown_parts)} streamed parts of {url}")
+            timed_out = True
+        
+        if not timed_out:
+            analysis = build_stream_analysis(url, chunker, self.analyzer)
+            metrics.inc('prompt_tokens_estimated_raw', analysis['stats']['total_length'] // 4)
+            logger.info(f"Streamed {analysis['stats']['total_length']} characters: {analysis['recommendations']}")
+        page_title = chunker.title
+        final_markdown = validate_document_title('\n\n'.join(markdown_parts), visual_analysis, page_title)
+        return {
+            'url': url,
+            'markdown': final_markdown,
+            'title': page_title,
+            'html': None,
+            'links': chunker.links,
+            'strategy': page['strategy'],
+            'timings': dict(page['stages']),
+            'screenshot': screenshot,
+            'timed_out': timed_out
+        }
+
+    def _convert_pdf(self, url: str, page: Dict, prepared: Dict) -> Dict:
+        """Convert a PDF from its own text layer instead of a screenshot and OCR
+        
+        Pages are extracted one at a time (see pdf.py) and drafted in groups of
+        up to pdf_chunk_size characters as each group fills, so drafting starts
+        before the rest of the document is read. Only pages without a text layer
+        are rendered and OCRed. Each group is validated on its own, as with
+        streamed large pages.
+        """
+        page['strategy'] = 'pdf'
+        with metrics.stage('pdf_open'):
+            document = PDFDocument(prepared['content'])
+        logger.info(f"Converting PDF with {document.page_count} pages from its text layer")
+        page_title = document.title or os.path.basename(urlparse(url).path) or url
+        image_dir = None
+        if self.pdf_image_dir:
+            image_dir = document_image_dir(self.pdf_image_dir, url, prepared['content'])
+        links: List[str] = []
+        markdown_parts = []
+        timed_out = False
+        try:
+            with document:
+                for pages, pdf_markdown in self._pdf_chunks(document, links, image_dir):
+                    logger.info(f"Drafting PDF pages {pages} ({len(pdf_markdown)} characters)")
+                    metrics.inc('prompt_tokens_estimated_minified', len(pdf_markdown) // 4)
+                    with metrics.stage('draft'):
+                        markdown_part = deadlines.call(generate_markdown_from_pdf, pdf_markdown, pages, stage='draft')
+                    if markdown_part:
+                        with metrics.stage('validate'):
+                            markdown_parts.append(deadlines.call(validate_markdown_format, markdown_part,
+                                                                 stage='validate'))
+        except DeadlineExceeded as e:
+            # Page groups already drafted and validated are kept; the rest of the document is dropped
+            page['status'] = 'timeout'
+            if not markdown_parts:
+                raise
+            logger.warning(f"{e}; keeping {len(markdown_parts)} drafted parts of {url}")
+            timed_out = True
+        
+        final_markdown = validate_document_title('\n\n'.join(markdown_parts), {}, page_title)
+        return {
+            'url': url,
+            'markdown': final_markdown,
+            'title': page_title,
+            'html': None,
+            'links': links,
+            'strategy': page['strategy'],
+            'timings': dict(page['stages']),
+            'screenshot': None,
+            'timed_out': timed_out
+        }
+
+    def _pdf_chunks(self, document: PDFDocument, links: List[str],
+                    image_dir: Optional[str] = None) -> Iterator[Tuple[str, str]]:
+        """Yield (page range, markdown) groups of extracted PDF pages, collecting their links
+        
+        Embedded images are saved to image_dir (when given), which should be
+        specific to the document (see document_image_dir).
+        """
+        def ocr(image: Image.Image) -> str:
+            with metrics.stage('ocr'):
+                return self._ocr(image)
+        
+        extracted_pages = document.pages(ocr=ocr, image_dir=image_dir,
+                                         image_link_base=self.output_dir if image_dir else None)
+        group: List[Dict] = []
+        size = 0
+        while True:
+            with metrics.stage('pdf_extract'):
+                extracted = next(extracted_pages, None)
+            if extracted is None:
+                break
+            metrics.inc('pdf_pages', ocr=str(extracted['ocr']).lower())
+            links.extend(extracted['links'])
+            if not extracted['markdown']:
+                continue
+            if group and size + len(extracted['markdown']) > self.pdf_chunk_size:
+                yield self._pdf_group(group)
+                group, size = [], 0
+            group.append(extracted)
+            size += len(extracted['markdown'])
+        if group:
+            yield self._pdf_group(group)
+
+    @staticmethod
+    def _pdf_group(group: List[Dict]) -> Tuple[str, str]:
+        first, last = group[0]['number'], group[-1]['number']
+        pages = str(first) if first == last else f"{first}-{last}"
+        return pages, '\n\n'.join(extracted['markdown'] for extracted in group)
+
     def _save_markdown(self, markdown_content: str, url: str):
         """Save markdown content to a file"""
         filename = self._generate_filename(url)
@@ -573,25 +1158,81 @@ class ContentProcessor:
 
     def _generate_sequence_filename(self, url: str, prefix: str, sequence: int) -> str:
         """Generate a filename with sequence number and prefix"""
-        # Extract the last part of the path
-        path = urlparse(url).path.strip('/')
-        last_segment = path.split('/')[-1] if path else ''
-        
-        # Clean up the segment
-        clean_segment = re.sub(r'[^\w\s-]', '', last_segment.lower())
-        clean_segment = re.sub(r'[-\s]+', '-', clean_segment)
-        
-        # Format with two-digit sequence number
-        filename = f"{prefix}-{sequence:03d}-{clean_segment}"
-        
-        # Truncate if too long (leaving room for extension)
-        if len(filename) > 46:  # 50 - 4 (.md)
-            filename = filename[:46]
+        return os.path.join(self.output_dir, sequence_filename(url, prefix, sequence))
+
+    def write_result(self, result: Dict, number: int, prefix: str, sink: OutputSink) -> str:
+        """Write a conversion result to the sink (and the search index, when set), returning where it went"""
+        record = build_record(result, number, prefix)
+        with metrics.stage('write'):
+            output_file = sink.write(record)
+        metrics.inc('bytes_written', len(result['markdown'].encode('utf-8')))
+        if self.search_index is not None:
+            with metrics.stage('index'):
+                self.search_index.index_record(record)
+        return output_file
+
+    def convert_entries(self, entries: Iterable[Tuple[int, str]], prefix: str, sink: OutputSink,
+                        total: Optional[int] = None) -> Iterator[Dict]:
+        """Convert and write (number, url) entries one at a time, yielding each outcome as soon as it is settled
         
-        return os.path.join(self.output_dir, f"{filename}.md")
+        Outcomes carry number, url, status ('ok', 'timeout', 'failed' or 'skipped'),
+        output (where the record went, None without output) and error. URLs that
+        run out of their time budget are not retried; once the batch deadline
+        passes, the remaining entries are skipped.
+        """
+        deadline_logged = False
+        for number, url in entries:
+            outcome = {'number': number, 'url': url, 'status': 'failed', 'output': None, 'error': None}
+            if self.batch_deadline is not None and self.batch_deadline.expired():
+                if not deadline_logged:
+                    logger.error("Batch deadline reached; skipping the remaining URLs")
+                    deadline_logged = True
+                metrics.inc('urls_skipped', reason='batch_deadline')
+                outcome.update(status='skipped', error='Batch deadline reached')
+                yield outcome
+                continue
+            
+            progress = f"{number}/{total}" if total else str(number)
+            max_retries = 3
+            for attempt in range(max_retries):
+                try:
+                    logger.info(f"Processing URL {progress}: {url} (attempt {attempt + 1}/{max_retries})")
+                    result = self.convert(url)
+                    # Use the number from the config file instead of the loop index
+                    output_file = self.write_result(result, number, prefix, sink)
+                    
+                    outcome['output'] = output_file
+                    if result.get('timed_out'):
+                        outcome['status'] = 'timeout'
+                        logger.warning(f"Saved partial output to: {output_file}")
+                    else:
+                        outcome['status'] = 'ok'
+                        logger.info(f"Saved to: {output_file}")
+                    break
+                
+                except DeadlineExceeded as e:
+                    # Retrying a page that used up its budget would only multiply the stall
+                    logger.error(f"URL {number}, {url} timed out with no output: {e}")
+                    outcome.update(status='timeout', error=str(e))
+                    break
+                    
+                except Exception as e:
+                    logger.error(f"Attempt {attempt + 1} failed for URL {number}, {url}: {e}")
+                    outcome['error'] = str(e)
+                    if attempt < max_retries - 1:
+                        metrics.inc('retries', stage='url')
+                    time.sleep(2)  # Wait before retry
+            yield outcome
 
-    def process_urls_from_config(self, config_file: str, prefix: str = "doc") -> List[str]:
-        """Process multiple URLs from a config file with retry logic"""
+    def process_urls_from_config(self, config_file: str, prefix: str = "doc",
+                                 sink: Optional[OutputSink] = None,
+                                 batch_timeout: Optional[float] = None) -> List[str]:
+        """Process multiple URLs from a config file with retry logic
+        
+        Pages go to the given output sink (one file per page in output_dir by default).
+        URLs that run out of their time budget are not retried; once the batch
+        deadline passes, the remaining URLs are skipped.
+        """
         logger.info(f"Reading URLs from config file: {config_file}")
         
         try:
@@ -601,31 +1242,35 @@ class ContentProcessor:
             if not url_entries:
                 raise ValueError("No valid URLs found in config file")
             
+            if self.boilerplate_dir:
+                # Pages record their own blocks as they are converted; only a host with too few
+                # pages on record gets a few fetched up front, so its first pages are stripped too
+                indexes = build_indexes([url for _, url in url_entries], self.boilerplate_dir,
+                                        fetcher=self.html_scraper.fetcher,
+                                        pages_per_host=BOILERPLATE_MIN_PAGES)
+                self._boilerplate_indexes.update({index.path: index for index in indexes.values()})
+            
+            if sink is None:
+                sink = FileSink(self.output_dir)
+            if batch_timeout is not None:
+                self.batch_deadline = Deadline(batch_timeout, label='Batch')
             output_files = []
             failed_urls = []
+            timed_out_urls = []
             
-            for number, url in url_entries:
-                max_retries = 3
-                for attempt in range(max_retries):
-                    try:
-                        logger.info(f"Processing URL {number}/{len(url_entries)}: {url} (attempt {attempt + 1}/{max_retries})")
-                        markdown_content = self.process_url(url)
-                        
-                        # Use the number from the config file instead of the loop index
-                        output_file = self._generate_sequence_filename(url, prefix, number)
-                        with open(output_file, 'w', encoding='utf-8') as f:
-                            f.write(markdown_content)
-                        
-                        output_files.append(output_file)
-                        logger.info(f"Saved to: {output_file}")
-                        break
-                        
-                    except Exception as e:
-                        logger.error(f"Attempt {attempt + 1} failed for URL {number}, {url}: {e}")
-                        if attempt == max_retries - 1:
-                            failed_urls.append((number, url))
-                        time.sleep(2)  # Wait before retry
+            for outcome in self.convert_entries(url_entries, prefix, sink, total=len(url_entries)):
+                entry = (outcome['number'], outcome['url'])
+                if outcome['output']:
+                    output_files.append(outcome['output'])
+                else:
+                    failed_urls.append(entry)
+                if outcome['status'] == 'timeout':
+                    timed_out_urls.append(entry)
             
+            sink.flush()
+            self.save_boilerplate_indexes()
+            if timed_out_urls:
+                logger.warning(f"{len(timed_out_urls)} URLs ran out of time: {timed_out_urls}")
             if failed_urls:
                 logger.error(f"Failed to process {len(failed_urls)} URLs: {failed_urls}")
             
@@ -636,6 +1281,53 @@ class ContentProcessor:
             logger.error(f"Error reading config file: {e}")
             raise
 
+    def process_urls_streaming(self, config_file: str, prefix: str = "doc",
+                               sink: Optional[OutputSink] = None,
+                               batch_timeout: Optional[float] = None,
+                               manifest_path: Optional[str] = None,
+                               manifest_batch: int = 50) -> Dict[str, int]:
+        """Process a URL list of any size in file order, appending each outcome to a JSONL manifest
+        
+        Entries are read lazily (YAML, plain text or JSONL, see inputs.py) and no
+        per-URL state is kept, so startup is immediate and memory stays flat.
+        Manifest lines are written in groups of manifest_batch, each right after
+        the sink is flushed, so every listed output is already durable. Per-page
+        metrics go to <prefix>-page-metrics.jsonl next to the manifest.
+        Returns the number of URLs per status.
+        """
+        logger.info(f"Streaming URLs from: {config_file}")
+        
+        if sink is None:
+            sink = FileSink(self.output_dir)
+        if batch_timeout is not None:
+            self.batch_deadline = Deadline(batch_timeout, label='Batch')
+        manifest_path = manifest_path or os.path.join(self.output_dir, f"{prefix}-manifest.jsonl")
+        os.makedirs(os.path.dirname(manifest_path) or '.', exist_ok=True)
+        
+        page_metrics_path = os.path.join(os.path.dirname(manifest_path), f"{prefix}-page-metrics.jsonl")
+        
+        counts: Dict[str, int] = {}
+        pending: List[str] = []
+        with open(manifest_path, 'a', encoding='utf-8') as manifest, metrics.page_log(page_metrics_path):
+            def write_pending():
+                sink.flush()
+                # Boilerplate indexes learn from every converted page (see _chunk_html)
+                self.save_boilerplate_indexes()
+                manifest.writelines(pending)
+                manifest.flush()
+                pending.clear()
+            
+            for outcome in self.convert_entries(iter_config_entries(config_file), prefix, sink):
+                counts[outcome['status']] = counts.get(outcome['status'], 0) + 1
+                pending.append(json.dumps(dict(outcome, time=time.time())) + '\n')
+                if len(pending) >= manifest_batch:
+                    write_pending()
+            write_pending()
+        
+        logger.info(f"Streaming batch completed: {counts}; outcomes in {manifest_path}, "
+                    f"page metrics in {page_metrics_path}")
+        return counts
+
 @ell.simple(model="gpt-4o-mini", client=openai_client)
 def analyze_section(section: Image.Image) -> Dict:
     """Analyze a single section of the webpage screenshot."""
@@ -797,38 +1489,90 @@ def parse_config_file(config_path: str) -> List[Tuple[int, str]]:
     Parse the config file containing numbered URLs
     Returns a list of tuples containing (number, url)
     """
-    urls = []
-    with open(config_path, 'r') as f:
-        yaml_content = yaml.safe_load(f)
-        
-        if 'urls' in yaml_content:
-            for url_entry in yaml_content['urls']:
-                # Split on comma and strip whitespace
-                parts = url_entry.split(',', 1)
-                if len(parts) == 2:
-                    # Extract number and URL
-                    number = int(parts[0].strip())
-                    url = parts[1].strip()
-                    urls.append((number, url))
-    
-    # Sort by number to maintain order
-    urls.sort(key=lambda x: x[0])
-    return urls
+    # Sort by number to maintain order; iter_config_entries streams in file order instead
+    return sorted(iter_config_entries(config_path), key=lambda x: x[0])
 
 def main():
     """Main function to run the converter"""
     parser = argparse.ArgumentParser(description='Convert web content to markdown')
     parser.add_argument('--url', help='Target URL to convert')
-    parser.add_argument('--config', help='YAML config file containing URLs to process')
+    parser.add_argument('--config', help='URL list to process: YAML config, .txt or .jsonl (optionally .gz)')
+    parser.add_argument('--stream', action='store_true',
+                        help='Read --config lazily in file order and append outcomes to a manifest (for huge lists)')
+    parser.add_argument('--manifest', help='JSONL manifest for --stream (default: output/<prefix>-manifest.jsonl)')
     parser.add_argument('--prefix', default='doc', help='Prefix for output filenames (default: doc)')
+    parser.add_argument('--metrics-json', help='Write a per-run JSON metrics summary to this file')
+    parser.add_argument('--metrics-prom', help='Write Prometheus text-format metrics to this file')
+    parser.add_argument('--metrics-port', type=int, help='Serve Prometheus metrics on this port while running')
+    parser.add_argument('--profile', action='store_true', help='Write a cProfile dump (stage threads included) and collapsed stacks per URL')
+    parser.add_argument('--trace-memory', action='store_true', help='Write a tracemalloc top-N report per URL')
+    parser.add_argument('--profile-dir', default=os.path.join('output', 'profiles'),
+                        help='Directory for profiling output (default: output/profiles)')
+    parser.add_argument('--chunking', choices=['size', 'content'], default='size',
+                        help='Chunk boundaries by running size (chunks up to 100k tokens) or by content, '
+                             'stable across edits (chunks of about 8k tokens) (default: size)')
+    parser.add_argument('--draft-cache', help='SQLite file caching chunk drafts by fingerprint for re-conversions')
+    parser.add_argument('--strip-boilerplate', action='store_true',
+                        help='Strip blocks repeated across the pages of a site (indexes learn from each converted page)')
+    parser.add_argument('--boilerplate-dir', default=os.path.join('output', 'boilerplate'),
+                        help='Directory for per-host boilerplate indexes (default: output/boilerplate)')
+    parser.add_argument('--output',
+                        help='Output directory, or a single archive: *.db (SQLite) or *.jsonl[.gz] (default: output)')
+    parser.add_argument('--archive-screenshots', action='store_true',
+                        help='Store screenshots in the --output archive instead of as separate PNG files')
+    parser.add_argument('--search-index', help='SQLite full-text index to update with each converted page')
+    parser.add_argument('--screenshot-store',
+                        help='Directory of a content-addressed screenshot store (dedups captures, caches vision)')
+    parser.add_argument('--near-duplicate-distance', type=int, default=0,
+                        help='Treat a capture within this dHash distance (of 1024 bits) of the previous one as unchanged')
+    parser.add_argument('--screenshot-max-age-days', type=float,
+                        help='Prune stored screenshots not captured for this many days')
+    parser.add_argument('--screenshot-max-mb', type=float, help='Cap the screenshot store at this many megabytes')
+    parser.add_argument('--url-timeout', type=float,
+                        help='Seconds one URL may take across fetch, browser, OCR and LLM calls before it is cut off')
+    parser.add_argument('--batch-timeout', type=float,
+                        help='Seconds the whole --config batch may take; URLs not started by then are skipped')
+    parser.add_argument('--pdf-images', help='Save images embedded in PDFs under this directory, one subdirectory per document, and link them')
+    parser.add_argument('--max-page-mb', type=float, default=1024,
+                        help='Largest HTML page to stream-convert, in megabytes (default: 1024)')
+    parser.add_argument('--max-pdf-mb', type=float, default=100,
+                        help='Largest PDF to download, in megabytes (default: 100)')
     args = parser.parse_args()
     
+    if args.metrics_port:
+        metrics.serve(args.metrics_port)
+    
     converter = ContentProcessor()
+    converter.profiler = ConversionProfiler(args.profile_dir, cpu=args.profile, memory=args.trace_memory)
+    if args.strip_boilerplate:
+        converter.boilerplate_dir = args.boilerplate_dir
+    converter.chunking = args.chunking
+    if args.draft_cache:
+        converter.draft_cache = DraftCache(args.draft_cache, DRAFT_MODEL, DRAFT_PROMPT_VERSION)
+    
+    sink = open_sink(args.output, converter.output_dir, store_screenshots=args.archive_screenshots)
+    converter.save_screenshots = not sink.stores_screenshots
+    if args.search_index:
+        converter.search_index = SearchIndex(args.search_index)
+    if args.screenshot_store:
+        converter.screenshot_store = ScreenshotStore(
+            args.screenshot_store, near_duplicate_distance=args.near_duplicate_distance,
+            max_age=args.screenshot_max_age_days * 86400 if args.screenshot_max_age_days is not None else None,
+            max_bytes=int(args.screenshot_max_mb * 1024 * 1024) if args.screenshot_max_mb is not None else None)
+    converter.url_timeout = args.url_timeout
+    converter.pdf_image_dir = args.pdf_images
+    converter.max_pdf_size = int(args.max_pdf_mb * 1024 * 1024)
+    converter.max_large_page_size = int(args.max_page_mb * 1024 * 1024)
     
     try:
-        if args.config:
+        if args.config and args.stream:
+            counts = converter.process_urls_streaming(args.config, args.prefix, sink, args.batch_timeout,
+                                                      args.manifest)
+            logger.info(f"Streaming batch completed: {counts}")
+            
+        elif args.config:
             # Batch processing mode
-            output_files = converter.process_urls_from_config(args.config, args.prefix)
+            output_files = converter.process_urls_from_config(args.config, args.prefix, sink, args.batch_timeout)
             logger.info(f"Batch processing completed. Generated {len(output_files)} files")
             
         else:
@@ -844,6 +1588,17 @@ def main():
     except Exception as e:
         logger.error(f"Conversion failed: {e}")
         raise
+    
+    finally:
+        sink.close()
+        if converter.search_index is not None:
+            converter.search_index.close()
+        if converter.screenshot_store is not None:
+            converter.screenshot_store.close()
+        if args.metrics_json:
+            metrics.write_json(args.metrics_json)
+        if args.metrics_prom:
+            metrics.write_prometheus(args.metrics_prom)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
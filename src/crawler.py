@@ -0,0 +1,519 @@
+"""
+Site Crawler
+Discovers pages from seed URLs or a sitemap.xml and feeds them through the
+conversion pipeline, keeping a persistent frontier so large sites can be
+ingested without a hand-written config file. robots.txt rules (including
+Crawl-delay) are honoured unless disabled.
+"""
+
+import os
+import re
+import gzip
+import time
+import sqlite3
+import logging
+import argparse
+import threading
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urljoin, urlparse, urlunparse, parse_qsl, urlencode
+from urllib.robotparser import RobotFileParser
+from bs4 import BeautifulSoup
+from .metrics import metrics
+from .fetcher import get_default_fetcher
+from .deadlines import DeadlineExceeded
+from .sinks import FileSink, build_record, open_sink
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(message)s',
+    datefmt='%H:%M:%S'
+)
+logger = logging.getLogger(__name__)
+
+# Query parameters that never change the content of a page
+TRACKING_PARAMS = re.compile(r'^(utm_\w+|gclid|fbclid|ref|ref_src)$', re.IGNORECASE)
+
+# Links to these resources are never converted
+SKIPPED_EXTENSIONS = (
+    '.png', '.jpg', '.jpeg', '.gif', '.svg', '.webp', '.ico', '.css', '.js', '.json',
+    '.xml', '.zip', '.gz', '.tar', '.mp4', '.mp3', '.woff', '.woff2', '.ttf'
+)
+
+
+def normalize_url(url: str) -> str:
+    """Normalize a URL so equivalent addresses deduplicate to the same frontier entry"""
+    parsed = urlparse(url.strip())
+    scheme = parsed.scheme.lower()
+    host = (parsed.hostname or '').lower()
+    if parsed.port and not ((scheme == 'http' and parsed.port == 80) or
+                            (scheme == 'https' and parsed.port == 443)):
+        host = f"{host}:{parsed.port}"
+
+    path = re.sub(r'/{2,}', '/', parsed.path or '/')
+    if path != '/' and path.endswith('/'):
+        path = path.rstrip('/')
+
+    query = [(k, v) for k, v in parse_qsl(parsed.query, keep_blank_values=True)
+             if not TRACKING_PARAMS.match(k)]
+    query.sort()
+
+    # Fragments only address a position within the same page
+    return urlunparse((scheme, host, path, '', urlencode(query), ''))
+
+
+def extract_links(html_content: str, base_url: str) -> List[str]:
+    """Extract absolute, normalized links from an HTML document"""
+    soup = BeautifulSoup(html_content, 'html.parser')
+    base_tag = soup.find('base', href=True)
+    if base_tag:
+        base_url = urljoin(base_url, base_tag['href'])
+    hrefs = [anchor['href'] for anchor in soup.find_all('a', href=True)
+             if 'nofollow' not in (anchor.get('rel') or [])]
+    return resolve_links(hrefs, base_url)
+
+
+def resolve_links(hrefs: Iterable[str], base_url: str) -> List[str]:
+    """Turn raw href values into absolute, normalized, deduplicated http(s) links"""
+    links = []
+    seen = set()
+    for href in hrefs:
+        href = href.strip()
+        if not href or href.startswith(('#', 'mailto:', 'javascript:', 'tel:', 'data:')):
+            continue
+        absolute = urljoin(base_url, href)
+        if urlparse(absolute).scheme not in ('http', 'https'):
+            continue
+        normalized = normalize_url(absolute)
+        if normalized not in seen:
+            seen.add(normalized)
+            links.append(normalized)
+    return links
+
+
+def parse_sitemap(content: bytes) -> Tuple[List[str], List[str]]:
+    """Parse sitemap XML and return (page urls, nested sitemap urls)"""
+    if content[:2] == b'\x1f\x8b':
+        content = gzip.decompress(content)
+    root = ET.fromstring(content)
+    locs = [el.text.strip() for el in root.iter() if el.tag.endswith('loc') and el.text]
+    if root.tag.endswith('sitemapindex'):
+        return [], locs
+    return locs, []
+
+
+class CrawlScope:
+    """Decides which discovered URLs belong to the crawl"""
+
+    def __init__(self, seeds: Iterable[str], allowed_hosts: Optional[Iterable[str]] = None,
+                 path_prefixes: Optional[Iterable[str]] = None,
+                 exclude_patterns: Optional[Iterable[str]] = None):
+        seeds = [normalize_url(seed) for seed in seeds]
+        self.allowed_hosts = set(allowed_hosts or [urlparse(seed).netloc for seed in seeds])
+        self.path_prefixes = list(path_prefixes or ['/'])
+        self.exclude_patterns = [re.compile(p) for p in (exclude_patterns or [])]
+
+    def __contains__(self, url: str) -> bool:
+        parsed = urlparse(url)
+        if parsed.netloc not in self.allowed_hosts:
+            return False
+        if not any(parsed.path.startswith(prefix) for prefix in self.path_prefixes):
+            return False
+        if parsed.path.lower().endswith(SKIPPED_EXTENSIONS):
+            return False
+        return not any(p.search(url) for p in self.exclude_patterns)
+
+
+class CrawlFrontier:
+    """Persistent, deduplicating URL frontier backed by SQLite
+
+    Every URL receives a sequence number the first time it is discovered, so
+    output filenames stay stable across resumed and repeated crawls.
+    """
+
+    def __init__(self, path: str = ':memory:'):
+        self.path = path
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS urls (
+                url TEXT PRIMARY KEY,
+                host TEXT NOT NULL,
+                sequence INTEGER UNIQUE NOT NULL,
+                depth INTEGER NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                output TEXT,
+                error TEXT
+            )''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_urls_status ON urls (status, sequence)')
+        # Work claimed by a crashed run goes back to the queue
+        self.conn.execute("UPDATE urls SET status = 'pending' WHERE status = 'in_progress'")
+        self.conn.commit()
+
+    def add(self, url: str, depth: int = 0) -> bool:
+        """Add a URL if it has not been seen before; returns True when it was new"""
+        url = normalize_url(url)
+        with self._lock:
+            row = self.conn.execute('SELECT COALESCE(MAX(sequence), 0) FROM urls').fetchone()
+            cursor = self.conn.execute(
+                'INSERT OR IGNORE INTO urls (url, host, sequence, depth) VALUES (?, ?, ?, ?)',
+                (url, urlparse(url).netloc, row[0] + 1, depth))
+            self.conn.commit()
+            return cursor.rowcount == 1
+
+    def claim(self, is_ready: Callable[[str], bool] = lambda host: True) -> Optional[Tuple[str, int, int]]:
+        """Claim the lowest-numbered pending URL whose host is ready for another request"""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT url, host, sequence, depth FROM urls WHERE status = 'pending' "
+                "ORDER BY sequence LIMIT 200").fetchall()
+            for url, host, sequence, depth in rows:
+                if is_ready(host):
+                    self.conn.execute(
+                        "UPDATE urls SET status = 'in_progress', attempts = attempts + 1 WHERE url = ?",
+                        (url,))
+                    self.conn.commit()
+                    return url, sequence, depth
+            return None
+
+    def complete(self, url: str, output: Optional[str] = None):
+        with self._lock:
+            self.conn.execute("UPDATE urls SET status = 'done', output = ?, error = NULL WHERE url = ?",
+                              (output, url))
+            self.conn.commit()
+
+    def fail(self, url: str, error: str, max_attempts: int = 3):
+        """Record a failure, returning the URL to the queue until it runs out of attempts"""
+        with self._lock:
+            self.conn.execute(
+                "UPDATE urls SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                "error = ? WHERE url = ?", (max_attempts, error, url))
+            self.conn.commit()
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self.conn.execute('SELECT status, COUNT(*) FROM urls GROUP BY status').fetchall()
+        return dict(rows)
+
+    def entries(self, status: Optional[str] = None) -> List[Tuple[int, str]]:
+        """Return (sequence, url) pairs in sequence order"""
+        query = 'SELECT sequence, url FROM urls'
+        params = ()
+        if status:
+            query += ' WHERE status = ?'
+            params = (status,)
+        with self._lock:
+            return self.conn.execute(query + ' ORDER BY sequence', params).fetchall()
+
+    def close(self):
+        self.conn.close()
+
+
+class RobotsRules:
+    """robots.txt rules, fetched once per host and cached
+
+    A missing or unreadable robots.txt allows everything.
+    """
+
+    def __init__(self, fetcher=None, user_agent: str = '*'):
+        self.fetcher = fetcher or get_default_fetcher()
+        self.user_agent = user_agent
+        self._lock = threading.Lock()
+        self._parsers: Dict[str, Optional[RobotFileParser]] = {}
+
+    def _parser(self, url: str) -> Optional[RobotFileParser]:
+        parsed = urlparse(url)
+        origin = f"{parsed.scheme}://{parsed.netloc}"
+        with self._lock:
+            if origin in self._parsers:
+                return self._parsers[origin]
+        robots_url = origin + '/robots.txt'
+        try:
+            text = self.fetcher.fetch(robots_url, max_body_size=512 * 1024, source='robots').text
+            parser = RobotFileParser(robots_url)
+            parser.parse(text.splitlines())
+        except Exception as e:
+            logger.info(f"No usable robots.txt at {robots_url} ({e}); allowing all paths")
+            parser = None
+        with self._lock:
+            return self._parsers.setdefault(origin, parser)
+
+    def allowed(self, url: str) -> bool:
+        parser = self._parser(url)
+        return parser is None or parser.can_fetch(self.user_agent, url)
+
+    def crawl_delay(self, url: str) -> Optional[float]:
+        parser = self._parser(url)
+        delay = parser.crawl_delay(self.user_agent) if parser is not None else None
+        return float(delay) if delay is not None else None
+
+
+class HostPoliteness:
+    """Per-host request spacing and concurrency limits"""
+
+    def __init__(self, min_delay: float = 1.0, max_concurrent: int = 2):
+        self.min_delay = min_delay
+        self.max_concurrent = max_concurrent
+        self._lock = threading.Lock()
+        self._active: Dict[str, int] = {}
+        self._last_start: Dict[str, float] = {}
+        self._delays: Dict[str, float] = {}
+
+    def set_min_delay(self, host: str, seconds: float):
+        """Space requests to one host further apart (e.g. for its Crawl-delay); never below min_delay"""
+        with self._lock:
+            self._delays[host] = max(self.min_delay, seconds)
+
+    def try_acquire(self, host: str) -> bool:
+        """Reserve a request slot for the host if its limits allow one now"""
+        with self._lock:
+            now = time.monotonic()
+            if self._active.get(host, 0) >= self.max_concurrent:
+                return False
+            if now - self._last_start.get(host, 0.0) < self._delays.get(host, self.min_delay):
+                return False
+            self._active[host] = self._active.get(host, 0) + 1
+            self._last_start[host] = now
+            return True
+
+    def release(self, host: str):
+        with self._lock:
+            self._active[host] = max(0, self._active.get(host, 0) - 1)
+
+
+class SiteCrawler:
+    """Crawls a site and converts every in-scope page concurrently"""
+
+    def __init__(self, frontier: CrawlFrontier, scope: CrawlScope,
+                 processor_factory: Optional[Callable] = None, workers: int = 2,
+                 prefix: str = 'doc', max_pages: Optional[int] = None,
+                 max_depth: Optional[int] = None, politeness: Optional[HostPoliteness] = None,
+                 discover_only: bool = False, max_attempts: int = 3, sink=None,
+                 url_timeout: Optional[float] = None, robots: Optional[RobotsRules] = None):
+        self.frontier = frontier
+        self.scope = scope
+        self.processor_factory = processor_factory
+        self.workers = workers
+        self.prefix = prefix
+        self.max_pages = max_pages
+        self.max_depth = max_depth
+        self.politeness = politeness or HostPoliteness()
+        self.discover_only = discover_only
+        self.max_attempts = max_attempts
+        # OutputSink for converted pages; one file per page in output/ when None
+        self.sink = sink
+        # Per-page time budget handed to each worker's processor
+        self.url_timeout = url_timeout
+        self.fetcher = get_default_fetcher()
+        # None crawls regardless of robots.txt
+        self.robots = robots
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._claimed = 0
+        self.output_files: List[str] = []
+
+    def seed(self, urls: Iterable[str]) -> int:
+        """Add seed URLs to the frontier"""
+        return sum(self.frontier.add(url, 0) for url in urls
+                   if normalize_url(url) in self.scope and self._allowed(url))
+
+    def _allowed(self, url: str) -> bool:
+        """Check robots.txt, applying the host's Crawl-delay to the politeness limits"""
+        if self.robots is None:
+            return True
+        delay = self.robots.crawl_delay(url)
+        if delay:
+            self.politeness.set_min_delay(urlparse(normalize_url(url)).netloc, delay)
+        if self.robots.allowed(url):
+            return True
+        metrics.inc('robots_disallowed')
+        return False
+
+    def seed_sitemap(self, sitemap_url: str) -> int:
+        """Add every in-scope page listed in a sitemap (following sitemap indexes)"""
+        added = 0
+        pending = [sitemap_url]
+        visited = set()
+        while pending:
+            current = pending.pop()
+            if current in visited:
+                continue
+            visited.add(current)
+            try:
+                pages, sitemaps = parse_sitemap(self.fetcher.fetch(current, source='sitemap').content)
+            except Exception as e:
+                logger.error(f"Failed to read sitemap {current}: {e}")
+                continue
+            pending.extend(sitemaps)
+            added += self.seed(pages)
+        logger.info(f"Seeded {added} URLs from sitemap {sitemap_url}")
+        return added
+
+    def _processor(self):
+        # Each worker owns its own processor (and therefore its own browser)
+        if not hasattr(self._local, 'processor'):
+            self._local.processor = self.processor_factory()
+            self._local.processor.save_screenshots = not self.sink.stores_screenshots
+            self._local.processor.url_timeout = self.url_timeout
+        return self._local.processor
+
+    def _claim(self) -> Optional[Tuple[str, int, int]]:
+        with self._lock:
+            if self.max_pages is not None and self._claimed >= self.max_pages:
+                return None
+            entry = self.frontier.claim(self.politeness.try_acquire)
+            if entry:
+                self._claimed += 1
+                self._in_flight += 1
+            return entry
+
+    def _finished(self) -> bool:
+        with self._lock:
+            if self._in_flight:
+                return False
+            if self.max_pages is not None and self._claimed >= self.max_pages:
+                return True
+        return self.frontier.counts().get('pending', 0) == 0
+
+    def _handle(self, url: str, sequence: int, depth: int):
+        """Fetch or convert one page, then enqueue its in-scope links"""
+        if self.discover_only:
+            response = self.fetcher.fetch(url, source='crawl')
+            html_content = response.text if 'html' in (response.content_type or 'html') else ''
+            links = extract_links(html_content, url) if html_content else []
+            output_file = None
+        else:
+            processor = self._processor()
+            result = processor.convert(url)
+            # Large pages are streamed, so only their links come back rather than the HTML
+            if result.get('links') is not None:
+                links = resolve_links(result['links'], url)
+            else:
+                links = extract_links(result['html'], url) if result['html'] else []
+            with metrics.stage('write', strategy=result['strategy']):
+                output_file = self.sink.write(build_record(result, sequence, self.prefix))
+            with self._lock:
+                self.output_files.append(output_file)
+            logger.info(f"Saved to: {output_file}")
+
+        if links and (self.max_depth is None or depth < self.max_depth):
+            new_links = sum(self.frontier.add(link, depth + 1) for link in links
+                            if link in self.scope and self._allowed(link))
+            if new_links:
+                logger.info(f"Discovered {new_links} new URLs on {url}")
+        return output_file
+
+    def _worker(self):
+        while True:
+            entry = self._claim()
+            if entry is None:
+                if self._finished():
+                    return
+                time.sleep(0.1)
+                continue
+
+            url, sequence, depth = entry
+            host = urlparse(url).netloc
+            try:
+                logger.info(f"Crawling {sequence}: {url} (depth {depth})")
+                output_file = self._handle(url, sequence, depth)
+                self.frontier.complete(url, output_file)
+            except DeadlineExceeded as e:
+                # A page that used up its whole budget is not retried
+                logger.error(f"Timed out processing {url}: {e}")
+                self.frontier.fail(url, str(e), max_attempts=0)
+            except Exception as e:
+                logger.error(f"Failed to process {url}: {e}")
+                self.frontier.fail(url, str(e), self.max_attempts)
+            finally:
+                self.politeness.release(host)
+                with self._lock:
+                    self._in_flight -= 1
+
+    def run(self) -> List[str]:
+        """Crawl until the frontier is exhausted or max_pages is reached"""
+        if not self.discover_only and self.processor_factory is None:
+            from .convert import ContentProcessor
+            self.processor_factory = ContentProcessor
+        if self.sink is None:
+            self.sink = FileSink()
+
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                futures = [executor.submit(self._worker) for _ in range(self.workers)]
+                for future in futures:
+                    future.result()
+        finally:
+            self.sink.flush()
+
+        logger.info(f"Crawl finished: {self.frontier.counts()}")
+        return self.output_files
+
+    def write_config(self, config_file: str):
+        """Write discovered URLs in the numbered config format used by convert.py"""
+        with open(config_file, 'w', encoding='utf-8') as f:
+            f.write('urls:\n')
+            for sequence, url in self.frontier.entries():
+                f.write(f"  - {sequence:02d}, {url}\n")
+        logger.info(f"Wrote discovered URLs to {config_file}")
+
+
+def main():
+    """Main function to run the crawler"""
+    parser = argparse.ArgumentParser(description='Crawl a site and convert its pages to markdown')
+    parser.add_argument('--seed', action='append', default=[], help='Seed URL (repeatable)')
+    parser.add_argument('--sitemap', action='append', default=[], help='Sitemap URL (repeatable)')
+    parser.add_argument('--frontier', default='output/crawl.db', help='Frontier database (default: output/crawl.db)')
+    parser.add_argument('--prefix', default='doc', help='Prefix for output filenames (default: doc)')
+    parser.add_argument('--workers', type=int, default=2, help='Concurrent conversions (default: 2)')
+    parser.add_argument('--max-pages', type=int, help='Stop after this many pages')
+    parser.add_argument('--max-depth', type=int, help='Maximum link depth from the seeds')
+    parser.add_argument('--delay', type=float, default=1.0, help='Minimum seconds between requests to one host')
+    parser.add_argument('--per-host', type=int, default=2, help='Maximum concurrent requests per host')
+    parser.add_argument('--path-prefix', action='append', help='Only follow links under this path (repeatable)')
+    parser.add_argument('--exclude', action='append', help='Regex of URLs to skip (repeatable)')
+    parser.add_argument('--discover-only', action='store_true', help='Only discover URLs, do not convert')
+    parser.add_argument('--write-config', help='Write discovered URLs to a config file')
+    parser.add_argument('--output',
+                        help='Output directory, or a single archive: *.db (SQLite) or *.jsonl[.gz] (default: output)')
+    parser.add_argument('--archive-screenshots', action='store_true',
+                        help='Store screenshots in the --output archive instead of as separate PNG files')
+    parser.add_argument('--url-timeout', type=float, help='Seconds one page may take before it is cut off')
+    parser.add_argument('--ignore-robots', action='store_true', help='Crawl paths disallowed by robots.txt')
+    args = parser.parse_args()
+
+    if not args.seed and not args.sitemap:
+        parser.error('Provide at least one --seed or --sitemap')
+
+    if os.path.dirname(args.frontier):
+        os.makedirs(os.path.dirname(args.frontier), exist_ok=True)
+
+    frontier = CrawlFrontier(args.frontier)
+    scope = CrawlScope(args.seed + args.sitemap, path_prefixes=args.path_prefix,
+                       exclude_patterns=args.exclude)
+    crawler = SiteCrawler(frontier, scope, workers=args.workers, prefix=args.prefix,
+                          max_pages=args.max_pages, max_depth=args.max_depth,
+                          politeness=HostPoliteness(args.delay, args.per_host),
+                          discover_only=args.discover_only,
+                          sink=open_sink(args.output, store_screenshots=args.archive_screenshots),
+                          url_timeout=args.url_timeout,
+                          robots=None if args.ignore_robots else RobotsRules())
+    crawler.seed(args.seed)
+    for sitemap in args.sitemap:
+        crawler.seed_sitemap(sitemap)
+
+    try:
+        output_files = crawler.run()
+        if args.write_config:
+            crawler.write_config(args.write_config)
+        logger.info(f"Crawl completed. Generated {len(output_files)} files")
+    finally:
+        crawler.sink.close()
+        frontier.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Deadlines
+Per-URL time budgets nested inside an optional batch deadline. The active
+deadline is kept per thread, so the fetcher, the browser, OCR and the LLM
+calls can each cap their own timeouts to whatever budget is left without it
+being passed through every call. Work that runs out of budget raises
+DeadlineExceeded at the next check; LLM calls, which cannot be interrupted,
+are waited on from a helper thread and abandoned when the budget runs out.
+"""
+
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+from .metrics import metrics
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+
+class DeadlineExceeded(TimeoutError):
+    """The time budget of a URL or batch ran out"""
+
+    def __init__(self, stage: str, deadline: 'Deadline'):
+        self.stage = stage
+        self.deadline = deadline
+        subject = f"Deadline for {deadline.label}" if deadline.label else "Deadline"
+        super().__init__(f"{subject} exceeded during {stage}")
+
+
+class Deadline:
+    """A point in time work must finish by, never later than its parent's"""
+
+    def __init__(self, seconds: Optional[float] = None, parent: Optional['Deadline'] = None, label: str = ''):
+        self.seconds = seconds
+        self.label = label
+        candidates = [time.monotonic() + seconds] if seconds is not None else []
+        if parent is not None and parent.expires_at is not None:
+            candidates.append(parent.expires_at)
+        self.expires_at: Optional[float] = min(candidates) if candidates else None
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left, or None when unbounded"""
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.expires_at is not None and time.monotonic() >= self.expires_at
+
+    def check(self, stage: str):
+        """Raise DeadlineExceeded if the budget is spent"""
+        if self.expired():
+            metrics.inc('deadline_exceeded', stage=stage)
+            raise DeadlineExceeded(stage, self)
+
+    def cap(self, timeout: Optional[float], stage: str) -> Optional[float]:
+        """The smaller of a timeout and the remaining budget (raises if none is left)"""
+        self.check(stage)
+        remaining = self.remaining()
+        if remaining is None:
+            return timeout
+        return remaining if timeout is None else min(timeout, remaining)
+
+
+def current() -> Optional[Deadline]:
+    """The deadline active on this thread, if any"""
+    return getattr(_local, 'deadline', None)
+
+
+@contextmanager
+def scope(deadline: Optional[Deadline]) -> Iterator[Optional[Deadline]]:
+    """Make a deadline the active one for the duration of the block"""
+    previous = current()
+    _local.deadline = deadline
+    try:
+        yield deadline
+    finally:
+        _local.deadline = previous
+
+
+def check(stage: str):
+    """Raise DeadlineExceeded if the active deadline is spent (no-op without one)"""
+    deadline = current()
+    if deadline is not None:
+        deadline.check(stage)
+
+
+def cap(timeout: Optional[float], stage: str) -> Optional[float]:
+    """Cap a timeout to the active deadline (unchanged without one)"""
+    deadline = current()
+    return timeout if deadline is None else deadline.cap(timeout, stage)
+
+
+def call(fn: Callable, *args, stage: str = 'call', **kwargs):
+    """Call fn, giving up when the active deadline expires
+
+    Without an active deadline this is a plain call. Otherwise fn runs on a
+    helper thread (sharing the caller's metrics page and deadline) and is
+    abandoned, not interrupted, once the budget runs out; its result is dropped.
+    """
+    deadline = current()
+    if deadline is None or deadline.expires_at is None:
+        return fn(*args, **kwargs)
+    deadline.check(stage)
+
+    page = metrics.current_page()
+    outcome = {}
+    done = threading.Event()
+
+    def run():
+        with metrics.bind_page(page), scope(deadline):
+            try:
+                outcome['value'] = fn(*args, **kwargs)
+            except BaseException as e:
+                outcome['error'] = e
+            finally:
+                done.set()
+
+    threading.Thread(target=run, name=f"{stage}-call", daemon=True).start()
+    if not done.wait(deadline.remaining()):
+        logger.warning(f"Abandoning {stage} call: {deadline.label or 'deadline'} exceeded")
+        metrics.inc('abandoned_calls', stage=stage)
+        metrics.inc('deadline_exceeded', stage=stage)
+        raise DeadlineExceeded(stage, deadline)
+    if 'error' in outcome:
+        raise outcome['error']
+    return outcome['value']
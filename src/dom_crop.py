@@ -0,0 +1,141 @@
+"""
+Main Content Cropping
+Maps the main_content box from the visual analysis back to a DOM subtree using
+element bounding rectangles recorded during the browser capture, so only that
+subtree is sent to the drafting stage.
+"""
+
+import re
+import json
+import logging
+from typing import Dict, List, Optional
+from bs4 import BeautifulSoup
+from bs4.element import Tag
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Runs in the page: records the viewport-relative rect and child-index path of sizeable elements
+LAYOUT_SCRIPT = """
+const vw = window.innerWidth, vh = window.innerHeight;
+const minArea = vw * vh * 0.01;
+const skipped = new Set(['SCRIPT', 'STYLE', 'NOSCRIPT', 'SVG', 'TEMPLATE', 'HEAD']);
+const elements = [];
+function walk(el, path, depth) {
+    if (elements.length >= 5000 || depth > 40 || skipped.has(el.tagName.toUpperCase())) return;
+    const r = el.getBoundingClientRect();
+    if (r.width * r.height >= minArea && r.bottom > 0 && r.top < vh) {
+        elements.push({path: path, tag: el.tagName.toLowerCase(), id: el.id || null,
+                       rect: [r.left, r.top, r.width, r.height]});
+    }
+    let i = 0;
+    for (const child of el.children) {
+        walk(child, path.concat([i]), depth + 1);
+        i++;
+    }
+}
+walk(document.documentElement, [], 0);
+return {viewport: {width: vw, height: vh}, elements: elements};
+"""
+
+
+def parse_visual_analysis(visual_analysis) -> Dict:
+    """Parse the vision model's JSON answer, tolerating markdown fences and surrounding prose"""
+    if isinstance(visual_analysis, dict):
+        return visual_analysis
+    match = re.search(r'\{.*\}', str(visual_analysis), re.DOTALL)
+    if not match:
+        return {}
+    try:
+        return json.loads(match.group(0))
+    except json.JSONDecodeError:
+        return {}
+
+
+def _main_box(analysis: Dict) -> Optional[List[float]]:
+    """Return the main content box as [left, top, right, bottom] fractions of the viewport"""
+    box = analysis.get('main_content')
+    if not isinstance(box, dict):
+        return None
+    try:
+        top, bottom = float(box['top']), float(box['bottom'])
+        left, right = float(box['left']), float(box['right'])
+    except (KeyError, TypeError, ValueError):
+        return None
+    # The prompt describes bottom/right as offsets from the far edge; accept either reading
+    if bottom <= top:
+        bottom = 1 - bottom
+    if right <= left:
+        right = 1 - right
+    if not (0 <= left < right <= 1 and 0 <= top < bottom <= 1):
+        return None
+    return [left, top, right, bottom]
+
+
+def find_main_element(layout: Dict, visual_analysis, min_score: float = 0.3) -> Optional[Dict]:
+    """Pick the recorded element that best matches the visual main content box"""
+    box = _main_box(parse_visual_analysis(visual_analysis))
+    viewport = (layout or {}).get('viewport') or {}
+    width, height = viewport.get('width'), viewport.get('height')
+    if not box or not width or not height:
+        return None
+
+    bl, bt, br, bb = box[0] * width, box[1] * height, box[2] * width, box[3] * height
+    box_area = (br - bl) * (bb - bt)
+    best, best_score = None, min_score
+    for element in layout.get('elements', []):
+        x, y, w, h = element['rect']
+        # Only the visible part of the element can be compared with the screenshot
+        el, et, er, eb = max(x, 0), max(y, 0), min(x + w, width), min(y + h, height)
+        if er <= el or eb <= et:
+            continue
+        overlap = max(0, min(er, br) - max(el, bl)) * max(0, min(eb, bb) - max(et, bt))
+        score = overlap / box_area * overlap / ((er - el) * (eb - et))
+        if score > best_score:
+            best, best_score = element, score
+    return best
+
+
+def _locate(soup: BeautifulSoup, element: Dict) -> Optional[Tag]:
+    """Find the parsed-HTML counterpart of a browser element by id, then by child-index path"""
+    if element.get('id'):
+        match = soup.find(element['tag'], id=element['id'])
+        if match:
+            return match
+
+    node = soup.find('html')
+    if node is None:
+        return None
+    for index in element['path']:
+        children = [child for child in node.children if isinstance(child, Tag)]
+        if index >= len(children):
+            return None
+        node = children[index]
+    # Scripts can reshape the live DOM, so only trust a path that lands on the same tag
+    return node if node.name == element['tag'] else None
+
+
+def crop_to_main_content(html_content: str, layout: Dict, visual_analysis,
+                         min_text_ratio: float = 0.1) -> Optional[str]:
+    """Return the HTML of the main content subtree, or None when it cannot be located reliably"""
+    element = find_main_element(layout, visual_analysis)
+    if element is None:
+        return None
+
+    soup = BeautifulSoup(html_content, 'html.parser')
+    node = _locate(soup, element)
+    if node is None or node.name in ('html', 'body'):
+        return None
+
+    total_text = len((soup.body or soup).get_text(strip=True))
+    if total_text and len(node.get_text(strip=True)) / total_text < min_text_ratio:
+        logger.info("Main content candidate holds too little of the page text, not cropping")
+        return None
+
+    cropped = str(node)
+    # Keep the page heading when the layout puts it just outside the content column
+    heading = soup.find('h1')
+    if heading and not any(parent is node for parent in heading.parents) and heading is not node:
+        cropped = f"{heading}\n{cropped}"
+    return cropped
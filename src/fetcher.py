@@ -0,0 +1,334 @@
+"""
+HTTP Fetcher
+Shared, connection-pooled fetch layer used by the scraper, the analyzer and the
+crawler. Enforces connect/read/total timeouts and a maximum body size (the
+body is streamed in chunks and the download aborted once it is exceeded),
+decompresses transparently and fetches many URLs concurrently from a thread
+pool with per-host limits.
+"""
+
+import os
+import re
+import time
+import codecs
+import logging
+import tempfile
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
+from typing import Dict, Iterable, Iterator, Optional, Tuple, Union
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+import urllib3
+from urllib3.util.retry import Retry
+from .metrics import metrics
+from . import deadlines
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+    'Accept-Encoding': 'gzip, deflate',
+}
+
+META_CHARSET = re.compile(rb'<meta[^>]+charset=["\']?([\w-]+)', re.IGNORECASE)
+
+
+class FetchError(Exception):
+    """Base class for fetch failures raised by the fetch layer itself"""
+
+
+class ResponseTooLarge(FetchError):
+    """The response body exceeded the configured maximum size
+
+    When the fetch was given a spool_size, spooled holds the whole body
+    downloaded to a temporary file, so the caller can stream it instead of
+    requesting it again.
+    """
+
+    def __init__(self, message: str, content_type: str = '', spooled: Optional['SpooledBody'] = None):
+        super().__init__(message)
+        # Lets callers pick a different limit by type (PDFs are allowed to be larger than HTML)
+        self.content_type = content_type.split(';')[0].strip().lower()
+        self.spooled = spooled
+
+
+class FetchTimeout(FetchError, TimeoutError):
+    """The whole request took longer than the total timeout"""
+
+
+@dataclass
+class FetchResult:
+    """A fully downloaded response"""
+    url: str
+    final_url: str
+    status_code: int
+    # Case-insensitive, as servers differ in how they spell header names
+    headers: Dict[str, str]
+    content: bytes
+    elapsed: float
+    encoding: Optional[str] = field(default=None)
+
+    @property
+    def content_type(self) -> str:
+        return self.headers.get('Content-Type', '').split(';')[0].strip().lower()
+
+    @property
+    def text(self) -> str:
+        encoding = self.encoding
+        if not encoding:
+            match = META_CHARSET.search(self.content[:4096])
+            encoding = match.group(1).decode('ascii') if match else 'utf-8'
+        try:
+            return self.content.decode(encoding, errors='replace')
+        except LookupError:
+            return self.content.decode('utf-8', errors='replace')
+
+
+class SpooledBody:
+    """A downloaded body held in a temporary file, read back as decoded text chunks"""
+
+    def __init__(self, url: str, headers: Dict[str, str], spool, charset: Optional[str] = None,
+                 chunk_size: int = 64 * 1024):
+        self.url = url
+        self.headers = headers
+        self.spool = spool
+        self.charset = charset
+        self.chunk_size = chunk_size
+
+    def text_chunks(self) -> Iterator[str]:
+        """Decode the body from the start, one chunk at a time"""
+        self.spool.seek(0)
+        match = META_CHARSET.search(self.spool.read(4096))
+        encoding = self.charset or (match.group(1).decode('ascii') if match else 'utf-8')
+        try:
+            decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+        except LookupError:
+            decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self.spool.seek(0)
+        while True:
+            raw = self.spool.read(self.chunk_size)
+            if not raw:
+                break
+            yield decoder.decode(raw)
+        yield decoder.decode(b'', final=True)
+
+    def close(self):
+        self.spool.close()
+
+    def __enter__(self) -> 'SpooledBody':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class Fetcher:
+    """Pooled HTTP client with timeouts, size caps and bulk fetching"""
+
+    def __init__(self, pool_connections: int = 32, pool_maxsize: int = 8,
+                 connect_timeout: float = 10.0, read_timeout: float = 30.0,
+                 total_timeout: float = 60.0, max_body_size: int = 20 * 1024 * 1024,
+                 max_per_host: int = 8, retries: int = 2, chunk_size: int = 64 * 1024,
+                 headers: Optional[Dict[str, str]] = None):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.total_timeout = total_timeout
+        self.max_body_size = max_body_size
+        self.max_per_host = max_per_host
+        self.chunk_size = chunk_size
+        self._host_limits: Dict[str, threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+
+        # One keep-alive pool per host, shared by every thread using this fetcher
+        adapter = HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            max_retries=Retry(total=retries, connect=retries, read=0, status=0,
+                              backoff_factor=0.5, allowed_methods=['GET', 'HEAD'])
+        )
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update(headers or DEFAULT_HEADERS)
+
+    def _host_limit(self, url: str) -> threading.BoundedSemaphore:
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self._host_limits:
+                self._host_limits[host] = threading.BoundedSemaphore(self.max_per_host)
+            return self._host_limits[host]
+
+    def _timeouts(self, total: float) -> Tuple[float, float]:
+        return min(self.connect_timeout, total), min(self.read_timeout, total)
+
+    def _iter_body(self, response: requests.Response) -> Iterator[bytes]:
+        """Yield decoded body data as it arrives
+
+        iter_content waits for a full chunk_size before yielding, so a body that
+        trickles in would never reach the total timeout check.
+        """
+        try:
+            while True:
+                chunk = response.raw.read1(self.chunk_size, decode_content=True)
+                if not chunk:
+                    return
+                yield chunk
+        except urllib3.exceptions.HTTPError as e:
+            # Same exception types iter_content raises
+            raise requests.ConnectionError(e) from e
+
+    def _charset(self, response: requests.Response) -> Optional[str]:
+        # Only trust an explicit charset; requests would otherwise assume ISO-8859-1 for text/*
+        return response.encoding if 'charset' in response.headers.get('Content-Type', '').lower() else None
+
+    def _spool_rest(self, url: str, response: requests.Response, body_iter: Iterator[bytes], head: bytes,
+                    spool_size: int, start: float, total_timeout: float) -> SpooledBody:
+        """Write what was downloaded so far and the rest of the body to a temporary file"""
+        content_type = response.headers.get('Content-Type', '')
+        spool = tempfile.TemporaryFile()
+        try:
+            spool.write(head)
+            received = len(head)
+            del head
+            for chunk in body_iter:
+                received += len(chunk)
+                if received > spool_size:
+                    raise ResponseTooLarge(f"{url} exceeded {spool_size} bytes", content_type)
+                if time.monotonic() - start > total_timeout:
+                    raise FetchTimeout(f"{url} took longer than {total_timeout}s")
+                spool.write(chunk)
+        except BaseException:
+            spool.close()
+            raise
+        return SpooledBody(url, CaseInsensitiveDict(response.headers), spool, self._charset(response), self.chunk_size)
+
+    def fetch(self, url: str, max_body_size: Optional[int] = None,
+              total_timeout: Optional[float] = None, source: str = 'fetch',
+              spool_size: Optional[int] = None) -> FetchResult:
+        """Download a URL, raising for HTTP errors, oversized bodies and total timeouts
+
+        Timeouts are capped to the active deadline, and a timeout caused by it
+        raises DeadlineExceeded instead. With a spool_size, a body that turns out
+        larger than max_body_size while downloading is not dropped: the download
+        continues into a temporary file (up to spool_size bytes), which the
+        ResponseTooLarge carries as spooled.
+        """
+        max_body_size = max_body_size or self.max_body_size
+        total_timeout = deadlines.cap(total_timeout or self.total_timeout, 'fetch')
+        start = time.monotonic()
+        try:
+            with self._host_limit(url):
+                response = self.session.get(url, stream=True, timeout=self._timeouts(total_timeout))
+                try:
+                    response.raise_for_status()
+                    declared = response.headers.get('Content-Length')
+                    if declared and declared.isdigit() and int(declared) > max_body_size:
+                        raise ResponseTooLarge(f"{url} declares {declared} bytes (limit {max_body_size})",
+                                               response.headers.get('Content-Type', ''))
+
+                    body = bytearray()
+                    body_iter = self._iter_body(response)
+                    for chunk in body_iter:
+                        body.extend(chunk)
+                        if len(body) > max_body_size:
+                            spooled = None
+                            if spool_size and spool_size > max_body_size:
+                                spooled = self._spool_rest(url, response, body_iter, bytes(body), spool_size,
+                                                           start, total_timeout)
+                                metrics.inc('bytes_fetched', os.fstat(spooled.spool.fileno()).st_size,
+                                            source=source)
+                            raise ResponseTooLarge(f"{url} exceeded {max_body_size} bytes",
+                                                   response.headers.get('Content-Type', ''), spooled)
+                        if time.monotonic() - start > total_timeout:
+                            raise FetchTimeout(f"{url} took longer than {total_timeout}s")
+                finally:
+                    response.close()
+        except (FetchTimeout, requests.Timeout, requests.ConnectionError):
+            # Read timeouts surface as ConnectionError once the body is streaming
+            deadlines.check('fetch')
+            raise
+
+        metrics.inc('bytes_fetched', len(body), source=source)
+        return FetchResult(url=url, final_url=response.url, status_code=response.status_code,
+                           headers=CaseInsensitiveDict(response.headers), content=bytes(body),
+                           elapsed=time.monotonic() - start, encoding=self._charset(response))
+
+    @contextmanager
+    def stream_text(self, url: str, max_body_size: Optional[int] = None,
+                    total_timeout: Optional[float] = None,
+                    source: str = 'stream') -> Iterator[Tuple[Dict[str, str], Iterator[str]]]:
+        """Download a URL and yield (headers, iterator of decoded text chunks) without holding the body in memory
+
+        The body is spooled to a temporary file first, under the host limit, size
+        cap and total timeout. The connection and host slot are released before
+        the caller sees any chunk, so slow processing of the chunks (drafting each
+        one with the LLM) neither counts against the download timeout nor blocks
+        other requests to the host.
+        """
+        max_body_size = max_body_size or self.max_body_size
+        total_timeout = deadlines.cap(total_timeout or self.total_timeout, 'fetch')
+        start = time.monotonic()
+        try:
+            with self._host_limit(url):
+                response = self.session.get(url, stream=True, timeout=self._timeouts(total_timeout))
+                try:
+                    response.raise_for_status()
+                    spooled = self._spool_rest(url, response, self._iter_body(response), b'', max_body_size,
+                                               start, total_timeout)
+                finally:
+                    response.close()
+        except (FetchTimeout, requests.Timeout, requests.ConnectionError):
+            deadlines.check('fetch')
+            raise
+        with spooled:
+            metrics.inc('bytes_fetched', os.fstat(spooled.spool.fileno()).st_size, source=source)
+            yield spooled.headers, spooled.text_chunks()
+
+    def fetch_many(self, urls: Iterable[str], max_workers: int = 16,
+                   **kwargs) -> Iterator[Tuple[str, Union[FetchResult, Exception]]]:
+        """Fetch URLs concurrently, yielding (url, result or exception) in completion order
+
+        URLs are consumed lazily with a bounded number in flight, so very long
+        (or generated) URL lists do not pile up as pending futures.
+        """
+        url_iter = iter(urls)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            pending = {}
+
+            def submit_next(count: int):
+                for url in islice(url_iter, count):
+                    pending[executor.submit(self.fetch, url, **kwargs)] = url
+
+            submit_next(max_workers * 2)
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    url = pending.pop(future)
+                    try:
+                        yield url, future.result()
+                    except Exception as e:
+                        yield url, e
+                submit_next(len(done))
+
+    def close(self):
+        self.session.close()
+
+
+_default_fetcher: Optional[Fetcher] = None
+_default_lock = threading.Lock()
+
+
+def get_default_fetcher() -> Fetcher:
+    """Return the process-wide fetcher, creating it on first use"""
+    global _default_fetcher
+    with _default_lock:
+        if _default_fetcher is None:
+            _default_fetcher = Fetcher()
+        return _default_fetcher
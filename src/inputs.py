@@ -0,0 +1,144 @@
+"""
+URL List Inputs
+Lazy readers for the (number, url) entries of a batch: the YAML config
+(`urls:` list of "N, url" strings, read as parser events so the document is
+never loaded whole), plain-text lists (one URL or "N, url" per line) and JSONL
+({"url": ..., "number": ...} per line). Entries come out in file order without
+buffering, so a list of hundreds of thousands of URLs starts immediately and
+in constant memory.
+"""
+
+import os
+import re
+import gzip
+import json
+import logging
+import argparse
+from typing import IO, Iterator, Optional, Tuple
+import yaml
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+NUMBERED_ENTRY = re.compile(r'^\s*(\d+)\s*,\s*(\S.*?)\s*$')
+
+YAML_EXTENSIONS = ('.yml', '.yaml')
+JSONL_EXTENSIONS = ('.jsonl', '.ndjson')
+
+
+def parse_entry(text: str, default_number: int) -> Optional[Tuple[int, str]]:
+    """Parse "N, url" (or a bare URL, numbered default_number); None for anything else"""
+    match = NUMBERED_ENTRY.match(text)
+    if match:
+        return int(match.group(1)), match.group(2)
+    text = text.strip()
+    if '://' in text and ' ' not in text:
+        return default_number, text
+    return None
+
+
+def _open_text(path: str) -> IO[str]:
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8')
+    return open(path, 'r', encoding='utf-8')
+
+
+def input_format(path: str) -> str:
+    """'yaml', 'jsonl' or 'text', from the file extension (ignoring a trailing .gz)"""
+    name = path[:-3] if path.endswith('.gz') else path
+    if name.endswith(YAML_EXTENSIONS):
+        return 'yaml'
+    if name.endswith(JSONL_EXTENSIONS):
+        return 'jsonl'
+    return 'text'
+
+
+def iter_yaml_entries(stream: IO[str]) -> Iterator[str]:
+    """Yield the scalar items of the top-level `urls` sequence from YAML parser events"""
+    loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+    depth = 0
+    expecting_key = False
+    in_urls = False
+    key = None
+    for event in yaml.parse(stream, Loader=loader):
+        if isinstance(event, (yaml.MappingStartEvent, yaml.SequenceStartEvent)):
+            if depth == 1 and key == 'urls' and isinstance(event, yaml.SequenceStartEvent):
+                in_urls = True
+            depth += 1
+            if depth == 1:
+                expecting_key = isinstance(event, yaml.MappingStartEvent)
+        elif isinstance(event, (yaml.MappingEndEvent, yaml.SequenceEndEvent)):
+            depth -= 1
+            if depth == 1:
+                in_urls = False
+                # A collection value ends; the next scalar in the top mapping is a key
+                expecting_key = True
+        elif isinstance(event, yaml.ScalarEvent):
+            if depth == 1 and expecting_key:
+                key = event.value
+                expecting_key = False
+            elif depth == 1:
+                expecting_key = True
+            elif depth == 2 and in_urls:
+                yield event.value
+
+
+def iter_config_entries(path: str) -> Iterator[Tuple[int, str]]:
+    """Yield (number, url) entries of a URL list in file order
+
+    Entries without a number are numbered after the highest number seen so far.
+    Malformed entries are logged and skipped.
+    """
+    fmt = input_format(path)
+    last_number = 0
+    with _open_text(path) as stream:
+        if fmt == 'yaml':
+            items = iter_yaml_entries(stream)
+        elif fmt == 'jsonl':
+            items = (line for line in stream if line.strip())
+        else:
+            items = (line for line in stream if line.strip() and not line.lstrip().startswith('#'))
+
+        for position, item in enumerate(items, 1):
+            if fmt == 'jsonl':
+                try:
+                    data = json.loads(item)
+                except ValueError as e:
+                    logger.warning(f"Skipping unparseable line {position} of {path}: {e}")
+                    continue
+                if isinstance(data, str):
+                    entry = parse_entry(data, last_number + 1)
+                elif isinstance(data, dict) and data.get('url'):
+                    try:
+                        entry = (int(data.get('number') or last_number + 1), data['url'])
+                    except (ValueError, TypeError):
+                        entry = None
+                else:
+                    entry = None
+            else:
+                entry = parse_entry(item, last_number + 1)
+            if entry is None:
+                logger.warning(f"Skipping malformed entry {position} of {path}: {str(item).strip()[:100]}")
+                continue
+            last_number = max(last_number, entry[0])
+            yield entry
+
+
+def main():
+    """Main function to check a URL list"""
+    parser = argparse.ArgumentParser(description='Validate a URL list and count its entries')
+    parser.add_argument('path', help='YAML config, .txt or .jsonl URL list (optionally .gz)')
+    parser.add_argument('--head', type=int, default=5, help='Entries to print (default: 5)')
+    args = parser.parse_args()
+
+    count = 0
+    for number, url in iter_config_entries(args.path):
+        if count < args.head:
+            print(f"{number}, {url}")
+        count += 1
+    logger.info(f"{count} entries in {args.path} ({input_format(args.path)}, {os.path.getsize(args.path)} bytes)")
+
+
+if __name__ == "__main__":
+    main()
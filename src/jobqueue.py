@@ -0,0 +1,473 @@
+"""
+Distributed Job Queue
+Spreads batch conversion across worker processes and hosts. A producer loads
+config entries into a shared queue; workers lease jobs, convert them and
+acknowledge the result. Leases expire, so jobs held by a dead worker are
+handed to another one, until a job has used up its attempts (a job that keeps
+killing its worker, e.g. by running the browser out of memory, then fails
+instead of cycling forever).
+"""
+
+import os
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import logging
+import argparse
+import threading
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional, Tuple
+from .metrics import metrics
+from .deadlines import DeadlineExceeded
+from .inputs import iter_config_entries
+from .sinks import FileSink, build_record, open_sink
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(message)s',
+    datefmt='%H:%M:%S'
+)
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Job:
+    """A leased unit of work"""
+    id: str
+    number: int
+    url: str
+    prefix: str
+    attempts: int
+    lease_token: str
+
+
+class JobQueueBackend(ABC):
+    """Interface every queue backend implements"""
+
+    @abstractmethod
+    def enqueue(self, entries: Iterable[Tuple[int, str]], prefix: str) -> int:
+        """Add (number, url) entries; entries already queued are ignored"""
+
+    @abstractmethod
+    def lease(self, worker_id: str, visibility_timeout: float, max_attempts: Optional[int] = None) -> Optional[Job]:
+        """Lease the next available job, hiding it from other workers until the lease expires
+
+        A job whose lease expired after max_attempts attempts is failed instead
+        of leased again.
+        """
+
+    @abstractmethod
+    def extend(self, job: Job, visibility_timeout: float) -> bool:
+        """Extend a lease that is still held; returns False if it was lost"""
+
+    @abstractmethod
+    def ack(self, job: Job, output: str) -> bool:
+        """Mark a job done; returns False if the lease was lost to another worker"""
+
+    @abstractmethod
+    def nack(self, job: Job, error: str, max_attempts: int) -> bool:
+        """Return a job to the queue, or fail it once it runs out of attempts"""
+
+    @abstractmethod
+    def stats(self) -> Dict[str, int]:
+        """Job counts by status"""
+
+
+def _job_id(prefix: str, number: int, url: str) -> str:
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"{prefix}:{number}:{url}"))
+
+
+class SQLiteJobQueue(JobQueueBackend):
+    """Single-host queue stored in a SQLite database shared by all worker processes"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                number INTEGER NOT NULL,
+                url TEXT NOT NULL,
+                prefix TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                lease_token TEXT,
+                lease_until REAL,
+                worker TEXT,
+                output TEXT,
+                error TEXT
+            )''')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, number)')
+
+    def enqueue(self, entries: Iterable[Tuple[int, str]], prefix: str) -> int:
+        # A generator, so a huge URL list is inserted without being held in memory
+        rows = ((_job_id(prefix, number, url), number, url, prefix) for number, url in entries)
+        with self._lock:
+            before = self.conn.total_changes
+            self.conn.execute('BEGIN IMMEDIATE')
+            self.conn.executemany(
+                'INSERT OR IGNORE INTO jobs (id, number, url, prefix) VALUES (?, ?, ?, ?)', rows)
+            self.conn.execute('COMMIT')
+            return self.conn.total_changes - before
+
+    def lease(self, worker_id: str, visibility_timeout: float, max_attempts: Optional[int] = None) -> Optional[Job]:
+        now = time.time()
+        token = uuid.uuid4().hex
+        with self._lock:
+            # BEGIN IMMEDIATE takes the write lock, so two workers never lease the same row
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                if max_attempts is not None:
+                    self.conn.execute(
+                        "UPDATE jobs SET status = 'failed', lease_token = NULL, lease_until = NULL, "
+                        "error = 'lease expired after ' || attempts || ' attempts' "
+                        "WHERE status = 'leased' AND lease_until < ? AND attempts >= ?", (now, max_attempts))
+                row = self.conn.execute(
+                    "SELECT id, number, url, prefix, attempts FROM jobs "
+                    "WHERE status = 'pending' OR (status = 'leased' AND lease_until < ?) "
+                    "ORDER BY number LIMIT 1", (now,)).fetchone()
+                if row is None:
+                    self.conn.execute('COMMIT')
+                    return None
+                self.conn.execute(
+                    "UPDATE jobs SET status = 'leased', attempts = attempts + 1, lease_token = ?, "
+                    "lease_until = ?, worker = ? WHERE id = ?",
+                    (token, now + visibility_timeout, worker_id, row[0]))
+                self.conn.execute('COMMIT')
+            except Exception:
+                self.conn.execute('ROLLBACK')
+                raise
+        return Job(row[0], row[1], row[2], row[3], row[4] + 1, token)
+
+    def _update_leased(self, job: Job, sql: str, params: tuple) -> bool:
+        with self._lock:
+            cursor = self.conn.execute(
+                sql + " WHERE id = ? AND status = 'leased' AND lease_token = ?",
+                params + (job.id, job.lease_token))
+            return cursor.rowcount == 1
+
+    def extend(self, job: Job, visibility_timeout: float) -> bool:
+        return self._update_leased(job, 'UPDATE jobs SET lease_until = ?',
+                                   (time.time() + visibility_timeout,))
+
+    def ack(self, job: Job, output: str) -> bool:
+        return self._update_leased(
+            job, "UPDATE jobs SET status = 'done', output = ?, error = NULL, lease_token = NULL",
+            (output,))
+
+    def nack(self, job: Job, error: str, max_attempts: int) -> bool:
+        return self._update_leased(
+            job, "UPDATE jobs SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                 "error = ?, lease_token = NULL, lease_until = NULL",
+            (max_attempts, error))
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.conn.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall())
+
+
+class RedisJobQueue(JobQueueBackend):
+    """Multi-host queue on Redis (or any client exposing the same commands)
+
+    Every unfinished job stays in one sorted set scored by the time it becomes
+    visible: its sequence number while pending, the lease expiry while leased.
+    A job is only removed from the set when it is acknowledged, so a crashed
+    worker can never lose it. Claims and acks run in WATCH/MULTI transactions,
+    which also keep a hash of job counts by status, so stats() stays one
+    round-trip however long the queue is.
+    """
+
+    def __init__(self, client, name: str = 'webtomd'):
+        self.client = client
+        self.name = name
+        self.visible_key = f"{name}:visible"
+        self.jobs_key = f"{name}:jobs"
+        self.counts_key = f"{name}:counts"
+
+    @classmethod
+    def from_url(cls, url: str, name: str = 'webtomd') -> 'RedisJobQueue':
+        import redis
+        return cls(redis.Redis.from_url(url, decode_responses=True), name)
+
+    def _job_key(self, job_id: str) -> str:
+        return f"{self.name}:job:{job_id}"
+
+    @staticmethod
+    def _decode(value):
+        return value.decode() if isinstance(value, bytes) else value
+
+    def _get(self, job_id: str, client=None) -> Dict[str, str]:
+        data = (client or self.client).hgetall(self._job_key(job_id))
+        return {self._decode(k): self._decode(v) for k, v in data.items()}
+
+    def enqueue(self, entries: Iterable[Tuple[int, str]], prefix: str) -> int:
+        added = 0
+        for number, url in entries:
+            job_id = _job_id(prefix, number, url)
+            if self.client.sismember(self.jobs_key, job_id):
+                continue
+            # One transaction, so a producer that dies midway never leaves a half-added job
+            with self.client.pipeline() as pipe:
+                pipe.hset(self._job_key(job_id), mapping={
+                    'number': number, 'url': url, 'prefix': prefix, 'status': 'pending', 'attempts': 0
+                })
+                pipe.zadd(self.visible_key, {job_id: number})
+                pipe.hincrby(self.counts_key, 'pending', 1)
+                pipe.sadd(self.jobs_key, job_id)
+                pipe.execute()
+            added += 1
+        return added
+
+    def lease(self, worker_id: str, visibility_timeout: float, max_attempts: Optional[int] = None) -> Optional[Job]:
+        import redis
+        token = uuid.uuid4().hex
+        while True:
+            with self.client.pipeline() as pipe:
+                try:
+                    pipe.watch(self.visible_key)
+                    now = time.time()
+                    candidates = pipe.zrangebyscore(self.visible_key, '-inf', now, start=0, num=1)
+                    if not candidates:
+                        pipe.unwatch()
+                        return None
+                    job_id = self._decode(candidates[0])
+                    data = self._get(job_id, pipe)
+                    if (max_attempts is not None and data.get('status') == 'leased'
+                            and int(data.get('attempts', 0)) >= max_attempts):
+                        # The lease expired on its last attempt
+                        pipe.multi()
+                        pipe.zrem(self.visible_key, job_id)
+                        pipe.hset(self._job_key(job_id), mapping={
+                            'status': 'failed', 'lease_token': '',
+                            'error': f"lease expired after {data['attempts']} attempts"
+                        })
+                        self._move(pipe, 'leased', 'failed')
+                        pipe.execute()
+                        continue
+                    pipe.multi()
+                    pipe.zadd(self.visible_key, {job_id: now + visibility_timeout})
+                    pipe.hincrby(self._job_key(job_id), 'attempts', 1)
+                    pipe.hset(self._job_key(job_id), mapping={
+                        'status': 'leased', 'lease_token': token, 'worker': worker_id
+                    })
+                    # A job whose lease expired is already counted as leased
+                    self._move(pipe, data.get('status', 'pending'), 'leased')
+                    attempts = pipe.execute()[1]
+                except redis.WatchError:
+                    continue  # Another worker claimed it first; try the next job
+            data = self._get(job_id)
+            return Job(job_id, int(data['number']), data['url'], data['prefix'], int(attempts), token)
+
+    def _update_leased(self, job: Job, update) -> bool:
+        """Apply update(pipe) only if the job is still leased under this token"""
+        import redis
+        with self.client.pipeline() as pipe:
+            try:
+                pipe.watch(self._job_key(job.id))
+                data = self._get(job.id, pipe)
+                if data.get('status') != 'leased' or data.get('lease_token') != job.lease_token:
+                    pipe.unwatch()
+                    return False
+                pipe.multi()
+                update(pipe)
+                pipe.execute()
+                return True
+            except redis.WatchError:
+                return False
+
+    def extend(self, job: Job, visibility_timeout: float) -> bool:
+        return self._update_leased(
+            job, lambda pipe: pipe.zadd(self.visible_key, {job.id: time.time() + visibility_timeout}))
+
+    def ack(self, job: Job, output: str) -> bool:
+        def update(pipe):
+            pipe.zrem(self.visible_key, job.id)
+            pipe.hset(self._job_key(job.id), mapping={'status': 'done', 'output': output, 'lease_token': ''})
+            self._move(pipe, 'leased', 'done')
+        return self._update_leased(job, update)
+
+    def nack(self, job: Job, error: str, max_attempts: int) -> bool:
+        def update(pipe):
+            if job.attempts >= max_attempts:
+                pipe.zrem(self.visible_key, job.id)
+                pipe.hset(self._job_key(job.id), mapping={'status': 'failed', 'error': error, 'lease_token': ''})
+                self._move(pipe, 'leased', 'failed')
+            else:
+                pipe.zadd(self.visible_key, {job.id: job.number})
+                pipe.hset(self._job_key(job.id), mapping={'status': 'pending', 'error': error, 'lease_token': ''})
+                self._move(pipe, 'leased', 'pending')
+        return self._update_leased(job, update)
+
+    def _move(self, pipe, old: str, new: str):
+        """Queue the status counter update for a job changing status (inside MULTI)"""
+        if old != new:
+            pipe.hincrby(self.counts_key, old, -1)
+            pipe.hincrby(self.counts_key, new, 1)
+
+    def stats(self) -> Dict[str, int]:
+        counts = self.client.hgetall(self.counts_key)
+        return {self._decode(status): int(count) for status, count in counts.items() if int(count)}
+
+
+def open_queue(spec: str) -> JobQueueBackend:
+    """Open a queue from a spec such as 'output/jobs.db' or 'redis://host:6379/0'"""
+    if spec.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisJobQueue.from_url(spec)
+    if spec.startswith('sqlite:///'):
+        spec = spec[len('sqlite:///'):]
+    if os.path.dirname(spec):
+        os.makedirs(os.path.dirname(spec), exist_ok=True)
+    return SQLiteJobQueue(spec)
+
+
+class QueueWorker:
+    """Leases jobs from a queue and runs them through ContentProcessor"""
+
+    def __init__(self, queue: JobQueueBackend, processor=None, worker_id: Optional[str] = None,
+                 visibility_timeout: float = 600, max_attempts: int = 3, poll_interval: float = 2.0,
+                 sink=None, url_timeout: Optional[float] = None, timeout_attempts: int = 1):
+        self.queue = queue
+        self.processor = processor
+        # OutputSink for converted pages; one file per page in the processor's output_dir when None
+        self.sink = sink
+        self.url_timeout = url_timeout
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        # Attempts after which a job that ran out of its url_timeout fails (1: no retry, since a
+        # page that used its whole budget usually does so again); capped by max_attempts
+        self.timeout_attempts = timeout_attempts
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+
+    def _heartbeat(self, job: Job, done: threading.Event):
+        """Keep extending the lease while a long conversion is running"""
+        while not done.wait(self.visibility_timeout / 3):
+            if not self.queue.extend(job, self.visibility_timeout):
+                logger.warning(f"Lost lease on job {job.number}: {job.url}")
+                return
+
+    def process_job(self, job: Job) -> bool:
+        """Convert one leased job and acknowledge the outcome"""
+        done = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(job, done), daemon=True)
+        heartbeat.start()
+        try:
+            logger.info(f"[{self.worker_id}] Processing URL {job.number}: {job.url} (attempt {job.attempts})")
+            result = self.processor.convert(job.url)
+            with metrics.stage('write'):
+                output_file = self.sink.write(build_record(result, job.number, job.prefix))
+                # The record must be durable before the job is acknowledged
+                self.sink.flush()
+            done.set()
+            if self.queue.ack(job, output_file):
+                logger.info(f"Saved to: {output_file}")
+                return True
+            logger.warning(f"Job {job.number} was re-leased before it finished; result discarded")
+            return False
+        except DeadlineExceeded as e:
+            done.set()
+            logger.error(f"Job {job.number} timed out for {job.url}: {e}")
+            self.queue.nack(job, str(e), min(self.timeout_attempts, self.max_attempts))
+            return False
+        except Exception as e:
+            done.set()
+            logger.error(f"Job {job.number} failed for {job.url}: {e}")
+            self.queue.nack(job, str(e), self.max_attempts)
+            return False
+        finally:
+            heartbeat.join()
+
+    def run(self, max_jobs: Optional[int] = None, exit_when_empty: bool = True) -> int:
+        """Process jobs until the queue is drained (or stop() is called)"""
+        if self.processor is None:
+            from .convert import ContentProcessor
+            self.processor = ContentProcessor()
+        if self.sink is None:
+            self.sink = FileSink(self.processor.output_dir)
+        self.processor.save_screenshots = not self.sink.stores_screenshots
+        if self.url_timeout is not None:
+            self.processor.url_timeout = self.url_timeout
+
+        processed = 0
+        while not self._stop.is_set() and (max_jobs is None or processed < max_jobs):
+            job = self.queue.lease(self.worker_id, self.visibility_timeout, self.max_attempts)
+            if job is None:
+                if exit_when_empty and not self.queue.stats().get('leased'):
+                    break
+                self._stop.wait(self.poll_interval)
+                continue
+            self.process_job(job)
+            processed += 1
+        return processed
+
+    def stop(self):
+        self._stop.set()
+
+
+def _run_worker(queue_spec: str, visibility_timeout: float, max_attempts: int, exit_when_empty: bool,
+                output: Optional[str] = None, archive_screenshots: bool = False,
+                url_timeout: Optional[float] = None, timeout_attempts: int = 1):
+    with open_sink(output, store_screenshots=archive_screenshots) as sink:
+        worker = QueueWorker(open_queue(queue_spec), visibility_timeout=visibility_timeout,
+                             max_attempts=max_attempts, sink=sink, url_timeout=url_timeout,
+                             timeout_attempts=timeout_attempts)
+        return worker.run(exit_when_empty=exit_when_empty)
+
+
+def main():
+    """Main function to run the producer or workers"""
+    parser = argparse.ArgumentParser(description='Queue-backed batch conversion')
+    parser.add_argument('--queue', default='output/jobs.db',
+                        help='SQLite path or redis:// URL (default: output/jobs.db)')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    produce = subparsers.add_parser('produce', help='Load config entries into the queue')
+    produce.add_argument('--config', required=True, help='URL list to queue: YAML config, .txt or .jsonl (optionally .gz)')
+    produce.add_argument('--prefix', default='doc', help='Prefix for output filenames (default: doc)')
+
+    work = subparsers.add_parser('work', help='Run workers that process queued jobs')
+    work.add_argument('--workers', type=int, default=1, help='Worker processes on this host (default: 1)')
+    work.add_argument('--visibility-timeout', type=float, default=600,
+                      help='Seconds before an unacknowledged lease expires (default: 600)')
+    work.add_argument('--max-attempts', type=int, default=3, help='Attempts before a job fails (default: 3)')
+    work.add_argument('--wait', action='store_true', help='Keep polling when the queue is empty')
+    work.add_argument('--output',
+                      help='Output directory, or a single archive: *.db (SQLite) or *.jsonl[.gz] (default: output)')
+    work.add_argument('--archive-screenshots', action='store_true',
+                      help='Store screenshots in the --output archive instead of as separate PNG files')
+    work.add_argument('--url-timeout', type=float, help='Seconds one job may take before it is cut off')
+    work.add_argument('--timeout-attempts', type=int, default=1,
+                      help='Attempts before a job that hits --url-timeout fails (default: 1, no retry)')
+
+    subparsers.add_parser('status', help='Show job counts by status')
+    args = parser.parse_args()
+
+    if args.command == 'produce':
+        added = open_queue(args.queue).enqueue(iter_config_entries(args.config), args.prefix)
+        logger.info(f"Queued {added} new jobs")
+    elif args.command == 'work':
+        if args.workers > 1 and args.output and args.output.endswith(('.jsonl', '.jsonl.gz')):
+            # Appends from several processes could interleave; SQLite handles concurrent writers
+            parser.error('Use a *.db archive (or one process per JSONL file) with more than one worker')
+        worker_args = (args.queue, args.visibility_timeout, args.max_attempts, not args.wait,
+                       args.output, args.archive_screenshots, args.url_timeout, args.timeout_attempts)
+        if args.workers == 1:
+            processed = _run_worker(*worker_args)
+        else:
+            # Each process gets its own browser and queue connection
+            from concurrent.futures import ProcessPoolExecutor
+            with ProcessPoolExecutor(max_workers=args.workers) as executor:
+                futures = [executor.submit(_run_worker, *worker_args) for _ in range(args.workers)]
+                processed = sum(f.result() for f in futures)
+        logger.info(f"Workers processed {processed} jobs")
+    print(json.dumps(open_queue(args.queue).stats(), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+Screenshot Layout Segmentation
+Vectorized layout pass over a screenshot: estimates the background colour,
+builds row and column ink profiles, and from them derives the content
+bounding box, vertical sections separated by whitespace bands, and columns.
+Used to crop empty margins before the vision and OCR calls and to split tall
+screenshots into sections.
+"""
+
+import copy
+import json
+import logging
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from PIL import Image
+from .dom_crop import _main_box, parse_visual_analysis
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+Box = Tuple[int, int, int, int]  # left, top, right, bottom in pixels
+
+
+def to_gray(image: Image.Image) -> np.ndarray:
+    """Grayscale pixel array of a screenshot"""
+    return np.asarray(image.convert('L'), dtype=np.int16)
+
+
+def estimate_background(gray: np.ndarray) -> int:
+    """Most common value along the image border, which is nearly always page background"""
+    border = np.concatenate([gray[0], gray[-1], gray[:, 0], gray[:, -1]])
+    return int(np.bincount(border.astype(np.uint8).ravel(), minlength=256).argmax())
+
+
+def content_mask(gray: np.ndarray, background: Optional[int] = None, tolerance: int = 12) -> np.ndarray:
+    """Boolean mask of pixels that differ from the background"""
+    if background is None:
+        background = estimate_background(gray)
+    return np.abs(gray - background) > tolerance
+
+
+def _runs(active: np.ndarray) -> List[Tuple[int, int]]:
+    """(start, end) pairs of consecutive True values, end exclusive"""
+    padded = np.concatenate([[False], active, [False]])
+    edges = np.flatnonzero(np.diff(padded.astype(np.int8)))
+    return list(zip(edges[::2].tolist(), edges[1::2].tolist()))
+
+
+def _merge_runs(runs: List[Tuple[int, int]], min_gap: int) -> List[Tuple[int, int]]:
+    """Join runs separated by gaps narrower than min_gap"""
+    merged: List[Tuple[int, int]] = []
+    for start, end in runs:
+        if merged and start - merged[-1][1] < min_gap:
+            merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def content_bbox(mask: np.ndarray, min_ink: float = 0.002) -> Optional[Box]:
+    """Bounding box of rows and columns holding more than min_ink of content pixels"""
+    rows = np.flatnonzero(mask.mean(axis=1) > min_ink)
+    cols = np.flatnonzero(mask.mean(axis=0) > min_ink)
+    if not len(rows) or not len(cols):
+        return None
+    return int(cols[0]), int(rows[0]), int(cols[-1]) + 1, int(rows[-1]) + 1
+
+
+def find_sections(mask: np.ndarray, min_gap: int = 24, min_ink: float = 0.002) -> List[Tuple[int, int]]:
+    """Vertical (top, bottom) bands of content separated by at least min_gap blank rows"""
+    return _merge_runs(_runs(mask.mean(axis=1) > min_ink), min_gap)
+
+
+def find_columns(mask: np.ndarray, min_gap: int = 32, min_ink: float = 0.002,
+                 min_width: int = 80) -> List[Tuple[int, int]]:
+    """Horizontal (left, right) bands of content separated by at least min_gap blank columns"""
+    columns = _merge_runs(_runs(mask.mean(axis=0) > min_ink), min_gap)
+    return [(left, right) for left, right in columns if right - left >= min_width]
+
+
+def analyze_layout(image: Image.Image, tolerance: int = 12) -> Dict:
+    """Background, content box, sections and columns of a screenshot"""
+    gray = to_gray(image)
+    background = estimate_background(gray)
+    mask = content_mask(gray, background, tolerance)
+    bbox = content_bbox(mask)
+    columns = []
+    if bbox:
+        left, top, right, bottom = bbox
+        columns = [(left + l, left + r) for l, r in find_columns(mask[top:bottom, left:right])]
+    return {
+        'size': image.size,
+        'background': background,
+        'bbox': bbox,
+        'sections': find_sections(mask),
+        'columns': columns,
+        'ink_ratio': float(mask.mean()),
+    }
+
+
+def crop_margins(image: Image.Image, padding: int = 16, min_saving: float = 0.05) -> Tuple[Image.Image, Optional[Box]]:
+    """Crop blank margins and background bands around the content
+
+    Returns the cropped image and the crop box in frame pixels, or the original
+    image and None when cropping would save less than min_saving of the area.
+    """
+    bbox = content_bbox(content_mask(to_gray(image)))
+    if bbox is None:
+        return image, None
+    width, height = image.size
+    left, top, right, bottom = bbox
+    box = (max(0, left - padding), max(0, top - padding), min(width, right + padding), min(height, bottom + padding))
+    if (box[2] - box[0]) * (box[3] - box[1]) > (1 - min_saving) * width * height:
+        return image, None
+    return image.crop(box), box
+
+
+def split_sections(image: Image.Image, max_height: int = 1600, min_gap: int = 24) -> List[Image.Image]:
+    """Split a screenshot at whitespace bands into pieces no taller than max_height where possible"""
+    sections = find_sections(content_mask(to_gray(image)), min_gap)
+    if not sections:
+        return [image]
+    width, height = image.size
+    pieces = []
+    start, end = sections[0]
+    for top, bottom in sections[1:]:
+        if bottom - start > max_height:
+            pieces.append((start, end))
+            start = top
+        end = bottom
+    pieces.append((start, end))
+    # Cut in the middle of each gap so no content row is lost
+    bounds = [0] + [(pieces[i][1] + pieces[i + 1][0]) // 2 for i in range(len(pieces) - 1)] + [height]
+    return [image.crop((0, bounds[i], width, bounds[i + 1])) for i in range(len(pieces))]
+
+
+def remap_visual_analysis(visual_analysis, crop_box: Box, frame_size: Tuple[int, int]):
+    """Convert positions the vision model reported for a cropped image back to full-frame fractions
+
+    Accepts the model's JSON text (or a dict) and returns the same type; input
+    that cannot be parsed is returned unchanged. A dict is copied, not updated.
+    """
+    analysis = copy.deepcopy(parse_visual_analysis(visual_analysis))
+    if not analysis:
+        return visual_analysis
+    left, top, right, bottom = crop_box
+    width, height = frame_size
+    crop_width, crop_height = right - left, bottom - top
+
+    box = _main_box(analysis)
+    if box:
+        analysis['main_content'] = {
+            'left': (left + box[0] * crop_width) / width,
+            'top': (top + box[1] * crop_height) / height,
+            'right': (left + box[2] * crop_width) / width,
+            'bottom': (top + box[3] * crop_height) / height,
+        }
+    for key in ('hierarchy', 'visual_elements', 'exclude'):
+        for item in analysis.get(key) or []:
+            if isinstance(item, dict) and isinstance(item.get('position'), (int, float)):
+                item['position'] = (top + item['position'] * crop_height) / height
+    return analysis if isinstance(visual_analysis, dict) else json.dumps(analysis)
@@ -0,0 +1,306 @@
+"""
+Pipeline Metrics
+Records per-stage durations, bytes fetched, retries and LLM token usage for
+conversion runs, and exports them as a JSON run summary or in the Prometheus
+text exposition format.
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Deque, Dict, Iterator, Optional, TextIO, Tuple
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, object]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+
+def _format_labels(key: LabelKey, extra: Optional[Dict[str, str]] = None) -> str:
+    items = list(key) + list((extra or {}).items())
+    if not items:
+        return ''
+    escaped = [(k, v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for k, v in items]
+    return '{' + ','.join(f'{k}="{v}"' for k, v in escaped) + '}'
+
+
+class _Histogram:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+
+class MetricsRecorder:
+    """Thread-safe counters and histograms with per-page stage timings
+
+    Only the latest max_pages per-page records are kept for summary(), so a
+    long-lived process does not grow with every page; page_log() sends them
+    to a file instead.
+    """
+
+    def __init__(self, namespace: str = 'webtomd', buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+                 max_pages: int = 1000):
+        self.namespace = namespace
+        self.buckets = buckets
+        self.max_pages = max_pages
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._page_log: Optional[TextIO] = None
+        self.reset()
+
+    def reset(self):
+        """Clear everything recorded so far"""
+        with self._lock:
+            self.counters: Dict[str, Dict[LabelKey, float]] = {}
+            self.histograms: Dict[str, Dict[LabelKey, _Histogram]] = {}
+            self.pages: Deque[Dict] = deque(maxlen=self.max_pages)
+            self.pages_recorded = 0
+            self.started_at = time.time()
+
+    def inc(self, name: str, value: float = 1, **labels):
+        """Increment a counter"""
+        key = _label_key(labels)
+        page = self.current_page()
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+            # Stage-graph and deadline helper threads share the page record
+            if page is not None:
+                page['counters'][name] = page['counters'].get(name, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        """Record a value into a histogram"""
+        key = _label_key(labels)
+        with self._lock:
+            series = self.histograms.setdefault(name, {})
+            if key not in series:
+                series[key] = _Histogram(self.buckets)
+            series[key].observe(value)
+
+    def current_page(self) -> Optional[Dict]:
+        return getattr(self._local, 'page', None)
+
+    @contextmanager
+    def page(self, url: str) -> Iterator[Dict]:
+        """Collect the stages of one conversion into a per-page record"""
+        record = {'url': url, 'strategy': None, 'status': 'ok', 'stages': {}, 'counters': {}}
+        previous = self.current_page()
+        self._local.page = record
+        start = time.perf_counter()
+        try:
+            yield record
+        except Exception:
+            # Callers may already have set a more specific status, such as 'timeout'
+            if record['status'] == 'ok':
+                record['status'] = 'error'
+            raise
+        finally:
+            record['total_seconds'] = time.perf_counter() - start
+            self._local.page = previous
+            self.observe('page_seconds', record['total_seconds'],
+                         strategy=record['strategy'] or 'unknown', status=record['status'])
+            with self._lock:
+                self.pages_recorded += 1
+                if self._page_log is not None:
+                    self._page_log.write(json.dumps(record) + '\n')
+                else:
+                    self.pages.append(record)
+
+    @contextmanager
+    def page_log(self, path: str) -> Iterator[None]:
+        """Append each finished page record to a JSONL file instead of keeping it in memory"""
+        with open(path, 'a', encoding='utf-8') as f:
+            with self._lock:
+                previous, self._page_log = self._page_log, f
+            try:
+                yield
+            finally:
+                with self._lock:
+                    self._page_log = previous
+
+    @contextmanager
+    def bind_page(self, record: Optional[Dict]) -> Iterator[Optional[Dict]]:
+        """Attribute this thread's metrics to a page record started on another thread"""
+        previous = self.current_page()
+        self._local.page = record
+        try:
+            yield record
+        finally:
+            self._local.page = previous
+
+    @contextmanager
+    def stage(self, name: str, **labels) -> Iterator[None]:
+        """Time a pipeline stage; the strategy label defaults to the current page's strategy"""
+        start = time.perf_counter()
+        status = 'ok'
+        try:
+            yield
+        except Exception:
+            status = 'error'
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            page = self.current_page()
+            if 'strategy' not in labels:
+                labels['strategy'] = (page or {}).get('strategy') or 'unknown'
+            self.observe('stage_seconds', elapsed, stage=name, **labels)
+            if status == 'error':
+                self.inc('stage_errors', stage=name, **labels)
+            if page is not None:
+                with self._lock:
+                    page['stages'][name] = page['stages'].get(name, 0) + elapsed
+
+    def summary(self) -> Dict:
+        """Build the per-run JSON summary"""
+        with self._lock:
+            counters = {
+                name: [{'labels': dict(key), 'value': value} for key, value in series.items()]
+                for name, series in self.counters.items()
+            }
+            histograms = {
+                name: [{
+                    'labels': dict(key),
+                    'count': hist.count,
+                    'sum': hist.sum,
+                    'mean': hist.sum / hist.count if hist.count else 0,
+                    'buckets': dict(zip((str(b) for b in hist.buckets), hist.counts))
+                } for key, hist in series.items()]
+                for name, series in self.histograms.items()
+            }
+            pages = list(self.pages)
+        return {
+            'started_at': self.started_at,
+            'finished_at': time.time(),
+            'pages': pages,
+            'pages_recorded': self.pages_recorded,
+            'counters': counters,
+            'histograms': histograms,
+        }
+
+    def write_json(self, path: str):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.summary(), f, indent=2)
+        logger.info(f"Metrics summary written to {path}")
+
+    def render_prometheus(self) -> str:
+        """Render all metrics in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            for name, series in sorted(self.counters.items()):
+                metric = f"{self.namespace}_{name}_total"
+                lines.append(f"# TYPE {metric} counter")
+                for key, value in series.items():
+                    lines.append(f"{metric}{_format_labels(key)} {value}")
+            for name, series in sorted(self.histograms.items()):
+                metric = f"{self.namespace}_{name}"
+                lines.append(f"# TYPE {metric} histogram")
+                for key, hist in series.items():
+                    for bound, count in zip(hist.buckets, hist.counts):
+                        lines.append(f"{metric}_bucket{_format_labels(key, {'le': str(bound)})} {count}")
+                    lines.append(f"{metric}_bucket{_format_labels(key, {'le': '+Inf'})} {hist.count}")
+                    lines.append(f"{metric}_sum{_format_labels(key)} {hist.sum}")
+                    lines.append(f"{metric}_count{_format_labels(key)} {hist.count}")
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path: str):
+        """Write a node_exporter textfile-collector compatible file atomically"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(self.render_prometheus())
+        os.replace(tmp_path, path)
+        logger.info(f"Prometheus metrics written to {path}")
+
+    def serve(self, port: int, host: str = '127.0.0.1') -> ThreadingHTTPServer:
+        """Serve /metrics from a background thread"""
+        recorder = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip('/') not in ('', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = recorder.render_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        logger.info(f"Serving metrics on http://{host}:{server.server_port}/metrics")
+        return server
+
+
+class _UsageStream:
+    """Wraps a streamed completion to record the usage chunk as it passes through"""
+
+    def __init__(self, stream, recorder: MetricsRecorder, model: str):
+        self._stream = stream
+        self._recorder = recorder
+        self._model = model
+
+    def __iter__(self):
+        for chunk in self._stream:
+            _record_usage(self._recorder, getattr(chunk, 'usage', None), self._model)
+            yield chunk
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+def _record_usage(recorder: MetricsRecorder, usage, model: str):
+    if not usage:
+        return
+    recorder.inc('prompt_tokens', getattr(usage, 'prompt_tokens', 0) or 0, model=model)
+    recorder.inc('completion_tokens', getattr(usage, 'completion_tokens', 0) or 0, model=model)
+
+
+def instrument_openai_client(client, recorder: Optional[MetricsRecorder] = None):
+    """Count prompt and completion tokens for every chat completion made through the client"""
+    recorder = recorder or metrics
+    completions = client.chat.completions
+    create = completions.create
+
+    def instrumented_create(*args, **kwargs):
+        model = kwargs.get('model', 'unknown')
+        if kwargs.get('stream'):
+            # Ask for the trailing usage chunk so streamed calls are counted too
+            kwargs.setdefault('stream_options', {'include_usage': True})
+        recorder.inc('llm_requests', model=model)
+        response = create(*args, **kwargs)
+        if kwargs.get('stream'):
+            return _UsageStream(response, recorder, model)
+        _record_usage(recorder, getattr(response, 'usage', None), model)
+        return response
+
+    completions.create = instrumented_create
+    return client
+
+
+# Process-wide recorder used by the pipeline
+metrics = MetricsRecorder()
@@ -0,0 +1,201 @@
+"""
+HTML Minifier
+Strips markup that never reaches the final markdown before HTML is sent to
+the LLM: scripts, styles, SVG, iframes, hidden elements, comments and every
+attribute that carries no meaning for markdown. Links, image sources and alt
+text, table spans and code language hints are kept.
+"""
+
+import re
+import logging
+from typing import Dict
+from bs4 import BeautifulSoup
+from bs4.element import Comment, Doctype, ProcessingInstruction, Tag
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Elements removed together with their contents
+REMOVED_TAGS = [
+    'script', 'style', 'noscript', 'iframe', 'svg', 'template', 'link', 'meta', 'object',
+    'embed', 'canvas', 'video', 'audio', 'source', 'track', 'map', 'button', 'select', 'input',
+    'textarea', 'dialog'
+]
+
+# Elements replaced by their children because they only carry presentation
+UNWRAPPED_TAGS = ['span', 'font', 'picture', 'center', 'small', 'big', 'label']
+
+# Attributes that matter for markdown, per tag
+KEPT_ATTRIBUTES = {
+    'a': {'href', 'title'},
+    'img': {'src', 'alt', 'title'},
+    'th': {'colspan', 'rowspan'},
+    'td': {'colspan', 'rowspan'},
+    'ol': {'start'},
+    'abbr': {'title'},
+    'blockquote': {'cite'},
+    'code': {'class'},
+    'pre': {'class'},
+}
+
+# Block-level elements that start on a new line, so the chunker can split between them
+BLOCK_TAGS = {
+    'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'p', 'ul', 'ol', 'li', 'table', 'tr', 'pre', 'blockquote',
+    'section', 'article', 'main', 'div', 'dl', 'dt', 'dd', 'figure', 'hr', 'header', 'footer', 'aside', 'nav'
+}
+
+# Elements whose whitespace is significant
+PREFORMATTED_TAGS = {'pre', 'code', 'textarea'}
+
+# Elements that are meaningful even without text
+VOID_CONTENT_TAGS = {'img', 'br', 'hr', 'td', 'th', 'tr'}
+
+HIDDEN_STYLE = re.compile(r'display\s*:\s*none|visibility\s*:\s*hidden', re.IGNORECASE)
+LANGUAGE_CLASS = re.compile(r'^(?:language|lang)-[\w+#-]+$')
+
+
+def estimate_prompt_tokens(markup: str) -> int:
+    """Estimate the tokens a piece of markup costs in a prompt (1 token ≈ 4 characters)"""
+    return len(markup) // 4
+
+
+def _is_hidden(tag: Tag) -> bool:
+    if tag.has_attr('hidden') or tag.get('aria-hidden') == 'true':
+        return True
+    return bool(HIDDEN_STYLE.search(tag.get('style', '')))
+
+
+def _language_hint(tag: Tag):
+    """Reduce class lists on code elements to the language hint, if any"""
+    languages = [c for c in tag.get('class', []) if LANGUAGE_CLASS.match(c)]
+    if not languages and tag.get('data-language'):
+        languages = [f"language-{tag['data-language']}"]
+    return languages[:1]
+
+
+def _clean_attributes(tag: Tag):
+    kept = KEPT_ATTRIBUTES.get(tag.name, set())
+    language = _language_hint(tag) if tag.name in ('code', 'pre') else []
+    tag.attrs = {name: value for name, value in tag.attrs.items() if name in kept and name != 'class'}
+    if language:
+        tag['class'] = language
+    if tag.name == 'img' and tag.get('src', '').startswith('data:'):
+        # Inline image data is pure noise for the model; the alt text carries the meaning
+        del tag['src']
+
+
+PREFORMATTED_BLOCK = re.compile(r'(<(pre|textarea)\b.*?</\2>)', re.IGNORECASE | re.DOTALL)
+BLOCK_START = re.compile(r'\s+(<(?:%s)\b)' % '|'.join(sorted(BLOCK_TAGS)), re.IGNORECASE)
+# Headings always start a line, even without whitespace before them: the chunker splits there
+HEADING_START = re.compile(r'(?<!\n)(<h[1-6]\b)', re.IGNORECASE)
+
+
+def _collapse_whitespace(markup: str) -> str:
+    """Collapse whitespace runs and start block elements on new lines, leaving <pre> untouched
+
+    Only whitespace already in front of a block element becomes a newline, so
+    this never adds characters except one newline per heading. Done on the
+    serialized markup because editing thousands of text nodes through
+    BeautifulSoup costs O(siblings) per edit.
+    """
+    parts = PREFORMATTED_BLOCK.split(markup)
+    result = []
+    # split() yields text, whole preformatted block, tag name, text, ...
+    for i in range(0, len(parts), 3):
+        text = re.sub(r'\s+', ' ', parts[i])
+        result.append(HEADING_START.sub(r'\n\1', BLOCK_START.sub(r'\n\1', text)))
+        if i + 1 < len(parts):
+            result[-1] = result[-1].rstrip() + '\n'
+            result.append(parts[i + 1])
+    return ''.join(result)
+
+
+def minify_soup(soup: BeautifulSoup) -> BeautifulSoup:
+    """Drop non-content elements and attributes from a parsed document in place"""
+    for node in soup.find_all(string=lambda s: isinstance(s, (Comment, Doctype, ProcessingInstruction))):
+        node.extract()
+
+    removed = set(REMOVED_TAGS)
+    for tag in soup.find_all(lambda t: t.name in removed or _is_hidden(t)):
+        # Nested matches may already be gone with their ancestor
+        if not tag.decomposed:
+            tag.decompose()
+
+    # The document title stays available for get_page_title; the rest of <head> goes
+    head = soup.find('head')
+    if head:
+        for child in list(head.children):
+            if not (isinstance(child, Tag) and child.name == 'title'):
+                child.extract()
+
+    unwrapped = []
+    for tag in soup.find_all(True):
+        _clean_attributes(tag)
+        if tag.name in UNWRAPPED_TAGS:
+            unwrapped.append(tag)
+        elif tag.name == 'img' and not tag.get('src') and not tag.get('alt'):
+            unwrapped.append(tag)
+    for tag in unwrapped:
+        if tag.name == 'img':
+            tag.decompose()
+        else:
+            tag.unwrap()
+
+    # Remove elements left empty, innermost first so emptiness propagates upwards
+    for tag in reversed(soup.find_all(True)):
+        if tag.name in VOID_CONTENT_TAGS or tag.name in ('html', 'body', 'head'):
+            continue
+        if not any(isinstance(child, Tag) or child.strip() for child in tag.contents):
+            tag.decompose()
+
+    return soup
+
+
+def minify_html(html_content: str) -> str:
+    """Return a minified copy of an HTML document"""
+    soup = minify_soup(BeautifulSoup(html_content, 'html.parser'))
+    return _collapse_whitespace(str(soup)).strip()
+
+
+def minification_report(original: str, minified: str) -> Dict:
+    """Compare prompt-token estimates before and after minification (the reduction is never negative)"""
+    before = estimate_prompt_tokens(original)
+    after = estimate_prompt_tokens(minified)
+    return {
+        'tokens_before': before,
+        'tokens_after': after,
+        'reduction': max(0.0, 1 - after / before) if before else 0.0,
+    }
+
+
+def estimate_minified_tokens(soup: BeautifulSoup) -> int:
+    """Estimate the prompt tokens of minify_html's output from an already-parsed document
+
+    One read-only walk that counts the text and tag markup minification keeps,
+    instead of copying and rewriting the document; meant for triage, where the
+    minified markup itself is never needed.
+    """
+    removed = set(REMOVED_TAGS)
+    unwrapped = set(UNWRAPPED_TAGS)
+    chars = 0
+    stack = list(soup.contents)
+    while stack:
+        node = stack.pop()
+        if isinstance(node, Tag):
+            if node.name in removed or _is_hidden(node):
+                continue
+            if node.name == 'head':
+                stack.extend(child for child in node.contents if isinstance(child, Tag) and child.name == 'title')
+                continue
+            if node.name not in unwrapped:
+                kept = KEPT_ATTRIBUTES.get(node.name, ())
+                # <name attr="value">...</name>
+                chars += 2 * len(node.name) + 5 + sum(
+                    len(name) + len(str(value)) + 4 for name, value in node.attrs.items()
+                    if name in kept and name != 'class')
+            stack.extend(node.contents)
+        elif not isinstance(node, (Comment, Doctype, ProcessingInstruction)):
+            chars += len(re.sub(r'\s+', ' ', node))
+    # Same 1 token ≈ 4 characters rule as estimate_prompt_tokens
+    return chars // 4
@@ -0,0 +1,282 @@
+"""
+PDF Extraction
+Native text extraction for PDF documents with PyMuPDF, used instead of a
+browser screenshot and OCR. Pages are read one at a time into
+pre-structured markdown: text blocks in reading order, headings from font
+sizes, monospaced blocks as code, ruled tables as markdown tables and
+embedded images (optionally saved and linked). Pages without a text layer
+are rendered and handed to OCR.
+"""
+
+import os
+import re
+import hashlib
+import logging
+import argparse
+from collections import Counter
+from urllib.parse import urlparse
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from PIL import Image
+
+try:
+    import pymupdf
+except ImportError:  # PyMuPDF < 1.24 only provides the fitz name
+    import fitz as pymupdf
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+PDF_CONTENT_TYPES = ('application/pdf', 'application/x-pdf')
+BULLETS = re.compile(r'^\s*[•·◦▪▫●○■□\-–]\s+')
+MONOSPACE_FLAG = 8
+MAX_HEADING_LEVELS = 4
+
+
+def is_pdf(content_type: Optional[str], content: bytes = b'') -> bool:
+    """True for a PDF content type or a body starting with the %PDF- signature"""
+    if content_type and content_type.split(';')[0].strip().lower() in PDF_CONTENT_TYPES:
+        return True
+    return content[:1024].lstrip().startswith(b'%PDF-')
+
+
+def document_image_dir(image_dir: str, url: str, data: bytes) -> str:
+    """Subdirectory of image_dir for one document's images: its file name and a hash of its content
+
+    Image files are named by page and position, so documents sharing image_dir
+    would otherwise overwrite each other's images.
+    """
+    name = os.path.splitext(os.path.basename(urlparse(url).path))[0]
+    slug = re.sub(r'[^\w-]+', '-', name.lower()).strip('-')[:40] or 'document'
+    return os.path.join(image_dir, f"{slug}-{hashlib.sha256(data).hexdigest()[:12]}")
+
+
+def _line_text(line: Dict) -> str:
+    return ''.join(span['text'] for span in line['spans'])
+
+
+def _dominant_size(spans: List[Dict]) -> float:
+    """Font size carrying the most characters, rounded to half points"""
+    sizes = Counter()
+    for span in spans:
+        sizes[round(span['size'] * 2) / 2] += len(span['text'].strip())
+    return sizes.most_common(1)[0][0] if sizes else 0.0
+
+
+def _is_monospace(spans: List[Dict]) -> bool:
+    spans = [span for span in spans if span['text'].strip()]
+    return bool(spans) and all(span['flags'] & MONOSPACE_FLAG or 'mono' in span['font'].lower()
+                               or 'courier' in span['font'].lower() for span in spans)
+
+
+def heading_levels(document, sample_pages: int = 50) -> Dict[float, int]:
+    """Map font sizes noticeably larger than the body text to heading levels (largest first)
+
+    Sizes come from the first sample_pages pages; the body size is the one
+    carrying the most characters.
+    """
+    sizes = Counter()
+    for page in document.pages(0, min(sample_pages, document.page_count)):
+        for block in page.get_text('dict')['blocks']:
+            for line in block.get('lines', []):
+                for span in line['spans']:
+                    sizes[round(span['size'] * 2) / 2] += len(span['text'].strip())
+    if not sizes:
+        return {}
+    body = sizes.most_common(1)[0][0]
+    larger = sorted((size for size in sizes if size >= body * 1.15), reverse=True)
+    return {size: level for level, size in enumerate(larger[:MAX_HEADING_LEVELS], 1)}
+
+
+def _table_markdown(table) -> str:
+    rows = [[(cell or '').replace('\n', ' ').replace('|', '\\|').strip() for cell in row] for row in table.extract()]
+    rows = [row for row in rows if any(row)]
+    if not rows:
+        return ''
+    width = max(len(row) for row in rows)
+    rows = [row + [''] * (width - len(row)) for row in rows]
+    lines = ['| ' + ' | '.join(rows[0]) + ' |', '|' + '---|' * width]
+    lines.extend('| ' + ' | '.join(row) + ' |' for row in rows[1:])
+    return '\n'.join(lines)
+
+
+def _inside(bbox: Tuple[float, ...], rects: List[Tuple[float, ...]]) -> bool:
+    x0, y0, x1, y1 = bbox
+    cx, cy = (x0 + x1) / 2, (y0 + y1) / 2
+    return any(r[0] <= cx <= r[2] and r[1] <= cy <= r[3] for r in rects)
+
+
+def _block_markdown(block: Dict, levels: Dict[float, int]) -> str:
+    lines = [line for line in block['lines'] if _line_text(line).strip()]
+    if not lines:
+        return ''
+    spans = [span for line in lines for span in line['spans']]
+    if _is_monospace(spans):
+        return '```\n' + '\n'.join(_line_text(line).rstrip() for line in lines) + '\n```'
+    level = levels.get(_dominant_size(spans))
+    if level:
+        return '#' * level + ' ' + ' '.join(_line_text(line).strip() for line in lines)
+
+    # Join wrapped lines into paragraphs; bulleted lines start list items
+    items: List[str] = []
+    for line in lines:
+        text = _line_text(line).strip()
+        if BULLETS.match(text):
+            items.append('- ' + BULLETS.sub('', text))
+        elif items and items[-1].endswith('-') and not items[-1].endswith(' -'):
+            items[-1] = items[-1][:-1] + text
+        elif items:
+            items[-1] += ' ' + text
+        else:
+            items.append(text)
+    return '\n'.join(items)
+
+
+class PDFDocument:
+    """A PDF opened from bytes, read page by page into pre-structured markdown"""
+
+    def __init__(self, data: bytes, min_text_chars: int = 20, ocr_dpi: int = 200, min_image_size: int = 48):
+        self.document = pymupdf.open(stream=data, filetype='pdf')
+        self.min_text_chars = min_text_chars
+        self.ocr_dpi = ocr_dpi
+        self.min_image_size = min_image_size
+        self.levels = heading_levels(self.document)
+
+    @property
+    def page_count(self) -> int:
+        return self.document.page_count
+
+    @property
+    def title(self) -> Optional[str]:
+        return (self.document.metadata or {}).get('title') or None
+
+    def close(self):
+        self.document.close()
+
+    def __enter__(self) -> 'PDFDocument':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def pages(self, ocr: Optional[Callable[[Image.Image], str]] = None,
+              image_dir: Optional[str] = None, image_link_base: Optional[str] = None) -> Iterator[Dict]:
+        """Yield one dict per page: number, markdown, text_chars, tables, images, links and whether OCR was used
+
+        Pages with fewer than min_text_chars characters of text are rendered and
+        passed to ocr (when given). Images are saved to image_dir (when given)
+        and linked relative to image_link_base.
+        """
+        for page in self.document:
+            yield self._page(page, ocr, image_dir, image_link_base)
+
+    def _page(self, page, ocr, image_dir, image_link_base) -> Dict:
+        number = page.number + 1
+        result = {'number': number, 'markdown': '', 'text_chars': 0, 'tables': 0, 'images': 0, 'ocr': False,
+                  'links': [link['uri'] for link in page.get_links() if link.get('uri')]}
+        blocks = page.get_text('dict', sort=True)['blocks']
+        text_chars = sum(len(_line_text(line).strip()) for block in blocks for line in block.get('lines', []))
+        result['text_chars'] = text_chars
+
+        if text_chars < self.min_text_chars:
+            if ocr is not None and (page.get_images() or page.get_drawings()):
+                pixmap = page.get_pixmap(dpi=self.ocr_dpi, alpha=False)
+                image = Image.frombytes('RGB', (pixmap.width, pixmap.height), pixmap.samples)
+                result['markdown'] = ocr(image).strip()
+                result['ocr'] = True
+            return result
+
+        # Text blocks keep PyMuPDF's reading order; tables and images are (top, markdown) inserts placed by position
+        texts: List[Tuple[float, str]] = []
+        inserts: List[Tuple[float, str]] = []
+        table_rects = []
+        finder = getattr(page, 'find_tables', None)
+        if finder is not None:
+            try:
+                for table in finder().tables:
+                    markdown = _table_markdown(table)
+                    if markdown:
+                        table_rects.append(tuple(table.bbox))
+                        inserts.append((table.bbox[1], markdown))
+            except Exception as e:
+                logger.warning(f"Table detection failed on page {number}: {e}")
+        result['tables'] = len(table_rects)
+
+        for block in blocks:
+            if block['type'] != 0 or _inside(block['bbox'], table_rects):
+                continue
+            markdown = _block_markdown(block, self.levels)
+            if markdown.startswith('```') and texts and texts[-1][1].startswith('```'):
+                # Consecutive code lines often come out as separate blocks
+                texts[-1] = (texts[-1][0], texts[-1][1][:-3] + markdown[4:])
+            elif markdown:
+                texts.append((block['bbox'][1], markdown))
+
+        for index, (xref, *_) in enumerate(page.get_images(full=True), 1):
+            rects = page.get_image_rects(xref)
+            if not rects or rects[0].width < self.min_image_size or rects[0].height < self.min_image_size:
+                continue
+            result['images'] += 1
+            if image_dir is None:
+                continue
+            extracted = self.document.extract_image(xref)
+            if not extracted:
+                continue
+            os.makedirs(image_dir, exist_ok=True)
+            path = os.path.join(image_dir, f"page{number:03d}-{index}.{extracted['ext']}")
+            with open(path, 'wb') as f:
+                f.write(extracted['image'])
+            link = os.path.relpath(path, image_link_base) if image_link_base else path
+            inserts.append((rects[0].y0, f"![Image {index} on page {number}]({link})"))
+
+        # Each insert goes before the first text block that starts below it
+        inserts.sort(key=lambda item: item[0])
+        ordered = []
+        for top, markdown in texts:
+            while inserts and inserts[0][0] <= top:
+                ordered.append(inserts.pop(0)[1])
+            ordered.append(markdown)
+        ordered.extend(markdown for _, markdown in inserts)
+        result['markdown'] = '\n\n'.join(ordered)
+        return result
+
+
+def main():
+    """Main function to extract a PDF to pre-structured markdown (before the LLM passes)"""
+    parser = argparse.ArgumentParser(description='Extract a PDF to markdown with PyMuPDF')
+    parser.add_argument('pdf', help='PDF file or URL')
+    parser.add_argument('--output', '-o', help='Markdown file to write (default: stdout)')
+    parser.add_argument('--images', help='Directory to save embedded images into')
+    parser.add_argument('--ocr', action='store_true', help='OCR pages without a text layer (needs tesseract)')
+    args = parser.parse_args()
+
+    if '://' in args.pdf:
+        from .fetcher import get_default_fetcher
+        data = get_default_fetcher().fetch(args.pdf, max_body_size=200 * 1024 * 1024).content
+    else:
+        with open(args.pdf, 'rb') as f:
+            data = f.read()
+    if not is_pdf(None, data):
+        parser.error(f"{args.pdf} is not a PDF")
+
+    ocr = None
+    if args.ocr:
+        import pytesseract
+        ocr = pytesseract.image_to_string
+    link_base = os.path.dirname(os.path.abspath(args.output)) if args.output else None
+    with PDFDocument(data) as document:
+        parts = [f"# {document.title}"] if document.title else []
+        for page in document.pages(ocr=ocr, image_dir=args.images, image_link_base=link_base):
+            parts.append(page['markdown'])
+        markdown = '\n\n'.join(part for part in parts if part) + '\n'
+        logger.info(f"Extracted {document.page_count} pages ({len(markdown)} characters)")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(markdown)
+    else:
+        print(markdown)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+Stage Graph
+A small dependency graph of pipeline stages. Stages whose inputs are ready
+run concurrently on a thread pool (they mostly wait on the network, the
+browser or the model), so a page takes about as long as its slowest chain of
+dependent stages rather than the sum of all of them. Each run reports that
+chain, the critical path.
+"""
+
+import time
+import logging
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+from .metrics import metrics
+from . import deadlines, profiling
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Stage:
+    """A named step called with the results of its dependencies, in order"""
+    name: str
+    fn: Callable
+    deps: Tuple[str, ...] = ()
+    # Called with the dependency results; False skips the stage and everything depending on it
+    when: Optional[Callable[..., bool]] = None
+
+
+@dataclass
+class GraphRun:
+    """Results and timings of one graph run (times in seconds from the start of the run)
+
+    Skipped stages have a result of None.
+    """
+    stages: Dict[str, Stage]
+    results: Dict[str, Any] = field(default_factory=dict)
+    timings: Dict[str, Tuple[float, float]] = field(default_factory=dict)
+    skipped: Set[str] = field(default_factory=set)
+    wall_seconds: float = 0.0
+
+    def critical_path(self) -> List[Tuple[str, float]]:
+        """The chain of stages that decided the run's duration, as (stage, seconds) pairs
+
+        Walks back from the stage that finished last, each time to the
+        dependency that finished last.
+        """
+        if not self.timings:
+            return []
+        name = max(self.timings, key=lambda n: self.timings[n][1])
+        path = []
+        while name is not None:
+            start, end = self.timings[name]
+            path.append((name, end - start))
+            ran = [dep for dep in self.stages[name].deps if dep in self.timings]
+            name = max(ran, key=lambda n: self.timings[n][1]) if ran else None
+        return path[::-1]
+
+    def report(self) -> Dict:
+        path = self.critical_path()
+        return {
+            'wall_seconds': self.wall_seconds,
+            'stage_seconds': sum(end - start for start, end in self.timings.values()),
+            'critical_path': [{'stage': name, 'seconds': seconds} for name, seconds in path],
+            'critical_path_seconds': sum(seconds for _, seconds in path),
+            'skipped': sorted(self.skipped),
+        }
+
+    def describe(self) -> str:
+        report = self.report()
+        path = ' -> '.join(f"{step['stage']} {step['seconds']:.2f}s" for step in report['critical_path'])
+        return (f"{path} ({report['wall_seconds']:.2f}s wall, "
+                f"{report['stage_seconds']:.2f}s of stage time)")
+
+
+class StageGraph:
+    """Stages added in dependency order, run with as much overlap as their dependencies allow"""
+
+    def __init__(self, max_workers: Optional[int] = None):
+        self.stages: Dict[str, Stage] = {}
+        self.max_workers = max_workers
+
+    def add(self, name: str, fn: Callable, deps: Tuple[str, ...] = (),
+            when: Optional[Callable[..., bool]] = None) -> 'StageGraph':
+        """Add a stage; its dependencies must already be in the graph (so it cannot form a cycle)"""
+        if name in self.stages:
+            raise ValueError(f"Duplicate stage: {name}")
+        missing = [dep for dep in deps if dep not in self.stages]
+        if missing:
+            raise ValueError(f"Stage {name} depends on unknown stages: {', '.join(missing)}")
+        self.stages[name] = Stage(name, fn, tuple(deps), when)
+        return self
+
+    def run(self) -> GraphRun:
+        """Run every stage once its dependencies are done and return the results
+
+        Stages run on worker threads that share the caller's metrics page,
+        deadline and CPU profile (see profiling.py). The first stage error stops new stages from starting; stages
+        already running are waited for, then the error is raised.
+        """
+        run = GraphRun(self.stages)
+        page = metrics.current_page()
+        deadline = deadlines.current()
+        thread_profiles = profiling.current()
+        started = time.perf_counter()
+        done: Set[str] = set()
+        waiting = list(self.stages.values())
+        error: Optional[BaseException] = None
+
+        def invoke(stage: Stage, args: List[Any]):
+            with metrics.bind_page(page), deadlines.scope(deadline), profiling.profile_thread(thread_profiles):
+                start = time.perf_counter() - started
+                try:
+                    return stage.fn(*args)
+                finally:
+                    run.timings[stage.name] = (start, time.perf_counter() - started)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers or len(self.stages) or 1,
+                                thread_name_prefix='stage') as executor:
+            running = {}
+            while True:
+                # Start (or skip) every stage whose dependencies are done; a skip can unblock more
+                progressed = error is None
+                while progressed:
+                    progressed = False
+                    for stage in list(waiting):
+                        if not all(dep in done for dep in stage.deps):
+                            continue
+                        waiting.remove(stage)
+                        progressed = True
+                        args = [run.results.get(dep) for dep in stage.deps]
+                        if any(dep in run.skipped for dep in stage.deps) or (stage.when and not stage.when(*args)):
+                            run.skipped.add(stage.name)
+                            run.results[stage.name] = None
+                            done.add(stage.name)
+                            continue
+                        running[executor.submit(invoke, stage, args)] = stage
+                if not running:
+                    break
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    stage = running.pop(future)
+                    try:
+                        run.results[stage.name] = future.result()
+                        done.add(stage.name)
+                    except BaseException as e:
+                        if error is None:
+                            error = e
+        run.wall_seconds = time.perf_counter() - started
+        if error is not None:
+            raise error
+        return run
@@ -0,0 +1,192 @@
+"""
+Conversion Profiling
+Optional per-URL CPU and memory profiling. When enabled, each profiled call
+writes a cProfile/pstats dump, a collapsed-stack file for flamegraph tools
+(flamegraph.pl, speedscope, inferno) and a tracemalloc top-N report. When
+disabled, profile() is a no-op. Work handed to other threads (the stage graph
+in pipeline.py) is profiled there and merged into the same pstats dump.
+"""
+
+import os
+import re
+import sys
+import time
+import pstats
+import cProfile
+import logging
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+from urllib.parse import urlparse
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+
+def _slug(label: str) -> str:
+    parsed = urlparse(label)
+    base = f"{parsed.netloc}{parsed.path}" if parsed.netloc else label
+    slug = re.sub(r'[^\w-]+', '-', base).strip('-')[:80] or 'profile'
+    return f"{slug}-{time.strftime('%Y%m%d-%H%M%S')}"
+
+
+class StackSampler:
+    """Samples the stacks of all running threads into collapsed-stack counts"""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.counts: Dict[str, int] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                key = ';'.join(reversed(stack))
+                self.counts[key] = self.counts.get(key, 0) + 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def write(self, path: str):
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in sorted(self.counts.items()):
+                f.write(f"{stack} {count}\n")
+
+
+class ThreadProfiles:
+    """cProfile data collected on the worker threads of a profiled conversion"""
+
+    def __init__(self):
+        self.profiles: List[cProfile.Profile] = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def profile(self) -> Iterator[None]:
+        """Profile the enclosed block on the current thread"""
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Python 3.12+ cProfile already covers every thread from the caller's profiler
+            profiler = None
+        try:
+            yield
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                with self._lock:
+                    self.profiles.append(profiler)
+
+
+def current() -> Optional[ThreadProfiles]:
+    """The collector of the conversion being CPU-profiled on this thread, if any"""
+    return getattr(_local, 'threads', None)
+
+
+@contextmanager
+def profile_thread(threads: Optional[ThreadProfiles]) -> Iterator[None]:
+    """Profile the enclosed block into a collector taken from current() on another thread (no-op for None)"""
+    if threads is None:
+        yield
+        return
+    with threads.profile():
+        yield
+
+
+class ConversionProfiler:
+    """Profiles individual conversions when CPU and/or memory profiling is enabled"""
+
+    def __init__(self, output_dir: str = os.path.join('output', 'profiles'), cpu: bool = False,
+                 memory: bool = False, top_n: int = 25, sample_interval: float = 0.005):
+        self.output_dir = output_dir
+        self.cpu = cpu
+        self.memory = memory
+        self.top_n = top_n
+        self.sample_interval = sample_interval
+
+    @property
+    def enabled(self) -> bool:
+        return self.cpu or self.memory
+
+    @contextmanager
+    def profile(self, label: str) -> Iterator[None]:
+        """Profile the enclosed block, writing reports named after the label (usually a URL)"""
+        if not self.enabled:
+            yield
+            return
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        base = os.path.join(self.output_dir, _slug(label))
+        profiler = sampler = threads = None
+        started_tracing = False
+
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start(25)
+            started_tracing = True
+        if self.cpu:
+            sampler = StackSampler(self.sample_interval)
+            sampler.start()
+            threads = ThreadProfiles()
+            previous_threads, _local.threads = current(), threads
+            profiler = cProfile.Profile()
+            profiler.enable()
+        try:
+            yield
+        finally:
+            if profiler:
+                profiler.disable()
+                _local.threads = previous_threads
+                sampler.stop()
+                stats = pstats.Stats(profiler)
+                for thread_profiler in threads.profiles:
+                    stats.add(thread_profiler)
+                stats.dump_stats(f"{base}.pstats")
+                sampler.write(f"{base}.collapsed")
+                with open(f"{base}.txt", 'w', encoding='utf-8') as f:
+                    stats.stream = f
+                    stats.sort_stats('cumulative').print_stats(self.top_n)
+                logger.info(f"CPU profile for {label} written to {base}.pstats / .collapsed / .txt")
+            if self.memory:
+                self._write_memory_report(f"{base}.memory.txt", label)
+                if started_tracing:
+                    tracemalloc.stop()
+
+    def _write_memory_report(self, path: str, label: str):
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+        ))
+        current, peak = tracemalloc.get_traced_memory()
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(f"Memory profile for {label}\n")
+            f.write(f"Current traced: {current / 1e6:.2f} MB, peak traced: {peak / 1e6:.2f} MB\n\n")
+            f.write(f"Top {self.top_n} allocation sites:\n")
+            for stat in snapshot.statistics('lineno')[:self.top_n]:
+                f.write(f"{stat}\n")
+            f.write("\nLargest allocation tracebacks:\n")
+            for stat in snapshot.statistics('traceback')[:5]:
+                f.write(f"\n{stat.count} blocks, {stat.size / 1024:.1f} KiB\n")
+                for line in stat.traceback.format():
+                    f.write(f"{line}\n")
+        logger.info(f"Memory profile for {label} written to {path}")
@@ -0,0 +1,332 @@
+"""
+Screenshot Store
+Content-addressed storage for page captures. Each PNG is stored once under
+its SHA-256, a SQLite index maps URLs to their captures (and the latest one),
+and an optional perceptual hash (dHash) treats a capture that barely differs
+from the URL's previous one as unchanged. Files and index rows are written by
+a background thread, so capturing never waits on disk. Vision analyses are
+kept per screenshot hash, so an unchanged rendering skips the vision call.
+Old or excess blobs are pruned by age or total size.
+"""
+
+import io
+import os
+import json
+import time
+import queue
+import sqlite3
+import hashlib
+import logging
+import argparse
+import threading
+from typing import Dict, List, Optional
+import numpy as np
+from PIL import Image
+from .metrics import metrics
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    hash TEXT PRIMARY KEY,
+    phash TEXT,
+    size INTEGER NOT NULL,
+    width INTEGER,
+    height INTEGER,
+    created REAL NOT NULL,
+    last_seen REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS captures (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    url TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    captured REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS captures_url ON captures (url, captured);
+CREATE INDEX IF NOT EXISTS captures_hash ON captures (hash);
+CREATE TABLE IF NOT EXISTS vision (
+    hash TEXT NOT NULL,
+    key TEXT NOT NULL,
+    analysis TEXT NOT NULL,
+    created REAL NOT NULL,
+    PRIMARY KEY (hash, key)
+);
+"""
+
+
+def dhash(image: Image.Image, size: int = 32) -> int:
+    """Difference hash: size*size bits, one per horizontally adjacent pair of a downscaled grayscale frame"""
+    small = image.convert('L').resize((size + 1, size), Image.Resampling.BILINEAR, reducing_gap=2.0)
+    pixels = np.asarray(small, dtype=np.int16)
+    bits = np.packbits((pixels[:, 1:] > pixels[:, :-1]).flatten())
+    return int.from_bytes(bits.tobytes(), 'big')
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count('1')
+
+
+class ScreenshotStore:
+    """PNG blobs keyed by content hash, with a URL index, vision cache and retention"""
+
+    def __init__(self, root: str, near_duplicate_distance: int = 0, max_age: Optional[float] = None,
+                 max_bytes: Optional[int] = None, queue_size: int = 64):
+        """near_duplicate_distance: largest dHash distance (of 1024 bits) to the URL's previous
+        capture that still counts as unchanged; 0 only deduplicates identical PNGs.
+        max_age (seconds) and max_bytes bound what prune() keeps; max_bytes is also
+        enforced as captures are written."""
+        self.root = root
+        self.near_duplicate_distance = near_duplicate_distance
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        os.makedirs(os.path.join(root, 'objects'), exist_ok=True)
+        self.index_path = os.path.join(root, 'index.db')
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+        # Captures queued but not yet in the index, so latest() sees them right away
+        self._pending: Dict[str, Dict] = {}
+        self._pending_lock = threading.Lock()
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._writer = threading.Thread(target=self._write_loop, name='screenshot-writer', daemon=True)
+        self._writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        # One connection per thread: callers read from their own threads, the writer writes from its own
+        if getattr(self._local, 'conn', None) is None:
+            self._local.conn = sqlite3.connect(self.index_path, timeout=30)
+            self._local.conn.row_factory = sqlite3.Row
+            self._local.conn.execute('PRAGMA journal_mode=WAL')
+        return self._local.conn
+
+    def blob_path(self, content_hash: str) -> str:
+        return os.path.join(self.root, 'objects', content_hash[:2], f"{content_hash}.png")
+
+    def put(self, screenshot: bytes, url: str) -> Dict:
+        """Record a capture and return {'hash', 'path', 'duplicate'} without waiting for the write
+
+        'duplicate' is 'exact' when the same PNG is already stored, 'near' when it
+        is within near_duplicate_distance of the URL's previous capture (whose hash
+        and path are returned instead), and None for new content.
+        """
+        content_hash = hashlib.sha256(screenshot).hexdigest()
+        phash = None
+        duplicate = None
+        previous = self.latest(url)
+        unchanged = previous is not None and previous['hash'] == content_hash
+        stored = None if unchanged else self._stored_blob(content_hash)
+        if unchanged:
+            duplicate = 'exact'
+            phash = previous.get('phash')
+        elif stored is not None:
+            duplicate = 'exact'
+            phash = stored['phash']
+        elif self.near_duplicate_distance:
+            # Only the URL's own previous capture is compared: pages sharing a template hash alike
+            phash = format(dhash(Image.open(io.BytesIO(screenshot))), 'x')
+            if (previous is not None and previous.get('phash')
+                    and hamming(int(phash, 16), int(previous['phash'], 16)) <= self.near_duplicate_distance):
+                duplicate = 'near'
+                content_hash = previous['hash']
+                phash = previous['phash']
+        if duplicate:
+            metrics.inc('screenshot_duplicates', kind=duplicate)
+
+        capture = {'url': url, 'hash': content_hash, 'path': self.blob_path(content_hash), 'captured': time.time(),
+                   'phash': phash}
+        with self._pending_lock:
+            self._pending[url] = capture
+        self._queue.put(('capture', capture, None if duplicate else screenshot))
+        return {'hash': content_hash, 'path': capture['path'], 'duplicate': duplicate}
+
+    def _stored_blob(self, content_hash: str) -> Optional[sqlite3.Row]:
+        """The index row of a stored blob; a file without a row was left by a failed write"""
+        if not os.path.exists(self.blob_path(content_hash)):
+            return None
+        return self._connect().execute("SELECT phash FROM blobs WHERE hash = ?", (content_hash,)).fetchone()
+
+    def latest(self, url: str) -> Optional[Dict]:
+        """The most recent capture of a URL: hash, path, captured time and perceptual hash"""
+        with self._pending_lock:
+            pending = self._pending.get(url)
+        if pending is not None:
+            return dict(pending)
+        row = self._connect().execute(
+            "SELECT c.hash, c.captured, b.phash FROM captures c JOIN blobs b ON b.hash = c.hash "
+            "WHERE c.url = ? ORDER BY c.captured DESC LIMIT 1", (url,)).fetchone()
+        if row is None:
+            return None
+        return {'url': url, 'hash': row['hash'], 'path': self.blob_path(row['hash']), 'captured': row['captured'],
+                'phash': row['phash']}
+
+    def history(self, url: str) -> List[Dict]:
+        """Every indexed capture of a URL, newest first"""
+        self.flush()
+        rows = self._connect().execute(
+            "SELECT hash, captured FROM captures WHERE url = ? ORDER BY captured DESC", (url,)).fetchall()
+        return [{'url': url, 'hash': row['hash'], 'path': self.blob_path(row['hash']), 'captured': row['captured']}
+                for row in rows]
+
+    def get_analysis(self, content_hash: str, key: str) -> Optional[Dict]:
+        """The vision analysis stored for a screenshot hash under a model/settings key, if any"""
+        row = self._connect().execute(
+            "SELECT analysis FROM vision WHERE hash = ? AND key = ?", (content_hash, key)).fetchone()
+        return json.loads(row['analysis']) if row else None
+
+    def put_analysis(self, content_hash: str, key: str, analysis):
+        self._queue.put(('analysis', {'hash': content_hash, 'key': key, 'analysis': json.dumps(analysis)}, None))
+
+    def _write_loop(self):
+        while True:
+            item = self._queue.get()
+            batch = [item]
+            # Drain whatever else is waiting into the same transaction
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write_batch([entry for entry in batch if entry is not None])
+            except Exception as e:
+                logger.error(f"Screenshot store write failed: {e}")
+            finally:
+                # Written or not, these captures are settled; latest() falls back to the index
+                with self._pending_lock:
+                    for kind, entry, _ in filter(None, batch):
+                        if kind == 'capture' and self._pending.get(entry['url']) is entry:
+                            del self._pending[entry['url']]
+                for _ in batch:
+                    self._queue.task_done()
+            if None in batch:
+                return
+
+    def _write_batch(self, batch: List[tuple]):
+        conn = self._connect()
+        written = 0
+        with conn:
+            for kind, entry, data in batch:
+                if kind == 'analysis':
+                    conn.execute("INSERT OR REPLACE INTO vision VALUES (?, ?, ?, ?)",
+                                 (entry['hash'], entry['key'], entry['analysis'], time.time()))
+                    continue
+                if data is not None:
+                    if not os.path.exists(entry['path']):
+                        os.makedirs(os.path.dirname(entry['path']), exist_ok=True)
+                        temp_path = f"{entry['path']}.tmp"
+                        with open(temp_path, 'wb') as f:
+                            f.write(data)
+                        os.replace(temp_path, entry['path'])
+                        written += len(data)
+                    width, height = Image.open(io.BytesIO(data)).size
+                    conn.execute("INSERT OR IGNORE INTO blobs VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                 (entry['hash'], entry['phash'], len(data), width, height,
+                                  entry['captured'], entry['captured']))
+                conn.execute("UPDATE blobs SET last_seen = ? WHERE hash = ?", (entry['captured'], entry['hash']))
+                conn.execute("INSERT INTO captures (url, hash, captured) VALUES (?, ?, ?)",
+                             (entry['url'], entry['hash'], entry['captured']))
+        if written:
+            metrics.inc('screenshot_bytes_written', written)
+        if written and self.max_bytes is not None:
+            self.prune(max_bytes=self.max_bytes)
+
+    def prune(self, max_age: Optional[float] = None, max_bytes: Optional[int] = None) -> int:
+        """Delete blobs not seen for max_age seconds, then the least recently seen until the total fits max_bytes
+
+        Captures and vision analyses of deleted blobs go with them. Defaults to
+        the store's own policy; returns the number of blobs deleted.
+        """
+        max_age = self.max_age if max_age is None else max_age
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        conn = self._connect()
+        doomed = []
+        if max_age is not None:
+            doomed = [row['hash'] for row in conn.execute(
+                "SELECT hash FROM blobs WHERE last_seen < ?", (time.time() - max_age,))]
+        if max_bytes is not None:
+            # Keep the most recently seen blobs that fit
+            aged = set(doomed)
+            total = 0
+            for row in conn.execute("SELECT hash, size FROM blobs ORDER BY last_seen DESC").fetchall():
+                if row['hash'] in aged:
+                    continue
+                total += row['size']
+                if total > max_bytes:
+                    doomed.append(row['hash'])
+        if not doomed:
+            return 0
+        with conn:
+            conn.executemany("DELETE FROM captures WHERE hash = ?", [(h,) for h in doomed])
+            conn.executemany("DELETE FROM vision WHERE hash = ?", [(h,) for h in doomed])
+            conn.executemany("DELETE FROM blobs WHERE hash = ?", [(h,) for h in doomed])
+        for content_hash in doomed:
+            try:
+                os.remove(self.blob_path(content_hash))
+            except FileNotFoundError:
+                pass
+        metrics.inc('screenshots_pruned', len(doomed))
+        logger.info(f"Pruned {len(doomed)} screenshots from {self.root}")
+        return len(doomed)
+
+    def stats(self) -> Dict[str, int]:
+        self.flush()
+        conn = self._connect()
+        blobs, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs").fetchone()
+        captures, urls = conn.execute("SELECT COUNT(*), COUNT(DISTINCT url) FROM captures").fetchone()
+        analyses = conn.execute("SELECT COUNT(*) FROM vision").fetchone()[0]
+        return {'blobs': blobs, 'bytes': size, 'captures': captures, 'urls': urls, 'vision_analyses': analyses}
+
+    def flush(self):
+        """Wait until every queued capture is on disk and in the index"""
+        self._queue.join()
+
+    def close(self):
+        if self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join()
+        if self.max_age is not None:
+            self.prune()
+
+    def __enter__(self) -> 'ScreenshotStore':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def main():
+    """Main function to inspect or prune a screenshot store"""
+    parser = argparse.ArgumentParser(description='Inspect or prune a content-addressed screenshot store')
+    parser.add_argument('--store', default=os.path.join('output', 'screenshot-store'),
+                        help='Store directory (default: output/screenshot-store)')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    subparsers.add_parser('stats', help='Show blob, capture and vision cache counts')
+
+    latest = subparsers.add_parser('latest', help='Print the latest capture of a URL')
+    latest.add_argument('url', help='Page URL')
+
+    prune = subparsers.add_parser('prune', help='Delete old or excess screenshots')
+    prune.add_argument('--max-age-days', type=float, help='Delete screenshots not captured for this many days')
+    prune.add_argument('--max-mb', type=float, help='Delete the least recently captured screenshots above this size')
+    args = parser.parse_args()
+
+    with ScreenshotStore(args.store) as store:
+        if args.command == 'stats':
+            print(json.dumps(store.stats(), indent=2))
+        elif args.command == 'latest':
+            capture = store.latest(args.url)
+            if capture is None:
+                parser.exit(1, f"No capture of {args.url}\n")
+            print(json.dumps(capture, indent=2))
+        else:
+            if args.max_age_days is None and args.max_mb is None:
+                parser.error('prune needs --max-age-days and/or --max-mb')
+            store.prune(max_age=args.max_age_days * 86400 if args.max_age_days is not None else None,
+                        max_bytes=int(args.max_mb * 1024 * 1024) if args.max_mb is not None else None)
+
+
+if __name__ == "__main__":
+    main()
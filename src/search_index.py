@@ -0,0 +1,304 @@
+"""
+Section Search Index
+SQLite FTS5 index over converted documents. Each document is split at its
+markdown headings and every section is indexed with its heading path, source
+URL and sequence number. Documents are keyed by their output filename and
+re-indexed only when their content hash changes, so batch runs, the combiner
+and repeated builds keep the index current without rebuilding it.
+"""
+
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import logging
+import argparse
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(message)s',
+    datefmt='%H:%M:%S'
+)
+logger = logging.getLogger(__name__)
+
+HEADING = re.compile(r'^(#{1,6})[ \t]+(.+?)[ \t#]*$')
+FENCE = re.compile(r'^\s*(```|~~~)')
+FILENAME_SEQUENCE = re.compile(r'^(?P<prefix>.+)-(?P<sequence>\d{3})(?:-|\.md$)')
+
+# bm25 column weights: a match in the heading path counts five times a match in the body
+HEADING_WEIGHT = 5.0
+BODY_WEIGHT = 1.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    doc_key TEXT PRIMARY KEY,
+    url TEXT,
+    prefix TEXT,
+    sequence INTEGER,
+    title TEXT,
+    source TEXT,
+    source_mtime REAL,
+    content_hash TEXT NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sections (
+    id INTEGER PRIMARY KEY,
+    doc_key TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    heading TEXT NOT NULL,
+    body TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sections_doc ON sections (doc_key);
+CREATE VIRTUAL TABLE IF NOT EXISTS sections_fts USING fts5(
+    heading, body, content='sections', content_rowid='id', tokenize='porter unicode61'
+);
+CREATE TRIGGER IF NOT EXISTS sections_ai AFTER INSERT ON sections BEGIN
+    INSERT INTO sections_fts (rowid, heading, body) VALUES (new.id, new.heading, new.body);
+END;
+CREATE TRIGGER IF NOT EXISTS sections_ad AFTER DELETE ON sections BEGIN
+    INSERT INTO sections_fts (sections_fts, rowid, heading, body) VALUES ('delete', old.id, old.heading, old.body);
+END;
+"""
+
+
+def split_sections(markdown: str) -> List[Tuple[str, str]]:
+    """Split markdown at ATX headings into (heading path, body) pairs
+
+    The heading path joins the enclosing headings ("Install > Linux"). Text
+    before the first heading gets an empty path; '#' lines inside fenced code
+    blocks are not headings.
+    """
+    sections = []
+    stack: List[Tuple[int, str]] = []
+    body: List[str] = []
+    in_fence = False
+
+    def flush():
+        text = '\n'.join(body).strip()
+        if text or stack:
+            sections.append((' > '.join(title for _, title in stack), text))
+
+    for line in markdown.splitlines():
+        if FENCE.match(line):
+            in_fence = not in_fence
+        match = None if in_fence else HEADING.match(line)
+        if not match:
+            body.append(line)
+            continue
+        flush()
+        body = []
+        level = len(match.group(1))
+        while stack and stack[-1][0] >= level:
+            stack.pop()
+        stack.append((level, match.group(2).strip()))
+    flush()
+    return sections
+
+
+def fts_query(text: str) -> str:
+    """Turn free text into an FTS5 query matching every term (terms quoted, so no syntax errors)"""
+    terms = re.findall(r'\w+', text)
+    return ' '.join(f'"{term}"' for term in terms)
+
+
+class SearchIndex:
+    """Incrementally updated FTS5 index of document sections"""
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        with self._conn:
+            self._conn.executescript(SCHEMA)
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self) -> 'SearchIndex':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def index_document(self, doc_key: str, markdown: str, url: Optional[str] = None,
+                       prefix: Optional[str] = None, sequence: Optional[int] = None,
+                       title: Optional[str] = None, source: Optional[str] = None,
+                       source_mtime: Optional[float] = None) -> bool:
+        """Index one document; returns False when its content is already indexed unchanged"""
+        content_hash = hashlib.sha256(markdown.encode('utf-8')).hexdigest()
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT content_hash, url FROM documents WHERE doc_key = ?",
+                                     (doc_key,)).fetchone()
+            if row and row['content_hash'] == content_hash:
+                # Unchanged text; still record metadata a file-based build could not know
+                self._conn.execute(
+                    "UPDATE documents SET url = COALESCE(?, url), title = COALESCE(?, title), "
+                    "source = COALESCE(?, source), source_mtime = COALESCE(?, source_mtime) WHERE doc_key = ?",
+                    (url, title, source, source_mtime, doc_key))
+                return False
+            self._conn.execute("DELETE FROM sections WHERE doc_key = ?", (doc_key,))
+            self._conn.executemany(
+                "INSERT INTO sections (doc_key, position, heading, body) VALUES (?, ?, ?, ?)",
+                [(doc_key, position, heading, body)
+                 for position, (heading, body) in enumerate(split_sections(markdown))])
+            self._conn.execute(
+                "INSERT INTO documents VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (doc_key) DO UPDATE SET "
+                "url = COALESCE(excluded.url, url), prefix = COALESCE(excluded.prefix, prefix), "
+                "sequence = COALESCE(excluded.sequence, sequence), title = COALESCE(excluded.title, title), "
+                "source = COALESCE(excluded.source, source), source_mtime = excluded.source_mtime, "
+                "content_hash = excluded.content_hash, updated = excluded.updated",
+                (doc_key, url, prefix, sequence, title, source, source_mtime, content_hash, time.time()))
+        return True
+
+    def index_record(self, record: Dict) -> bool:
+        """Index an output sink record under the filename the file layout would give it"""
+        from .sinks import sequence_filename
+        return self.index_document(sequence_filename(record['url'], record['prefix'], record['sequence']),
+                                   record['markdown'], url=record['url'], prefix=record['prefix'],
+                                   sequence=record['sequence'], title=record.get('title'))
+
+    def index_file(self, path: str) -> bool:
+        """Index a markdown file written by the converter, skipping it when its mtime is unchanged"""
+        doc_key = os.path.basename(path)
+        mtime = os.path.getmtime(path)
+        with self._lock:
+            row = self._conn.execute("SELECT source_mtime FROM documents WHERE doc_key = ?", (doc_key,)).fetchone()
+        if row and row['source_mtime'] == mtime:
+            return False
+        match = FILENAME_SEQUENCE.match(doc_key)
+        with open(path, 'r', encoding='utf-8') as f:
+            markdown = f.read()
+        return self.index_document(doc_key, markdown,
+                                   prefix=match.group('prefix') if match else None,
+                                   sequence=int(match.group('sequence')) if match else None,
+                                   source=os.path.abspath(path), source_mtime=mtime)
+
+    def index_directory(self, directory: str, prefix: str = '') -> Dict[str, int]:
+        """Index new and changed .md files in a directory and drop documents whose files are gone"""
+        counts = {'indexed': 0, 'unchanged': 0, 'removed': 0}
+        seen = set()
+        for filename in sorted(os.listdir(directory)):
+            if not filename.startswith(prefix) or not filename.endswith('.md') or filename.endswith('_combined.md'):
+                continue
+            path = os.path.join(directory, filename)
+            seen.add(os.path.abspath(path))
+            counts['indexed' if self.index_file(path) else 'unchanged'] += 1
+
+        directory = os.path.abspath(directory)
+        with self._lock:
+            rows = self._conn.execute("SELECT doc_key, source FROM documents WHERE source IS NOT NULL").fetchall()
+        for row in rows:
+            if (os.path.dirname(row['source']) == directory and os.path.basename(row['source']).startswith(prefix)
+                    and row['source'] not in seen):
+                self.remove_document(row['doc_key'])
+                counts['removed'] += 1
+        return counts
+
+    def index_records(self, records: Iterable[Dict]) -> Dict[str, int]:
+        """Index every record of an output archive (see sinks.iter_records)"""
+        counts = {'indexed': 0, 'unchanged': 0}
+        for record in records:
+            counts['indexed' if self.index_record(record) else 'unchanged'] += 1
+        return counts
+
+    def remove_document(self, doc_key: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM sections WHERE doc_key = ?", (doc_key,))
+            self._conn.execute("DELETE FROM documents WHERE doc_key = ?", (doc_key,))
+
+    def search(self, query: str, limit: int = 10, prefix: Optional[str] = None, raw: bool = False) -> List[Dict]:
+        """Ranked sections matching a query (free text, or FTS5 syntax when raw)"""
+        match = query if raw else fts_query(query)
+        if not match:
+            return []
+        sql = ("SELECT d.doc_key, d.url, d.prefix, d.sequence, d.title, s.position, s.heading, "
+               "snippet(sections_fts, 1, '[', ']', ' … ', 24) AS snippet, "
+               f"bm25(sections_fts, {HEADING_WEIGHT}, {BODY_WEIGHT}) AS score "
+               "FROM sections_fts JOIN sections s ON s.id = sections_fts.rowid "
+               "JOIN documents d ON d.doc_key = s.doc_key WHERE sections_fts MATCH ?")
+        params: list = [match]
+        if prefix:
+            sql += " AND d.prefix = ?"
+            params.append(prefix)
+        sql += " ORDER BY score LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        # bm25 is lower-is-better; report higher-is-better scores
+        return [dict(row, score=-row['score']) for row in rows]
+
+    def section(self, doc_key: str, position: int) -> Optional[str]:
+        """Full text of one indexed section"""
+        with self._lock:
+            row = self._conn.execute("SELECT heading, body FROM sections WHERE doc_key = ? AND position = ?",
+                                     (doc_key, position)).fetchone()
+        return row and '\n\n'.join(filter(None, (row['heading'], row['body'])))
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            documents = self._conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+            sections = self._conn.execute("SELECT COUNT(*) FROM sections").fetchone()[0]
+        return {'documents': documents, 'sections': sections}
+
+    def optimize(self):
+        """Merge the FTS segment b-trees after large builds"""
+        with self._lock, self._conn:
+            self._conn.execute("INSERT INTO sections_fts (sections_fts) VALUES ('optimize')")
+
+
+def main():
+    """Main function to build or query the search index"""
+    parser = argparse.ArgumentParser(description='Full-text index of converted markdown sections')
+    parser.add_argument('--index', default='output/search.db', help='Index database (default: output/search.db)')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build = subparsers.add_parser('build', help='Index new and changed documents')
+    build.add_argument('source', nargs='?', default='output',
+                       help='Directory of .md files or an output archive (*.db, *.jsonl[.gz]) (default: output)')
+    build.add_argument('--prefix', default='', help='Only index files with this prefix')
+
+    query = subparsers.add_parser('query', help='Print the best matching sections')
+    query.add_argument('text', help='Search terms')
+    query.add_argument('--limit', type=int, default=10, help='Sections to return (default: 10)')
+    query.add_argument('--prefix', help='Only search documents with this prefix')
+    query.add_argument('--raw', action='store_true', help='Pass the text through as an FTS5 query')
+    query.add_argument('--full', action='store_true', help='Print whole sections instead of snippets')
+
+    subparsers.add_parser('stats', help='Show document and section counts')
+    args = parser.parse_args()
+
+    with SearchIndex(args.index) as index:
+        if args.command == 'build':
+            start = time.perf_counter()
+            if os.path.isdir(args.source):
+                counts = index.index_directory(args.source, args.prefix)
+            else:
+                from .sinks import iter_records
+                counts = index.index_records(record for record in iter_records(args.source)
+                                             if record['prefix'].startswith(args.prefix))
+            index.optimize()
+            logger.info(f"Indexed {args.source} in {time.perf_counter() - start:.2f}s: {counts}")
+        elif args.command == 'query':
+            start = time.perf_counter()
+            results = index.search(args.text, args.limit, args.prefix, args.raw)
+            elapsed = (time.perf_counter() - start) * 1000
+            for i, result in enumerate(results, 1):
+                print(f"{i}. {result['doc_key']} § {result['heading'] or '(top)'}  [{result['score']:.2f}]")
+                if result['url']:
+                    print(f"   {result['url']}")
+                text = index.section(result['doc_key'], result['position']) if args.full else result['snippet']
+                print(f"   {text}\n")
+            logger.info(f"{len(results)} sections in {elapsed:.1f} ms")
+        else:
+            print(index.stats())
+
+
+if __name__ == "__main__":
+    main()
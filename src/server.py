@@ -0,0 +1,355 @@
+"""
+Conversion Server
+Long-lived daemon that keeps warm ContentProcessor workers (browser, pooled
+HTTP connections, OpenAI client, boilerplate indexes) and accepts conversion
+jobs over local HTTP or a Unix socket, so on-demand conversions skip the
+import, ell.init and Chrome start-up cost of a CLI run.
+
+Endpoints:
+    POST /convert      {"url": ..., "async": false, "timeout": 300}
+    GET  /jobs/<id>    status and result of a job
+    GET  /health       worker and queue counts
+    GET  /metrics      Prometheus text format
+"""
+
+import os
+import json
+import math
+import time
+import uuid
+import queue
+import signal
+import logging
+import argparse
+import threading
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from socketserver import ThreadingUnixStreamServer
+from typing import Callable, Dict, List, Optional
+from .metrics import metrics
+from .deadlines import DeadlineExceeded
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(message)s',
+    datefmt='%H:%M:%S'
+)
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ConversionJob:
+    """One requested conversion and its outcome"""
+    id: str
+    url: str
+    status: str = 'queued'
+    result: Optional[Dict] = None
+    error: Optional[str] = None
+    created: float = field(default_factory=time.time)
+    finished: Optional[float] = None
+    done: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    def to_dict(self, include_result: bool = True) -> Dict:
+        data = {'id': self.id, 'url': self.url, 'status': self.status, 'error': self.error,
+                'created': self.created, 'finished': self.finished}
+        if include_result and self.result is not None:
+            data['result'] = self.result
+        return data
+
+
+class ConversionService:
+    """Bounded job queue served by worker threads that each own a warm ContentProcessor"""
+
+    def __init__(self, workers: int = 2, queue_size: int = 32, processor_factory: Optional[Callable] = None,
+                 job_ttl: float = 3600, warm_browser: bool = True, url_timeout: Optional[float] = None):
+        self.workers = workers
+        self.url_timeout = url_timeout
+        self.jobs: Dict[str, ConversionJob] = {}
+        self.job_ttl = job_ttl
+        self.warm_browser = warm_browser
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._running = 0
+        self._draining = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._ready = threading.Semaphore(0)
+        self._startup_errors: List[Exception] = []
+        if processor_factory is None:
+            from .convert import ContentProcessor
+            processor_factory = ContentProcessor
+        self.processor_factory = processor_factory
+
+    def start(self):
+        """Start the workers and wait until each has built its processor
+
+        Raises RuntimeError, after stopping the workers that did start, when a
+        worker fails to build its processor.
+        """
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"convert-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        for _ in range(self.workers):
+            self._ready.acquire()
+        if self._startup_errors:
+            self.shutdown()
+            error = self._startup_errors[0]
+            raise RuntimeError(f"{len(self._startup_errors)} of {self.workers} conversion workers "
+                               f"failed to start: {error}") from error
+        logger.info(f"{self.workers} conversion workers ready")
+
+    def submit(self, url: str) -> ConversionJob:
+        """Queue a conversion; raises queue.Full when the queue is at capacity or draining"""
+        if self._draining.is_set():
+            raise queue.Full("Server is shutting down")
+        job = ConversionJob(id=uuid.uuid4().hex, url=url)
+        with self._lock:
+            self._prune()
+            self.jobs[job.id] = job
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            with self._lock:
+                del self.jobs[job.id]
+            metrics.inc('server_rejected')
+            raise
+        return job
+
+    def get(self, job_id: str) -> Optional[ConversionJob]:
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def health(self) -> Dict:
+        with self._lock:
+            running = self._running
+        return {
+            'status': 'draining' if self._draining.is_set() else 'ok',
+            'workers': self.workers,
+            'running': running,
+            'queued': self._queue.qsize(),
+            'queue_capacity': self._queue.maxsize,
+            'jobs_tracked': len(self.jobs),
+        }
+
+    def _prune(self):
+        """Forget finished jobs past their TTL (caller holds the lock)"""
+        cutoff = time.time() - self.job_ttl
+        for job_id in [job_id for job_id, job in self.jobs.items() if job.finished and job.finished < cutoff]:
+            del self.jobs[job_id]
+
+    def _worker(self):
+        try:
+            processor = self.processor_factory()
+            if self.url_timeout is not None:
+                processor.url_timeout = self.url_timeout
+            if self.warm_browser:
+                try:
+                    processor.visual_scraper._ensure_driver()
+                except Exception as e:
+                    logger.warning(f"Could not pre-start the browser, it will start on first use: {e}")
+        except Exception as e:
+            logger.error(f"Conversion worker failed to start: {e}")
+            self._startup_errors.append(e)
+            return
+        finally:
+            # start() waits for every worker, including one that failed
+            self._ready.release()
+
+        try:
+            while True:
+                job = self._queue.get()
+                if job is None:
+                    return
+                self._run(processor, job)
+        finally:
+            processor.visual_scraper._quit_driver()
+
+    def _run(self, processor, job: ConversionJob):
+        with self._lock:
+            self._running += 1
+        job.status = 'running'
+        try:
+            logger.info(f"Converting {job.url} (job {job.id})")
+            result = processor.convert(job.url)
+            job.result = {key: result.get(key) for key in ('url', 'title', 'strategy', 'markdown', 'timed_out')}
+            job.status = 'done'
+        except DeadlineExceeded as e:
+            logger.error(f"Job {job.id} timed out for {job.url}: {e}")
+            job.error = str(e)
+            job.status = 'timeout'
+        except Exception as e:
+            logger.error(f"Job {job.id} failed for {job.url}: {e}")
+            job.error = str(e)
+            job.status = 'failed'
+        finally:
+            job.finished = time.time()
+            with self._lock:
+                self._running -= 1
+            job.done.set()
+
+    def shutdown(self, grace_period: float = 300):
+        """Stop taking jobs, cancel queued ones, let running conversions finish and close browsers"""
+        self._draining.set()
+        while True:
+            try:
+                job = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if job is not None:
+                job.status, job.error, job.finished = 'cancelled', 'Server shut down', time.time()
+                job.done.set()
+        for _ in self._threads:
+            self._queue.put(None)
+        deadline = time.monotonic() + grace_period
+        for thread in self._threads:
+            thread.join(max(0, deadline - time.monotonic()))
+        logger.info("Conversion workers stopped")
+
+
+def make_handler(service: ConversionService, default_timeout: float = 300):
+    """Build the request handler class bound to a service"""
+
+    class ConversionHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def address_string(self):
+            # Unix socket peers have no (host, port) address
+            return self.client_address[0] if isinstance(self.client_address, tuple) else 'unix'
+
+        def _send_json(self, status: int, payload: Dict):
+            body = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            path = self.path.split('?', 1)[0].rstrip('/')
+            if path == '/health':
+                self._send_json(200, service.health())
+            elif path == '/metrics':
+                body = metrics.render_prometheus().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            elif path.startswith('/jobs/'):
+                job = service.get(path[len('/jobs/'):])
+                if job is None:
+                    self._send_json(404, {'error': 'Unknown job'})
+                else:
+                    self._send_json(200, job.to_dict())
+            else:
+                self._send_json(404, {'error': 'Not found'})
+
+        def do_POST(self):
+            if self.path.split('?', 1)[0].rstrip('/') != '/convert':
+                self._send_json(404, {'error': 'Not found'})
+                return
+            try:
+                length = int(self.headers.get('Content-Length') or 0)
+                request = json.loads(self.rfile.read(length) or b'{}')
+                url = request['url']
+            except (ValueError, KeyError, TypeError):
+                self._send_json(400, {'error': 'Expected a JSON body with a "url" field'})
+                return
+            try:
+                timeout = float(request.get('timeout', default_timeout))
+                if not math.isfinite(timeout) or timeout < 0:
+                    raise ValueError(timeout)
+            except (ValueError, TypeError):
+                self._send_json(400, {'error': 'Expected "timeout" to be a non-negative number of seconds'})
+                return
+
+            try:
+                job = service.submit(url)
+            except queue.Full as e:
+                self._send_json(503, {'error': str(e) or 'Conversion queue is full'})
+                return
+
+            if request.get('async'):
+                self._send_json(202, {'job_id': job.id, 'status_url': f"/jobs/{job.id}"})
+                return
+            # Synchronous callers wait; if the job outlives the timeout they get its id instead
+            if not job.done.wait(timeout):
+                self._send_json(202, {'job_id': job.id, 'status_url': f"/jobs/{job.id}", 'status': job.status})
+            elif job.status == 'done':
+                self._send_json(200, job.result)
+            elif job.status == 'timeout':
+                self._send_json(504, job.to_dict(include_result=False))
+            else:
+                self._send_json(500, job.to_dict(include_result=False))
+
+        def log_message(self, format, *args):
+            logger.debug(f"{self.address_string()} - {format % args}")
+
+    return ConversionHandler
+
+
+class UnixHTTPServer(ThreadingUnixStreamServer):
+    """HTTP over a Unix domain socket"""
+    daemon_threads = True
+
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+        super().server_bind()
+        os.chmod(self.server_address, 0o660)
+
+
+def serve(service: ConversionService, host: str = '127.0.0.1', port: int = 8765,
+          socket_path: Optional[str] = None, grace_period: float = 300):
+    """Run the API until SIGTERM or SIGINT, then shut down gracefully"""
+    handler = make_handler(service)
+    if socket_path:
+        server = UnixHTTPServer(socket_path, handler)
+        address = f"unix:{socket_path}"
+    else:
+        server = ThreadingHTTPServer((host, port), handler)
+        address = f"http://{host}:{server.server_port}"
+
+    def stop(signum, frame):
+        logger.info(f"Received signal {signum}, shutting down")
+        # shutdown() blocks until serve_forever returns, so it cannot run on the serving thread
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    service.start()
+    logger.info(f"Conversion server listening on {address}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        service.shutdown(grace_period)
+        if socket_path and os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+
+def main():
+    """Main function to run the conversion server"""
+    parser = argparse.ArgumentParser(description='Serve on-demand conversions from warm workers')
+    parser.add_argument('--host', default='127.0.0.1', help='Address to listen on (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8765, help='Port to listen on (default: 8765)')
+    parser.add_argument('--socket', help='Listen on this Unix socket instead of TCP')
+    parser.add_argument('--workers', type=int, default=2, help='Concurrent conversions, one browser each (default: 2)')
+    parser.add_argument('--queue-size', type=int, default=32,
+                        help='Jobs waiting beyond the running ones before requests get 503 (default: 32)')
+    parser.add_argument('--grace-period', type=float, default=300,
+                        help='Seconds running conversions get to finish on shutdown (default: 300)')
+    parser.add_argument('--no-warm-browser', action='store_true', help='Start browsers on first use instead')
+    parser.add_argument('--url-timeout', type=float,
+                        help='Seconds one conversion may take before it is cut off (partial output is returned)')
+    args = parser.parse_args()
+
+    service = ConversionService(workers=args.workers, queue_size=args.queue_size,
+                                warm_browser=not args.no_warm_browser, url_timeout=args.url_timeout)
+    serve(service, args.host, args.port, args.socket, args.grace_period)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+"""
+Output Sinks
+Where converted pages go. FileSink keeps the one-markdown-file-per-URL
+layout; SQLiteSink and JSONLSink append every record (URL, sequence, title,
+markdown, strategy, hashes, stage timings and optionally the screenshot) to a
+single database or (gzip-compressed) JSONL archive in batched writes. The
+exporter turns an archive back into the per-file layout.
+"""
+
+import os
+import re
+import gzip
+import json
+import time
+import base64
+import sqlite3
+import hashlib
+import logging
+import argparse
+import threading
+from abc import ABC, abstractmethod
+from typing import Dict, Iterator, List, Optional
+from urllib.parse import urlparse
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def sequence_filename(url: str, prefix: str, sequence: int) -> str:
+    """Markdown filename for a page: <prefix>-<sequence>-<last path segment>.md"""
+    # Extract the last part of the path
+    path = urlparse(url).path.strip('/')
+    last_segment = path.split('/')[-1] if path else ''
+
+    # Clean up the segment
+    clean_segment = re.sub(r'[^\w\s-]', '', last_segment.lower())
+    clean_segment = re.sub(r'[-\s]+', '-', clean_segment)
+
+    # Format with two-digit sequence number
+    filename = f"{prefix}-{sequence:03d}-{clean_segment}"
+
+    # Truncate if too long (leaving room for extension)
+    if len(filename) > 46:  # 50 - 4 (.md)
+        filename = filename[:46]
+
+    return f"{filename}.md"
+
+
+def build_record(result: Dict, sequence: int, prefix: str) -> Dict:
+    """Turn a ContentProcessor.convert result into a sink record"""
+    markdown = result['markdown']
+    return {
+        'url': result['url'],
+        'sequence': sequence,
+        'prefix': prefix,
+        'title': result.get('title'),
+        'markdown': markdown,
+        'strategy': result.get('strategy'),
+        'markdown_sha256': hashlib.sha256(markdown.encode('utf-8')).hexdigest(),
+        'chunk_fingerprints': result.get('chunk_fingerprints') or [],
+        'timings': result.get('timings') or {},
+        'timed_out': bool(result.get('timed_out')),
+        'screenshot': result.get('screenshot'),
+        'created': time.time(),
+    }
+
+
+class OutputSink(ABC):
+    """Destination for converted pages; implementations are thread-safe"""
+
+    # Whether records keep the screenshot, so the per-capture PNG files can be skipped
+    stores_screenshots = False
+
+    @abstractmethod
+    def write(self, record: Dict) -> str:
+        """Store one record and return where it went"""
+
+    def flush(self):
+        """Persist buffered records"""
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self) -> 'OutputSink':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class FileSink(OutputSink):
+    """One markdown file per page (the original layout)"""
+
+    def __init__(self, output_dir: str = 'output'):
+        self.output_dir = output_dir
+        os.makedirs(output_dir, exist_ok=True)
+
+    def write(self, record: Dict) -> str:
+        output_file = os.path.join(self.output_dir, sequence_filename(record['url'], record['prefix'], record['sequence']))
+        with open(output_file, 'w', encoding='utf-8') as f:
+            f.write(record['markdown'])
+        return output_file
+
+
+class SQLiteSink(OutputSink):
+    """All records in one SQLite database, inserted in batched transactions"""
+
+    def __init__(self, path: str, batch_size: int = 50, store_screenshots: bool = False):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.path = path
+        self.batch_size = batch_size
+        self.stores_screenshots = store_screenshots
+        self._buffer: List[tuple] = []
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        with self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS pages (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    url TEXT NOT NULL,
+                    sequence INTEGER,
+                    prefix TEXT,
+                    title TEXT,
+                    markdown TEXT NOT NULL,
+                    strategy TEXT,
+                    markdown_sha256 TEXT,
+                    chunk_fingerprints TEXT,
+                    timings TEXT,
+                    screenshot BLOB,
+                    created REAL,
+                    timed_out INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS pages_url ON pages (url)")
+            # Archives written before partial (timed-out) records existed lack the column
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(pages)")}
+            if 'timed_out' not in columns:
+                self._conn.execute("ALTER TABLE pages ADD COLUMN timed_out INTEGER NOT NULL DEFAULT 0")
+
+    def write(self, record: Dict) -> str:
+        row = (record['url'], record['sequence'], record['prefix'], record['title'], record['markdown'],
+               record['strategy'], record['markdown_sha256'], json.dumps(record['chunk_fingerprints']),
+               json.dumps(record['timings']), record['screenshot'] if self.stores_screenshots else None,
+               record['created'], int(record['timed_out']))
+        with self._lock:
+            self._buffer.append(row)
+            if len(self._buffer) >= self.batch_size:
+                self._flush_locked()
+        return f"{self.path}#{record['prefix']}-{record['sequence']:03d}"
+
+    def _flush_locked(self):
+        if not self._buffer:
+            return
+        with self._conn:
+            self._conn.executemany(
+                "INSERT INTO pages (url, sequence, prefix, title, markdown, strategy, markdown_sha256, "
+                "chunk_fingerprints, timings, screenshot, created, timed_out) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                self._buffer)
+        self._buffer = []
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def close(self):
+        self.flush()
+        self._conn.close()
+
+
+class JSONLSink(OutputSink):
+    """All records appended to one JSONL file, gzip-compressed when the path ends in .gz"""
+
+    def __init__(self, path: str, batch_size: int = 50, store_screenshots: bool = False):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.path = path
+        self.batch_size = batch_size
+        self.stores_screenshots = store_screenshots
+        self._buffer: List[str] = []
+        self._lock = threading.Lock()
+
+    def write(self, record: Dict) -> str:
+        record = dict(record)
+        screenshot = record.pop('screenshot', None)
+        if self.stores_screenshots and screenshot:
+            record['screenshot_png_base64'] = base64.b64encode(screenshot).decode('ascii')
+        with self._lock:
+            self._buffer.append(json.dumps(record, ensure_ascii=False) + '\n')
+            if len(self._buffer) >= self.batch_size:
+                self._flush_locked()
+        return f"{self.path}#{record['prefix']}-{record['sequence']:03d}"
+
+    def _flush_locked(self):
+        if not self._buffer:
+            return
+        data = ''.join(self._buffer)
+        # Each flush appends one gzip member; concatenated members read back as one stream
+        opener = gzip.open if self.path.endswith('.gz') else open
+        with opener(self.path, 'at', encoding='utf-8') as f:
+            f.write(data)
+        self._buffer = []
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+
+def open_sink(spec: Optional[str], output_dir: str = 'output', batch_size: int = 50,
+              store_screenshots: bool = False) -> OutputSink:
+    """Pick a sink from a path: *.db/*.sqlite -> SQLite, *.jsonl[.gz] -> JSONL, anything else -> directory of files
+
+    store_screenshots only applies to archives; the file layout keeps its PNGs under screenshots/.
+    """
+    if spec and spec.endswith(('.db', '.sqlite', '.sqlite3')):
+        return SQLiteSink(spec, batch_size, store_screenshots)
+    if spec and spec.endswith(('.jsonl', '.jsonl.gz')):
+        return JSONLSink(spec, batch_size, store_screenshots)
+    return FileSink(spec or output_dir)
+
+
+def iter_records(path: str) -> Iterator[Dict]:
+    """Read the records of a SQLite or JSONL archive back in write order"""
+    if path.endswith(('.db', '.sqlite', '.sqlite3')):
+        conn = sqlite3.connect(path)
+        conn.row_factory = sqlite3.Row
+        try:
+            for row in conn.execute("SELECT * FROM pages ORDER BY id"):
+                record = dict(row)
+                record['chunk_fingerprints'] = json.loads(record['chunk_fingerprints'] or '[]')
+                record['timings'] = json.loads(record['timings'] or '{}')
+                record['timed_out'] = bool(record['timed_out'])
+                yield record
+        finally:
+            conn.close()
+        return
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                encoded = record.pop('screenshot_png_base64', None)
+                record['screenshot'] = base64.b64decode(encoded) if encoded else None
+                yield record
+
+
+def export_archive(path: str, output_dir: str, screenshots: bool = False, latest_only: bool = True) -> List[str]:
+    """Write the pages of an archive back out as markdown files (and PNG screenshots)"""
+    os.makedirs(output_dir, exist_ok=True)
+    written = {}
+    for record in iter_records(path):
+        filename = os.path.join(output_dir, sequence_filename(record['url'], record['prefix'], record['sequence']))
+        if filename in written and not latest_only:
+            continue
+        with open(filename, 'w', encoding='utf-8') as f:
+            f.write(record['markdown'])
+        if screenshots and record.get('screenshot'):
+            with open(f"{os.path.splitext(filename)[0]}.png", 'wb') as f:
+                f.write(record['screenshot'])
+        written[filename] = True
+    logger.info(f"Exported {len(written)} pages from {path} to {output_dir}")
+    return list(written)
+
+
+def main():
+    """Main function to export an archive back to files"""
+    parser = argparse.ArgumentParser(description='Export a SQLite or JSONL output archive to markdown files')
+    parser.add_argument('archive', help='Archive written by --output (*.db, *.jsonl or *.jsonl.gz)')
+    parser.add_argument('--output-dir', default='output', help='Directory for the exported files (default: output)')
+    parser.add_argument('--screenshots', action='store_true', help='Also export stored screenshots as PNG files')
+    parser.add_argument('--first', action='store_true',
+                        help='Keep the first record of a page that was archived more than once (default: latest)')
+    args = parser.parse_args()
+
+    export_archive(args.archive, args.output_dir, args.screenshots, latest_only=not args.first)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+"""
+Large Page Streaming
+Parses HTML incrementally as it downloads and emits minified chunks at
+block-level boundaries, so peak memory is bounded by the chunk size rather
+than the page size. Content statistics equivalent to HTMLAnalyzer's are
+collected on the way through.
+"""
+
+import re
+import html
+import logging
+from collections import deque
+from html.parser import HTMLParser
+from typing import Deque, Dict, Iterable, Iterator, List, Optional
+from .minify import BLOCK_TAGS, KEPT_ATTRIBUTES, REMOVED_TAGS, UNWRAPPED_TAGS, HIDDEN_STYLE, LANGUAGE_CLASS
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'track', 'wbr'}
+SPLIT_BEFORE = {'h1', 'h2', 'h3'}
+PARAMETER_TEXT = re.compile(r'Parameters|Returns|Examples')
+
+
+class StreamingChunker(HTMLParser):
+    """Incremental HTML parser that minifies on the fly and cuts chunks between blocks"""
+
+    def __init__(self, chunk_chars: int = 100000, max_links: int = 10000):
+        super().__init__(convert_charrefs=True)
+        self.chunk_chars = chunk_chars
+        self.max_links = max_links
+        self.chunks: Deque[str] = deque()
+        self._buffer: List[str] = []
+        self._buffer_len = 0
+        self._stack: List[str] = []
+        self._skip_depth: Optional[int] = None
+        self._in_title = False
+        self._main_depth: Optional[int] = None
+        self.title_parts: List[str] = []
+        self.links: List[str] = []
+        self.stats = {
+            'total_length': 0,
+            'text_length': 0,
+            'tag_distribution': {},
+            'has_main_content': False,
+            'code_blocks': 0,
+            'parameter_sections': 0,
+            'has_method_signature': False,
+            'jsx_detected': False,
+        }
+
+    @property
+    def title(self) -> Optional[str]:
+        title = ''.join(self.title_parts).strip()
+        return title or None
+
+    def feed(self, data: str):
+        self.stats['total_length'] += len(data)
+        if not self.stats['jsx_detected'] and ('_jsx' in data or 'react' in data.lower()):
+            self.stats['jsx_detected'] = True
+        super().feed(data)
+
+    def _write(self, markup: str):
+        self._buffer.append(markup)
+        self._buffer_len += len(markup)
+
+    def _cut(self, threshold: Optional[int] = None):
+        threshold = self.chunk_chars if threshold is None else threshold
+        if self._buffer and self._buffer_len >= threshold:
+            self.chunks.append(''.join(self._buffer).strip())
+            self._buffer = []
+            self._buffer_len = 0
+
+    def _is_hidden(self, attrs: Dict[str, Optional[str]]) -> bool:
+        return ('hidden' in attrs or attrs.get('aria-hidden') == 'true'
+                or bool(HIDDEN_STYLE.search(attrs.get('style') or '')))
+
+    def _render_start(self, tag: str, attrs: Dict[str, Optional[str]]) -> str:
+        kept = KEPT_ATTRIBUTES.get(tag, set())
+        parts = [tag]
+        for name, value in attrs.items():
+            if name not in kept or value is None:
+                continue
+            if name == 'class':
+                value = next((c for c in value.split() if LANGUAGE_CLASS.match(c)), None)
+                if not value:
+                    continue
+            if tag == 'img' and name == 'src' and value.startswith('data:'):
+                continue
+            parts.append(f'{name}="{html.escape(value)}"')
+        return '<' + ' '.join(parts) + '>'
+
+    def handle_starttag(self, tag, attr_list):
+        attrs = dict(attr_list)
+        distribution = self.stats['tag_distribution']
+        distribution[tag] = distribution.get(tag, 0) + 1
+        in_main = self._main_depth is not None
+        if in_main and tag == 'pre':
+            self.stats['code_blocks'] += 1
+        if in_main and tag == 'h1':
+            self.stats['has_method_signature'] = True
+        if (tag == 'a' and attrs.get('href') and len(self.links) < self.max_links
+                and 'nofollow' not in (attrs.get('rel') or '').split()):
+            self.links.append(attrs['href'])
+        if tag == 'title':
+            self._in_title = True
+
+        if tag in VOID_TAGS:
+            if self._skip_depth is None and tag in ('img', 'br', 'hr'):
+                self._write(self._render_start(tag, attrs))
+            return
+
+        self._stack.append(tag)
+        if not in_main and (tag == 'main' or (tag == 'div' and 'markdown' in (attrs.get('class') or '').split())):
+            self.stats['has_main_content'] = True
+            self._main_depth = len(self._stack)
+        if self._skip_depth is not None:
+            return
+        if tag in REMOVED_TAGS or tag in ('head', 'title') or self._is_hidden(attrs):
+            self._skip_depth = len(self._stack)
+            return
+        if tag in SPLIT_BEFORE:
+            # Prefer starting a new chunk at a heading once the current one is reasonably full
+            self._cut(self.chunk_chars // 2)
+        if tag in UNWRAPPED_TAGS:
+            return
+        if tag in BLOCK_TAGS:
+            self._write('\n')
+        self._write(self._render_start(tag, attrs))
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag == 'title':
+            self._in_title = False
+        if tag not in self._stack:
+            return
+        # Implicitly close anything left open inside this element
+        while self._stack:
+            open_tag = self._stack.pop()
+            if self._skip_depth is None:
+                if open_tag not in UNWRAPPED_TAGS:
+                    self._write(f'</{open_tag}>')
+            elif len(self._stack) < self._skip_depth:
+                self._skip_depth = None
+            if self._main_depth is not None and len(self._stack) < self._main_depth:
+                self._main_depth = None
+            if open_tag == tag:
+                break
+        if tag in BLOCK_TAGS and self._skip_depth is None:
+            self._cut()
+
+    def handle_data(self, data):
+        if self._in_title:
+            self.title_parts.append(data)
+        stripped = data.strip()
+        if self._skip_depth is not None:
+            return
+        if stripped:
+            self.stats['text_length'] += len(stripped)
+            if self._main_depth is not None:
+                self.stats['parameter_sections'] += len(PARAMETER_TEXT.findall(data))
+        in_pre = 'pre' in self._stack
+        self._write(html.escape(data if in_pre else re.sub(r'\s+', ' ', data), quote=False))
+        if self._buffer_len >= self.chunk_chars * 2:
+            # A single enormous block; cut anyway so memory stays bounded
+            self._cut(0)
+
+    def close(self):
+        super().close()
+        self._cut(0)
+
+    def drain(self) -> Iterator[str]:
+        """Yield and forget the chunks completed so far"""
+        while self.chunks:
+            chunk = self.chunks.popleft()
+            if chunk:
+                yield chunk
+
+
+def stream_chunks(text_chunks: Iterable[str], chunker: StreamingChunker) -> Iterator[str]:
+    """Feed decoded text into the chunker, yielding minified HTML chunks as soon as they complete"""
+    for text in text_chunks:
+        chunker.feed(text)
+        yield from chunker.drain()
+    chunker.close()
+    yield from chunker.drain()
+
+
+def build_stream_analysis(url: str, chunker: StreamingChunker, analyzer) -> Dict:
+    """Build an HTMLAnalyzer-compatible analysis from the statistics gathered while streaming"""
+    stats = chunker.stats
+    distribution = dict(sorted(stats['tag_distribution'].items(), key=lambda x: x[1], reverse=True))
+    estimated_tokens = stats['text_length'] // 4
+    analysis = {
+        'url': url,
+        'stats': {
+            'total_length': stats['total_length'],
+            'text_length': stats['text_length'],
+            'text_ratio': stats['text_length'] / stats['total_length'] if stats['total_length'] else 0,
+            'tag_count': sum(distribution.values()),
+            'script_count': distribution.get('script', 0),
+            'style_count': distribution.get('style', 0),
+            'heading_count': sum(distribution.get(f'h{i}', 0) for i in range(1, 7)),
+        },
+        'tag_distribution': distribution,
+        'content_quality': {
+            'has_main_content': stats['has_main_content'],
+            'is_api_doc': stats['parameter_sections'] > 0,
+            'code_blocks': stats['code_blocks'],
+            'parameter_sections': stats['parameter_sections'],
+            'has_method_signature': stats['has_method_signature'],
+            'jsx_detected': stats['jsx_detected'],
+            'framework_hints': 'React' if stats['jsx_detected'] else 'Unknown',
+        },
+        'token_estimate': {
+            'estimated_total_tokens': estimated_tokens,
+            'estimated_chunks_needed': (estimated_tokens // 2000) + 1,
+        },
+        'recommendations': [],
+        'processing_strategy': None,
+    }
+    analyzer._generate_recommendations(analysis)
+    analysis['processing_strategy'] = analyzer.determine_processing_strategy(analysis)
+    analysis['processing_strategy']['large_page_mode'] = True
+    # A viewport screenshot cannot cover a page this size, so stay on the HTML path
+    analysis['processing_strategy']['use_ocr'] = False
+    return analysis
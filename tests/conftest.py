@@ -0,0 +1,77 @@
+import io
+import os
+import functools
+import tempfile
+import threading
+import http.server
+
+import pytest
+
+# convert.py builds its OpenAI client at import time; tests never call the API
+os.environ.setdefault('OPENAI_API_KEY', 'test')
+# ...and initialises its ell store, which would otherwise create ./logs in the checkout
+os.environ.setdefault('ELL_STORE', tempfile.mkdtemp(prefix='ell-store-'))
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+class FixtureHandler(http.server.SimpleHTTPRequestHandler):
+    """Serves a fixture directory; {base} in XML files becomes the server's own URL"""
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_head(self):
+        path = self.translate_path(self.path)
+        if not path.endswith('.xml') or not os.path.isfile(path):
+            return super().send_head()
+        with open(path, 'rb') as f:
+            body = f.read().replace(b'{base}', self.server.base_url.encode('ascii'))
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/xml')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        return io.BytesIO(body)
+
+
+@pytest.fixture
+def serve_directory():
+    """Start a local HTTP server for a directory; returns its base URL"""
+    servers = []
+
+    def start(directory: str) -> str:
+        handler = functools.partial(FixtureHandler, directory=directory)
+        server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        server.base_url = f"http://127.0.0.1:{server.server_port}"
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server.base_url
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def serve_handler():
+    """Start a local HTTP server for a BaseHTTPRequestHandler subclass; returns its base URL"""
+    servers = []
+
+    def start(handler) -> str:
+        server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_port}"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def static_site(serve_directory) -> str:
+    """Base URL of the static docs site fixture (tests/fixtures/site)"""
+    return serve_directory(os.path.join(FIXTURES, 'site'))
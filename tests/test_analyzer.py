@@ -0,0 +1,44 @@
+import glob
+import json
+import sys
+
+from src import analyzer
+from src.analyzer import TriageSummary, analyze_many, run_bulk
+
+PAGES = ['/', '/docs/intro.html', '/docs/guide.html', '/docs/extra.html', '/docs/deep/page.html']
+
+
+def test_run_bulk_writes_a_record_per_url_and_a_summary(static_site, tmp_path):
+    urls = [static_site + path for path in PAGES] + [static_site + '/docs/missing.html', static_site + '/robots.txt']
+    output = tmp_path / 'triage.jsonl'
+    summary = run_bulk(iter(urls), str(output), workers=2, fetch_workers=4)
+
+    records = {record['url']: record for record in map(json.loads, output.read_text(encoding='utf-8').splitlines())}
+    assert set(records) == set(urls)
+    assert records[static_site + '/docs/intro.html']['stats']['total_length'] > 0
+    assert '404' in records[static_site + '/docs/missing.html']['error']
+    assert records[static_site + '/robots.txt']['error'].startswith('Not HTML')
+
+    assert (summary['pages'], summary['analyzed'], summary['failed'], summary['too_large']) == (7, 5, 2, 0)
+    assert sum(summary['strategies'].values()) == 5
+    assert summary['tokens']['estimated_prompt_tokens'] > 0
+    assert summary['mean_prompt_tokens'] == summary['tokens']['estimated_minified_prompt_tokens'] // 5
+
+
+def test_oversized_pages_are_counted_as_too_large(static_site):
+    summary = TriageSummary()
+    for record in analyze_many([static_site + path for path in PAGES], workers=1, max_body_size=64):
+        summary.add(record)
+    assert summary.as_dict()['too_large'] == len(PAGES)
+
+
+def test_bulk_mode_honours_the_profiling_flags(static_site, tmp_path, monkeypatch):
+    profile_dir = tmp_path / 'profiles'
+    monkeypatch.setattr(sys, 'argv', ['analyzer', static_site + PAGES[0], static_site + PAGES[1],
+                                      '--output', str(tmp_path / 'triage.jsonl'), '--workers', '1',
+                                      '--profile', '--trace-memory', '--profile-dir', str(profile_dir)])
+    analyzer.main()
+    assert len((tmp_path / 'triage.jsonl').read_text(encoding='utf-8').splitlines()) == 2
+    assert json.loads((tmp_path / 'triage.jsonl.summary.json').read_text())['analyzed'] == 2
+    assert glob.glob(str(profile_dir / 'bulk-*.pstats'))
+    assert glob.glob(str(profile_dir / 'bulk-*.memory.txt'))
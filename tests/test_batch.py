@@ -0,0 +1,104 @@
+import json
+
+from src.batch import BatchBackend, BatchRun, batch_request
+from src.benchmark import FakeVisualScraper, FixtureServer, offline_pipeline
+from src.sinks import JSONLSink, iter_records, sequence_filename
+
+
+class FakeBackend(BatchBackend):
+    """Ends every batch with the given statuses in turn, then completes it"""
+
+    def __init__(self, statuses=()):
+        self.statuses = list(statuses)
+        self.submits = 0
+
+    def submit(self, input_path: str) -> str:
+        self.submits += 1
+        self.input_path = input_path
+        return f"batch-{self.submits}"
+
+    def status(self, batch_id: str) -> str:
+        return self.statuses[self.submits - 1] if self.submits <= len(self.statuses) else 'completed'
+
+    def download(self, batch_id: str, output_path: str):
+        with open(self.input_path, encoding='utf-8') as f, open(output_path, 'w', encoding='utf-8') as out:
+            for line in f:
+                custom_id = json.loads(line)['custom_id']
+                body = {'choices': [{'message': {'content': f"result of {custom_id}"}}]}
+                out.write(json.dumps({'custom_id': custom_id, 'response': {'status_code': 200, 'body': body}}) + '\n')
+
+
+def draft_run(tmp_path, backend, **kwargs) -> BatchRun:
+    run = BatchRun(str(tmp_path), backend, poll_interval=0, **kwargs)
+    run._write_requests('draft', (batch_request(f"{i}-draft-0", 'system', f"chunk {i}") for i in range(3)))
+    return run
+
+
+def test_failed_batch_is_resubmitted(tmp_path):
+    backend = FakeBackend(['failed', 'expired'])
+    results = draft_run(tmp_path, backend)._run_batches('draft')
+    assert backend.submits == 3
+    assert results['2-draft-0'] == ('result of 2-draft-0', None)
+
+
+def test_batch_that_keeps_failing_is_abandoned(tmp_path, monkeypatch):
+    sleeps = []
+    monkeypatch.setattr('src.batch.time.sleep', sleeps.append)
+    backend = FakeBackend(['failed'] * 100)
+    run = draft_run(tmp_path, backend, max_resubmits=3)
+    # Its requests are missing from the results, so the pipeline runs them directly
+    assert run._run_batches('draft') == {}
+    assert backend.submits == 4
+    # Each resubmission waits out the poll interval first
+    assert len(sleeps) == 3
+    assert run.state['batches']['draft'][0]['status'] == 'abandoned'
+    # A resumed run does not submit it again
+    resumed = BatchRun(str(tmp_path), backend, poll_interval=0)
+    assert resumed._run_batches('draft') == {}
+    assert backend.submits == 4
+
+
+def test_page_updates_are_journaled_until_the_state_is_saved(tmp_path):
+    run = BatchRun(str(tmp_path), FakeBackend())
+    run._save_state()
+    for number in range(1, 4):
+        run._set_page(number, 'prepared')
+    run._set_page(4, 'complete', 'output/doc-004.md')
+
+    # An interrupted run recovers the updates from the journal
+    resumed = BatchRun(str(tmp_path), FakeBackend())
+    assert resumed.state['pages'] == {'1': 'prepared', '2': 'prepared', '3': 'prepared', '4': 'complete'}
+    assert resumed.state['outputs'] == ['output/doc-004.md']
+
+    resumed._save_state()
+    assert not (tmp_path / 'pages.journal.jsonl').exists()
+    assert BatchRun(str(tmp_path), FakeBackend()).state == resumed.state
+
+
+def test_finished_pages_go_through_the_sink_and_search_index(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    from src.convert import ContentProcessor
+    from src.search_index import SearchIndex
+    corpus = {f"/docs/{name}.html": (f"<html><head><title>{name.title()}</title></head><body><main>"
+                                     f"<h1>{name.title()}</h1><p>{'Setup and usage notes for the client. ' * 20}</p>"
+                                     f"</main></body></html>") for name in ('install', 'usage')}
+    with FixtureServer(corpus) as server, offline_pipeline():
+        config = tmp_path / 'urls.txt'
+        config.write_text(''.join(server.url(path) + '\n' for path in corpus), encoding='utf-8')
+        processor = ContentProcessor()
+        processor.visual_scraper = FakeVisualScraper(str(tmp_path), size=(320, 480))
+        processor.search_index = SearchIndex(str(tmp_path / 'search.db'))
+        sink = JSONLSink(str(tmp_path / 'pages.jsonl'))
+        run = BatchRun(str(tmp_path / 'work'), FakeBackend(), processor=processor, poll_interval=0, sink=sink)
+        outputs = run.run(str(config), 'guide')
+
+    records = list(iter_records(str(tmp_path / 'pages.jsonl')))
+    assert [(record['sequence'], record['prefix']) for record in records] == [(1, 'guide'), (2, 'guide')]
+    assert outputs == [f"{sink.path}#guide-001", f"{sink.path}#guide-002"]
+    assert 'result of 2-validate-0' in records[1]['markdown']
+    assert records[0]['title'] == 'Install' and records[0]['strategy'] == 'html'
+    assert records[0]['chunk_fingerprints']
+    # Indexed under the name the file layout would give the page
+    [hit] = processor.search_index.search('"2-validate-0"')
+    assert hit['doc_key'] == sequence_filename(server.url('/docs/usage.html'), 'guide', 2)
+    assert run.state['pages'] == {'1': 'complete', '2': 'complete'}
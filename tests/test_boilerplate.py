@@ -0,0 +1,129 @@
+import json
+import http.server
+
+from bs4 import BeautifulSoup
+
+from src.benchmark import FakeVisualScraper, offline_pipeline
+from src.boilerplate import BoilerplateIndex, build_indexes, hash_blocks, index_path
+
+NAV = ('<nav><ul><li><a href="/a">Getting started with the client</a></li>'
+       '<li><a href="/b">Configuration and authentication</a></li></ul></nav>')
+FOOTER = '<footer><div>Copyright Example Corp. All rights reserved. Terms and privacy.</div></footer>'
+
+
+def page(title: str, nav: str = NAV) -> str:
+    return (f"<html><head><title>{title}</title></head><body>{nav}<main><h1>{title}</h1>"
+            f"<div><p>{title} explains one part of the client library in some detail.</p></div>"
+            f"</main>{FOOTER}</body></html>")
+
+
+def hashes(html: str):
+    return [(block_hash, tag.name) for block_hash, tag in hash_blocks(BeautifulSoup(html, 'html.parser'))]
+
+
+def test_block_hashes_ignore_attributes_and_whitespace_but_not_text():
+    plain = hashes(f"<html><body>{NAV}</body></html>")
+    styled = hashes('<html><body>' + NAV.replace('<nav>', '<nav class="top" id="n1">')
+                    .replace('</li><li>', '</li>\n   <li>') + '</body></html>')
+    changed = hashes('<html><body>' + NAV.replace('Configuration', 'Settings') + '</body></html>')
+    assert plain == styled
+    assert plain[-1][1] == 'nav'
+    assert changed[-1][0] != plain[-1][0]
+
+
+def test_short_and_protected_blocks_are_not_candidates():
+    names = [name for _, name in hashes(page('Intro'))]
+    # Innermost first: the list before its nav; main and body are never stripped
+    assert names.index('ul') < names.index('nav')
+    assert 'main' not in names and 'body' not in names
+    assert hashes('<html><body><div>Too short</div></body></html>') == []
+
+
+def test_template_blocks_need_the_threshold_share_of_enough_pages():
+    index = BoilerplateIndex(threshold=0.5, min_pages=3)
+    index.observe('https://example.com/1', page('One'))
+    index.observe('https://example.com/2', page('Two'))
+    assert not index.ready and index.template_hashes() == set()
+
+    # The nav is on 2 of 4 pages (the threshold), the replacement nav on only 1
+    index.observe('https://example.com/3', page('Three', nav=''))
+    index.observe('https://example.com/4', page('Four', nav=NAV.replace('Getting', 'Starting')))
+    assert not index.observe('https://example.com/4', page('Four'))
+    template = {name for block_hash, name in hashes(page('Five')) if block_hash in index.template_hashes()}
+    assert template == {'nav', 'ul', 'footer', 'div'}
+
+    index.threshold = 0.75
+    index._template = None
+    assert {name for block_hash, name in hashes(page('Five'))
+            if block_hash in index.template_hashes()} == {'footer', 'div'}
+
+
+def test_strip_removes_template_blocks_and_keeps_the_content():
+    index = BoilerplateIndex(min_pages=3)
+    for i in range(3):
+        index.observe(f"https://example.com/{i}", page(f"Page {i}"))
+    stripped, removed = index.strip(page('New page'))
+    assert removed == 2  # The nav (taking its list along) and the footer (with its div)
+    assert 'Getting started' not in stripped and 'Copyright' not in stripped
+    assert 'New page explains one part' in stripped
+    # Nothing to strip leaves the page untouched
+    other = '<html><body><main><h1>Other</h1></main></body></html>'
+    assert index.strip(other) == (other, 0)
+
+
+class SiteHandler(http.server.BaseHTTPRequestHandler):
+    """Serves page(<path>) for any path and records the paths requested"""
+    requests_seen = []
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.requests_seen.append(self.path)
+        body = page(self.path.strip('/').title()).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def test_build_indexes_can_stop_at_a_few_pages_per_host(tmp_path, serve_handler):
+    SiteHandler.requests_seen = []
+    base = serve_handler(SiteHandler)
+    urls = [f"{base}/page{i}" for i in range(10)]
+    indexes = build_indexes(iter(urls), str(tmp_path), pages_per_host=3)
+    assert len(SiteHandler.requests_seen) == 3
+    [index] = indexes.values()
+    assert index.ready and not index.changed
+    # A later run finds the host ready and fetches nothing
+    build_indexes(iter(urls), str(tmp_path), pages_per_host=3)
+    assert len(SiteHandler.requests_seen) == 3
+
+
+def test_streaming_run_records_pages_as_it_converts_them(tmp_path, monkeypatch, serve_handler):
+    monkeypatch.chdir(tmp_path)
+    from src.convert import ContentProcessor
+    SiteHandler.requests_seen = []
+    base = serve_handler(SiteHandler)
+    config = tmp_path / 'urls.txt'
+    config.write_text('\n'.join(f"{base}/page{i}" for i in range(5)) + '\n', encoding='utf-8')
+
+    with offline_pipeline():
+        processor = ContentProcessor()
+        processor.visual_scraper = FakeVisualScraper(str(tmp_path), size=(320, 480))
+        processor.crop_to_main_content = False
+        processor.boilerplate_dir = str(tmp_path / 'boilerplate')
+        counts = processor.process_urls_streaming(str(config))
+
+    assert counts == {'ok': 5}
+    # No prefetch pass: each page is downloaded once, by its own conversion
+    assert sorted(SiteHandler.requests_seen) == [f"/page{i}" for i in range(5)]
+    with open(index_path(base, processor.boilerplate_dir), encoding='utf-8') as f:
+        assert len(json.load(f)['pages']) == 5
+    # Stripping starts once the host has enough pages on record, the current one included
+    with open(tmp_path / 'output' / 'doc-page-metrics.jsonl', encoding='utf-8') as f:
+        records = [json.loads(line) for line in f]
+    removed = {record['url'].rsplit('/', 1)[-1]: record['counters'].get('boilerplate_blocks_removed', 0)
+               for record in records}
+    assert removed == {'page0': 0, 'page1': 0, 'page2': 2, 'page3': 2, 'page4': 2}
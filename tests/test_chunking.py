@@ -0,0 +1,106 @@
+import random
+
+from src.chunking import DraftCache, chunk_fingerprint, content_defined_chunks, estimate_tokens
+
+WORDS = 'request model token stream batch latency markdown parser chunk cache draft page site index'.split()
+
+
+def document(sections: int = 120, seed: int = 7) -> str:
+    rng = random.Random(seed)
+    parts = []
+    for i in range(sections):
+        parts.append(f"<h2>Section {i}</h2>")
+        for _ in range(rng.randint(1, 4)):
+            parts.append('<p>' + ' '.join(rng.choice(WORDS) for _ in range(rng.randint(20, 120))) + '</p>')
+    return '\n'.join(parts)
+
+
+def chunks(content: str):
+    return content_defined_chunks(content, min_size=300, target_size=1200, max_size=4000)
+
+
+def test_chunks_cover_the_content_within_the_size_cap():
+    content = document()
+    result = chunks(content)
+    assert '\n'.join(result) == content
+    assert len(result) > 10
+    assert max(estimate_tokens(chunk) for chunk in result) <= 4000
+
+
+def edited(content: str) -> str:
+    paragraphs = content.split('\n')
+    middle = len(paragraphs) // 2
+    paragraphs[middle] = paragraphs[middle].replace('</p>', ' An added sentence about the edit.</p>')
+    return '\n'.join(paragraphs)
+
+
+def test_boundaries_stay_put_after_a_local_edit():
+    content = document()
+    before, after = chunks(content), chunks(edited(content))
+
+    changed = set(before) ^ set(after)
+    # Only the chunk holding the edit (and at worst a neighbour) differs
+    assert 1 <= len(set(after) - set(before)) <= 2
+    assert len(changed) <= 4
+    assert after[:3] == before[:3] and after[-3:] == before[-3:]
+
+
+def test_a_small_max_size_lowers_the_target():
+    # With the default 8k target, a 2k cap would otherwise cut every chunk by size
+    content = document(sections=400)
+    before = content_defined_chunks(content, max_size=2000)
+    after = content_defined_chunks(edited(content), max_size=2000)
+    assert max(estimate_tokens(chunk) for chunk in before) <= 2000
+    assert sum(estimate_tokens(chunk) < 1500 for chunk in before) > len(before) // 2
+    assert len(set(before) ^ set(after)) <= 4
+
+
+def test_draft_cache_hits_only_for_the_same_chunk_model_and_prompt(tmp_path):
+    path = str(tmp_path / 'drafts.db')
+    cache = DraftCache(path, 'model-a', 'v1')
+    assert cache.get('<p>One</p>') is None
+    cache.put('<p>One</p>', '# One')
+    assert cache.get('<p>One</p>') == '# One'
+    assert cache.get('<p>One </p>') is None
+    # Another model or prompt version never sees the draft
+    assert DraftCache(path, 'model-b', 'v1').get('<p>One</p>') is None
+    assert DraftCache(path, 'model-a', 'v2').get('<p>One</p>') is None
+    # The store persists across instances
+    assert DraftCache(path, 'model-a', 'v1').get('<p>One</p>') == '# One'
+    assert chunk_fingerprint('<p>One</p>') == chunk_fingerprint('<p>One</p>')
+
+
+def test_prune_drops_drafts_unused_for_max_age(tmp_path, monkeypatch):
+    cache = DraftCache(str(tmp_path / 'drafts.db'), 'model', 'v1')
+    monkeypatch.setattr('src.chunking.time.time', lambda: 1000.0)
+    cache.put('<p>Old</p>', '# Old')
+    monkeypatch.setattr('src.chunking.time.time', lambda: 5000.0)
+    cache.put('<p>New</p>', '# New')
+    assert cache.prune(max_age=3000) == 1
+    assert cache.get('<p>Old</p>') is None
+    assert cache.get('<p>New</p>') == '# New'
+
+
+def test_re_converting_drafts_only_the_chunks_not_cached(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    from src.convert import ContentProcessor
+    from src.metrics import metrics
+    processor = ContentProcessor()
+    processor.draft_cache = DraftCache(str(tmp_path / 'drafts.db'), 'model', 'v1')
+    drafted = []
+
+    def draft_uncached(chunk, visual_analysis):
+        drafted.append(chunk)
+        return [f"# Draft {len(drafted)}"]
+
+    monkeypatch.setattr(processor, '_draft_uncached', draft_uncached)
+    first, second = chunks(document()), chunks(document(seed=8))
+    with metrics.page('https://example.com/a') as page:
+        for chunk in first:
+            processor.draft_chunk(chunk, None)
+        for chunk in first[:2] + second[:1]:
+            processor.draft_chunk(chunk, None)
+    assert drafted == first + second[:1]
+    assert page['counters']['draft_cache_misses'] == len(first) + 1
+    assert page['counters']['draft_cache_hits'] == 2
+    assert processor.draft_chunk(first[0], None) == ['# Draft 1']
@@ -0,0 +1,188 @@
+import os
+import time
+
+import pytest
+import requests
+
+from src.crawler import (CrawlFrontier, CrawlScope, HostPoliteness, RobotsRules, SiteCrawler,
+                         extract_links, normalize_url, parse_sitemap)
+from src.sinks import FileSink, sequence_filename
+
+
+def crawled_paths(frontier, status=None):
+    return [url.split('/', 3)[3] if url.count('/') > 2 else '' for _, url in frontier.entries(status)]
+
+
+@pytest.mark.parametrize('url, expected', [
+    ('HTTP://Example.COM/Docs/', 'http://example.com/Docs'),
+    ('https://example.com:443/a//b/', 'https://example.com/a/b'),
+    ('http://example.com:8080', 'http://example.com:8080/'),
+    ('https://example.com/page#section', 'https://example.com/page'),
+    ('https://example.com/page?b=2&a=1&utm_source=x&gclid=y', 'https://example.com/page?a=1&b=2'),
+])
+def test_normalize_url(url, expected):
+    assert normalize_url(url) == expected
+
+
+def test_extract_links_resolves_and_deduplicates():
+    html = '''<base href="/docs/">
+        <a href="intro.html">a</a> <a href="intro.html#x">b</a> <a href="#top">c</a>
+        <a href="mailto:x@example.org">d</a> <a href="skip.html" rel="nofollow">e</a>
+        <a href="ftp://example.com/f">f</a>'''
+    assert extract_links(html, 'https://example.com/index.html') == ['https://example.com/docs/intro.html']
+
+
+def test_scope():
+    scope = CrawlScope(['https://example.com/docs/'], path_prefixes=['/docs'], exclude_patterns=[r'/v1/'])
+    assert 'https://example.com/docs/intro' in scope
+    assert 'https://other.example.com/docs/intro' not in scope
+    assert 'https://example.com/blog/post' not in scope
+    assert 'https://example.com/docs/logo.png' not in scope
+    assert 'https://example.com/docs/v1/intro' not in scope
+
+
+def test_parse_sitemap():
+    urlset = b'<urlset><url><loc> https://example.com/a </loc></url></urlset>'
+    index = b'<sitemapindex><sitemap><loc>https://example.com/s.xml</loc></sitemap></sitemapindex>'
+    assert parse_sitemap(urlset) == (['https://example.com/a'], [])
+    assert parse_sitemap(index) == ([], ['https://example.com/s.xml'])
+
+
+def test_frontier_deduplicates_and_keeps_sequences_on_resume(tmp_path):
+    path = str(tmp_path / 'crawl.db')
+    frontier = CrawlFrontier(path)
+    assert frontier.add('https://example.com/a')
+    assert frontier.add('https://example.com/b')
+    assert not frontier.add('https://EXAMPLE.com/a#fragment')
+    assert frontier.claim() == ('https://example.com/a', 1, 0)
+    frontier.close()
+
+    # The claimed URL of the interrupted run is pending again, with the same sequence
+    frontier = CrawlFrontier(path)
+    assert frontier.counts() == {'pending': 2}
+    assert frontier.add('https://example.com/c')
+    assert frontier.entries() == [(1, 'https://example.com/a'), (2, 'https://example.com/b'),
+                                  (3, 'https://example.com/c')]
+    frontier.close()
+
+
+def test_frontier_retries_until_attempts_run_out():
+    frontier = CrawlFrontier()
+    frontier.add('https://example.com/a')
+    for _ in range(2):
+        url, _, _ = frontier.claim()
+        frontier.fail(url, 'boom', max_attempts=2)
+    assert frontier.counts() == {'failed': 1}
+    assert frontier.claim() is None
+
+
+def test_frontier_claim_skips_hosts_that_are_not_ready():
+    frontier = CrawlFrontier()
+    frontier.add('https://busy.example.com/a')
+    frontier.add('https://idle.example.com/b')
+    assert frontier.claim(lambda host: host != 'busy.example.com')[0] == 'https://idle.example.com/b'
+
+
+def test_politeness_limits_concurrency_and_spacing():
+    politeness = HostPoliteness(min_delay=0.0, max_concurrent=2)
+    assert politeness.try_acquire('a')
+    assert politeness.try_acquire('a')
+    assert not politeness.try_acquire('a')
+    assert politeness.try_acquire('b')
+    politeness.release('a')
+    assert politeness.try_acquire('a')
+
+    spaced = HostPoliteness(min_delay=0.0, max_concurrent=10)
+    spaced.set_min_delay('slow', 0.2)
+    assert spaced.try_acquire('slow')
+    assert not spaced.try_acquire('slow')
+    assert spaced.try_acquire('fast') and spaced.try_acquire('fast')
+    time.sleep(0.25)
+    assert spaced.try_acquire('slow')
+
+
+def test_robots_rules_crawl_delay():
+    class Response:
+        text = 'User-agent: *\nDisallow: /private/\nCrawl-delay: 3\n'
+
+    class Fetcher:
+        calls = 0
+
+        def fetch(self, url, **kwargs):
+            Fetcher.calls += 1
+            return Response()
+
+    robots = RobotsRules(Fetcher())
+    assert robots.allowed('https://example.com/docs/a')
+    assert not robots.allowed('https://example.com/private/b')
+    assert robots.crawl_delay('https://example.com/') == 3.0
+    assert Fetcher.calls == 1
+
+
+def make_crawler(frontier, base, **kwargs):
+    return SiteCrawler(frontier, CrawlScope([base]), workers=3, robots=RobotsRules(),
+                       politeness=HostPoliteness(min_delay=0.0, max_concurrent=3), **kwargs)
+
+
+def test_discover_crawl_of_static_site(static_site):
+    frontier = CrawlFrontier()
+    crawler = make_crawler(frontier, static_site, discover_only=True)
+    assert crawler.seed([static_site + '/']) == 1
+    crawler.run()
+
+    # Each page once, nothing off-site, disallowed, nofollow or non-HTML
+    assert frontier.counts() == {'done': 4}
+    assert sorted(crawled_paths(frontier)) == ['', 'docs/deep/page.html', 'docs/guide.html', 'docs/intro.html']
+    assert crawled_paths(frontier)[0] == ''
+
+
+def test_max_depth_and_max_pages(static_site):
+    frontier = CrawlFrontier()
+    crawler = make_crawler(frontier, static_site, discover_only=True, max_depth=1)
+    crawler.seed([static_site])
+    crawler.run()
+    assert 'docs/deep/page.html' not in crawled_paths(frontier)
+
+    frontier = CrawlFrontier()
+    crawler = make_crawler(frontier, static_site, discover_only=True, max_pages=2)
+    crawler.seed([static_site])
+    crawler.run()
+    assert frontier.counts()['done'] == 2
+
+
+def test_seed_sitemap_follows_index_and_robots(static_site):
+    frontier = CrawlFrontier()
+    crawler = make_crawler(frontier, static_site, discover_only=True)
+    assert crawler.seed_sitemap(static_site + '/sitemap.xml') == 2
+    assert crawled_paths(frontier) == ['', 'docs/extra.html']
+
+
+class FetchingProcessor:
+    """Converts by fetching the page; stands in for ContentProcessor without a browser or LLM"""
+
+    def convert(self, url):
+        response = requests.get(url, timeout=10)
+        response.raise_for_status()
+        return {'url': url, 'markdown': f"# {url}\n", 'title': None, 'html': response.text,
+                'strategy': 'html', 'screenshot': None}
+
+
+def test_crawl_converts_into_sink_with_stable_sequences(static_site, tmp_path):
+    frontier = CrawlFrontier(str(tmp_path / 'crawl.db'))
+    sink = FileSink(str(tmp_path / 'out'))
+    crawler = make_crawler(frontier, static_site, processor_factory=FetchingProcessor, sink=sink)
+    crawler.seed([static_site])
+    outputs = crawler.run()
+
+    assert len(outputs) == 4
+    assert sorted(os.listdir(tmp_path / 'out')) == sorted(os.path.basename(path) for path in outputs)
+    for sequence, url in frontier.entries():
+        with open(tmp_path / 'out' / sequence_filename(url, 'doc', sequence)) as f:
+            assert f.read() == f"# {url}\n"
+
+    # A repeated crawl over the same frontier finds nothing new to do
+    frontier.close()
+    frontier = CrawlFrontier(str(tmp_path / 'crawl.db'))
+    crawler = make_crawler(frontier, static_site, processor_factory=FetchingProcessor, sink=sink)
+    assert crawler.seed([static_site]) == 0
+    assert crawler.run() == []
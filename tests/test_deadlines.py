@@ -0,0 +1,114 @@
+import threading
+import time
+
+import pytest
+
+from src import deadlines
+from src.benchmark import FakeVisualScraper, FixtureServer, offline_pipeline
+from src.deadlines import Deadline, DeadlineExceeded, scope
+from src.sinks import FileSink
+
+
+def test_a_child_never_outlives_its_parent():
+    parent = Deadline(0.5, label='batch')
+    assert Deadline(60, parent=parent).expires_at == parent.expires_at
+    assert Deadline(None, parent=parent).expires_at == parent.expires_at
+    shorter = Deadline(0.1, parent=parent)
+    assert shorter.expires_at < parent.expires_at
+    assert Deadline(None, parent=Deadline()).remaining() is None
+
+
+def test_cap_shrinks_timeouts_and_raises_once_expired():
+    with scope(Deadline(5)):
+        assert deadlines.cap(60, 'fetch') <= 5
+        assert deadlines.cap(1, 'fetch') == 1
+        assert deadlines.cap(None, 'fetch') <= 5
+    assert deadlines.cap(60, 'fetch') == 60
+
+    expired = Deadline(0, label='https://example.com/a')
+    with scope(expired), pytest.raises(DeadlineExceeded) as error:
+        deadlines.cap(60, 'fetch')
+    assert error.value.stage == 'fetch' and error.value.deadline is expired
+    assert str(error.value) == 'Deadline for https://example.com/a exceeded during fetch'
+
+
+def test_scope_is_per_thread_and_restored():
+    outer, inner = Deadline(10), Deadline(1)
+    seen = []
+    with scope(outer):
+        with scope(inner):
+            thread = threading.Thread(target=lambda: seen.append(deadlines.current()))
+            thread.start()
+            thread.join()
+            assert deadlines.current() is inner
+        assert deadlines.current() is outer
+    assert deadlines.current() is None
+    assert seen == [None]
+
+
+def test_call_abandons_a_hung_function():
+    release = threading.Event()
+    seen = []
+
+    def hang():
+        seen.append(deadlines.current())
+        release.wait(10)
+        return 'late'
+
+    deadline = Deadline(0.2, label='page')
+    start = time.monotonic()
+    try:
+        with scope(deadline), pytest.raises(DeadlineExceeded) as error:
+            deadlines.call(hang, stage='draft')
+    finally:
+        release.set()
+    assert time.monotonic() - start < 2
+    assert error.value.stage == 'draft'
+    # The helper thread worked under the caller's deadline
+    assert seen == [deadline]
+
+
+def test_call_returns_results_and_raises_errors():
+    with scope(Deadline(5)):
+        assert deadlines.call(lambda x, y=0: x + y, 1, y=2) == 3
+        with pytest.raises(ValueError):
+            deadlines.call(int, 'not a number')
+    # Without a deadline it is a plain call on this thread
+    assert deadlines.call(threading.current_thread) is threading.current_thread()
+
+
+def test_convert_entries_writes_partial_output_when_a_page_times_out(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    from src.convert import ContentProcessor
+    release = threading.Event()
+    drafts = []
+
+    def draft_chunk(chunk, visual_analysis):
+        drafts.append(chunk)
+        if chunk == 'first':
+            return ['# Part one']
+        # The second chunk's LLM call never returns
+        return [deadlines.call(release.wait, 30, stage='draft')]
+
+    corpus = {path: '<html><head><title>Page</title></head><body><p>Text</p></body></html>'
+              for path in ('/a.html', '/b.html')}
+    with FixtureServer(corpus) as server, offline_pipeline():
+        processor = ContentProcessor()
+        processor.visual_scraper = FakeVisualScraper(str(tmp_path), size=(320, 480))
+        processor.url_timeout = 1.0
+        chunks = {server.url('/a.html'): ['first', 'second'], server.url('/b.html'): ['second']}
+        monkeypatch.setattr(processor, '_chunk_html', lambda url, *args: chunks[url])
+        monkeypatch.setattr(processor, 'draft_chunk', draft_chunk)
+        try:
+            outcomes = list(processor.convert_entries([(1, server.url('/a.html')), (2, server.url('/b.html'))],
+                                                      'doc', FileSink(str(tmp_path / 'out'))))
+        finally:
+            release.set()
+
+    partial, nothing = outcomes
+    assert partial['status'] == 'timeout'
+    with open(partial['output'], encoding='utf-8') as f:
+        assert '# Part one' in f.read()
+    # A page with nothing drafted has no output, and is not retried
+    assert (nothing['status'], nothing['output']) == ('timeout', None)
+    assert drafts == ['first', 'second', 'second']
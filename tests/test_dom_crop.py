@@ -0,0 +1,63 @@
+import json
+
+from src.dom_crop import crop_to_main_content, find_main_element
+
+HTML = '''<html><head><title>Docs</title></head><body>
+<header><h1>Getting started</h1></header>
+<aside><a href="/a">A</a><a href="/b">B</a></aside>
+<main id="content"><h2>Install</h2><p>Install the package with pip and import it.</p>
+<p>Then configure the client with your API key.</p></main>
+<footer>Copyright</footer>
+</body></html>'''
+
+# Child-index paths from <html>: body is [1]; header, aside, main, footer are its children
+LAYOUT = {
+    'viewport': {'width': 1000, 'height': 800},
+    'elements': [
+        {'path': [1], 'tag': 'body', 'id': None, 'rect': [0, 0, 1000, 800]},
+        {'path': [1, 0], 'tag': 'header', 'id': None, 'rect': [0, 0, 1000, 80]},
+        {'path': [1, 1], 'tag': 'aside', 'id': None, 'rect': [0, 80, 200, 720]},
+        {'path': [1, 2], 'tag': 'main', 'id': 'content', 'rect': [220, 100, 760, 650]},
+        {'path': [1, 3], 'tag': 'footer', 'id': None, 'rect': [0, 760, 1000, 40]},
+    ],
+}
+
+MAIN_BOX = {'main_content': {'top': 0.12, 'bottom': 0.95, 'left': 0.2, 'right': 0.98}}
+
+
+def test_main_element_is_the_best_overlap_with_the_visual_box():
+    assert find_main_element(LAYOUT, MAIN_BOX)['tag'] == 'main'
+    # The vision model's answer usually arrives as fenced JSON text
+    assert find_main_element(LAYOUT, f"```json\n{json.dumps(MAIN_BOX)}\n```")['tag'] == 'main'
+
+
+def test_no_element_qualifies_for_a_box_matching_nothing():
+    corner = {'main_content': {'top': 0.0, 'bottom': 0.05, 'left': 0.9, 'right': 1.0}}
+    assert find_main_element(LAYOUT, corner) is None
+    assert find_main_element(LAYOUT, {'main_content': 'center'}) is None
+    assert find_main_element({'elements': LAYOUT['elements']}, MAIN_BOX) is None
+
+
+def test_crop_keeps_the_main_subtree_and_the_page_heading():
+    cropped = crop_to_main_content(HTML, LAYOUT, MAIN_BOX)
+    assert cropped.startswith('<h1>Getting started</h1>\n<main id="content">')
+    for dropped in ('<aside>', '<footer>', 'Copyright'):
+        assert dropped not in cropped
+
+
+def test_crop_falls_back_when_no_candidate_qualifies():
+    # Nothing matches the box
+    corner = {'main_content': {'top': 0.0, 'bottom': 0.05, 'left': 0.9, 'right': 1.0}}
+    assert crop_to_main_content(HTML, LAYOUT, corner) is None
+    # The best match is the body itself
+    whole_page = {'main_content': {'top': 0.0, 'bottom': 1.0, 'left': 0.0, 'right': 1.0}}
+    assert crop_to_main_content(HTML, {'viewport': LAYOUT['viewport'], 'elements': LAYOUT['elements'][:1]},
+                                whole_page) is None
+    # The matched element holds too little of the page text
+    sidebar = {'main_content': {'top': 0.1, 'bottom': 1.0, 'left': 0.0, 'right': 0.2}}
+    assert find_main_element(LAYOUT, sidebar)['tag'] == 'aside'
+    assert crop_to_main_content(HTML, LAYOUT, sidebar) is None
+    # The recorded path no longer lands on the same tag in the fetched HTML
+    moved = {'viewport': LAYOUT['viewport'],
+             'elements': [dict(LAYOUT['elements'][3], id=None, path=[1, 0])]}
+    assert crop_to_main_content(HTML, moved, MAIN_BOX) is None
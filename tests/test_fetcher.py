@@ -0,0 +1,170 @@
+import gzip
+import time
+import http.server
+
+import pytest
+import requests
+
+from src.deadlines import Deadline, DeadlineExceeded, scope
+from src.fetcher import Fetcher, FetchTimeout, ResponseTooLarge
+
+BOMB = gzip.compress(b'\0' * (4 * 1024 * 1024))
+
+
+class SlowHandler(http.server.BaseHTTPRequestHandler):
+    """Pages that are slow, oversized or compressed in various ways"""
+
+    def log_message(self, format, *args):
+        pass
+
+    def _start(self, length=None, encoding=None, content_type='text/html; charset=utf-8'):
+        self.send_response(200)
+        # Spelled the way http.server itself does
+        self.send_header('Content-type', content_type)
+        if length is not None:
+            self.send_header('Content-Length', str(length))
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        self.end_headers()
+
+    def do_GET(self):
+        path = self.path
+        try:
+            if path.startswith('/page/'):
+                body = f"<p>{path}</p>".encode()
+                self._start(len(body))
+                self.wfile.write(body)
+            elif path == '/slow-headers':
+                time.sleep(2)
+                self._start(2)
+                self.wfile.write(b'ok')
+            elif path == '/slow-body':
+                self._start(1000)
+                self.wfile.write(b'<p>')
+                time.sleep(2)
+            elif path == '/trickle':
+                # Never idle long enough for the read timeout, but never finishing either
+                self._start()
+                for _ in range(40):
+                    self.wfile.write(b'x' * 10)
+                    self.wfile.flush()
+                    time.sleep(0.05)
+            elif path == '/declared-large':
+                self._start(10 * 1024 * 1024)
+                self.wfile.write(b'x' * 1024)
+            elif path == '/undeclared-large':
+                self._start()
+                for _ in range(64):
+                    self.wfile.write(b'x' * 64 * 1024)
+            elif path == '/gzip-bomb':
+                self._start(len(BOMB), encoding='gzip', content_type='text/plain')
+                self.wfile.write(BOMB)
+            elif path == '/latin1':
+                body = '<p>café</p>'.encode('latin-1')
+                self._start(len(body), content_type='text/html; charset=iso-8859-1')
+                self.wfile.write(body)
+            else:
+                self.send_error(404)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # The client gave up, which is what most of these tests expect
+
+
+@pytest.fixture
+def slow_server(serve_handler) -> str:
+    return serve_handler(SlowHandler)
+
+
+def fetcher(**kwargs) -> Fetcher:
+    options = dict(connect_timeout=1, read_timeout=0.5, total_timeout=5, retries=0)
+    options.update(kwargs)
+    return Fetcher(**options)
+
+
+def test_fetch_returns_the_decoded_body(slow_server):
+    result = fetcher().fetch(f"{slow_server}/latin1")
+    assert result.status_code == 200
+    assert result.text == '<p>café</p>'
+    assert result.content_type == 'text/html'
+
+
+def test_read_timeout_while_waiting_for_headers(slow_server):
+    start = time.monotonic()
+    with pytest.raises((requests.Timeout, requests.ConnectionError)):
+        fetcher().fetch(f"{slow_server}/slow-headers")
+    assert time.monotonic() - start < 1.5
+
+
+def test_read_timeout_while_the_body_stalls(slow_server):
+    start = time.monotonic()
+    with pytest.raises((requests.Timeout, requests.ConnectionError)):
+        fetcher().fetch(f"{slow_server}/slow-body")
+    assert time.monotonic() - start < 1.5
+
+
+def test_total_timeout_cuts_off_a_trickling_body(slow_server):
+    start = time.monotonic()
+    with pytest.raises(FetchTimeout):
+        fetcher(total_timeout=0.5).fetch(f"{slow_server}/trickle")
+    assert time.monotonic() - start < 1.5
+
+
+def test_connect_timeout_bounds_an_unreachable_host():
+    # A non-routable address: the connection attempt either times out or fails at once
+    start = time.monotonic()
+    with pytest.raises(requests.ConnectionError):
+        fetcher(connect_timeout=0.3).fetch('http://10.255.255.1/')
+    assert time.monotonic() - start < 2
+
+
+def test_active_deadline_turns_a_timeout_into_deadline_exceeded(slow_server):
+    with scope(Deadline(0.4, label='page')), pytest.raises(DeadlineExceeded):
+        fetcher(read_timeout=5).fetch(f"{slow_server}/trickle")
+
+
+def test_declared_size_over_the_limit_is_refused(slow_server):
+    with pytest.raises(ResponseTooLarge) as error:
+        fetcher().fetch(f"{slow_server}/declared-large", max_body_size=1024 * 1024)
+    assert error.value.content_type == 'text/html'
+
+
+def test_undeclared_size_is_cut_off_while_downloading(slow_server):
+    with pytest.raises(ResponseTooLarge):
+        fetcher().fetch(f"{slow_server}/undeclared-large", max_body_size=1024 * 1024)
+
+
+def test_oversized_body_is_spooled_when_asked(slow_server):
+    with pytest.raises(ResponseTooLarge) as error:
+        fetcher().fetch(f"{slow_server}/undeclared-large", max_body_size=1024 * 1024, spool_size=8 * 1024 * 1024)
+    with error.value.spooled as spooled:
+        assert sum(len(chunk) for chunk in spooled.text_chunks()) == 64 * 64 * 1024
+    # Past the spool size as well, nothing is kept
+    with pytest.raises(ResponseTooLarge) as error:
+        fetcher().fetch(f"{slow_server}/undeclared-large", max_body_size=1024 * 1024, spool_size=2 * 1024 * 1024)
+    assert error.value.spooled is None
+
+
+def test_decompressed_size_counts_against_the_limit(slow_server):
+    # Only a few KB on the wire, 4 MB once decompressed
+    assert len(BOMB) < 64 * 1024
+    with pytest.raises(ResponseTooLarge):
+        fetcher().fetch(f"{slow_server}/gzip-bomb", max_body_size=1024 * 1024)
+    assert len(fetcher().fetch(f"{slow_server}/gzip-bomb", max_body_size=8 * 1024 * 1024).content) == 4 * 1024 * 1024
+
+
+def test_stream_text_enforces_the_size_limit(slow_server):
+    with pytest.raises(ResponseTooLarge):
+        with fetcher().stream_text(f"{slow_server}/undeclared-large", max_body_size=1024 * 1024):
+            pass
+    with fetcher().stream_text(f"{slow_server}/latin1") as (headers, chunks):
+        assert ''.join(chunks) == '<p>café</p>'
+
+
+def test_fetch_many_yields_every_url_in_completion_order(slow_server):
+    urls = [f"{slow_server}/slow-headers"] + [f"{slow_server}/page/{i}" for i in range(20)] + [f"{slow_server}/missing"]
+    outcomes = list(fetcher(read_timeout=5).fetch_many(urls, max_workers=4))
+    assert sorted(url for url, _ in outcomes) == sorted(urls)
+    results = dict(outcomes)
+    assert results[f"{slow_server}/page/7"].text == '<p>/page/7</p>'
+    assert isinstance(results[f"{slow_server}/missing"], requests.HTTPError)
+    # The slow page was submitted first but finishes last
+    assert outcomes[-1][0] == f"{slow_server}/slow-headers"
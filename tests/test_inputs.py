@@ -0,0 +1,15 @@
+import json
+
+from src.inputs import iter_config_entries
+
+
+def test_jsonl_entries_with_a_bad_number_are_skipped(tmp_path):
+    path = tmp_path / 'urls.jsonl'
+    lines = [{'url': 'https://example.com/a', 'number': 3},
+             {'url': 'https://example.com/b', 'number': 'three'},
+             {'url': 'https://example.com/c', 'number': [4]},
+             'https://example.com/d',
+             {'url': 'https://example.com/e'}]
+    path.write_text('\n'.join(json.dumps(line) for line in lines) + '\n{broken\n', encoding='utf-8')
+    assert list(iter_config_entries(str(path))) == [
+        (3, 'https://example.com/a'), (4, 'https://example.com/d'), (5, 'https://example.com/e')]
@@ -0,0 +1,154 @@
+import time
+import threading
+
+import pytest
+
+from src.deadlines import Deadline, DeadlineExceeded
+from src.jobqueue import QueueWorker, RedisJobQueue, SQLiteJobQueue
+from src.sinks import FileSink
+
+ENTRIES = [(1, 'https://example.com/a'), (2, 'https://example.com/b'), (3, 'https://example.com/c')]
+
+
+@pytest.fixture(params=['sqlite', 'redis'])
+def open_queue(request, tmp_path):
+    """Factory for queue handles sharing one store, as separate worker processes would"""
+    if request.param == 'sqlite':
+        path = str(tmp_path / 'jobs.db')
+        return lambda: SQLiteJobQueue(path)
+    fakeredis = pytest.importorskip('fakeredis')
+    server = fakeredis.FakeServer()
+    return lambda: RedisJobQueue(fakeredis.FakeRedis(server=server, decode_responses=True))
+
+
+def test_enqueue_ignores_queued_entries(open_queue):
+    queue = open_queue()
+    assert queue.enqueue(iter(ENTRIES), 'doc') == 3
+    assert queue.enqueue(iter(ENTRIES), 'doc') == 0
+    assert queue.stats() == {'pending': 3}
+
+
+def test_lease_ack_in_number_order(open_queue):
+    queue = open_queue()
+    queue.enqueue(reversed(ENTRIES), 'doc')
+    first = queue.lease('w1', 60)
+    second = queue.lease('w2', 60)
+    assert (first.number, second.number) == (1, 2)
+    assert first.attempts == 1
+    assert queue.ack(first, 'out/a.md')
+    assert not queue.ack(first, 'out/a.md')
+    assert queue.stats() == {'done': 1, 'leased': 1, 'pending': 1}
+
+
+def test_expired_lease_moves_to_another_worker(open_queue):
+    queue = open_queue()
+    queue.enqueue(ENTRIES[:1], 'doc')
+    stale = queue.lease('w1', 0.05)
+    assert queue.lease('w2', 60) is None
+    time.sleep(0.1)
+    fresh = queue.lease('w2', 60)
+    assert fresh.id == stale.id and fresh.attempts == 2
+    assert queue.stats() == {'leased': 1}
+    # The first worker lost its lease, so neither its extension nor its result counts
+    assert not queue.extend(stale, 60)
+    assert not queue.ack(stale, 'stale.md')
+    assert queue.ack(fresh, 'fresh.md')
+
+
+def test_expired_lease_fails_after_max_attempts(open_queue):
+    queue = open_queue()
+    queue.enqueue(ENTRIES[:1], 'doc')
+    for _ in range(2):
+        # Each worker dies without acking or nacking
+        assert queue.lease('crashing', 0.05, max_attempts=2) is not None
+        time.sleep(0.1)
+    assert queue.lease('w', 60, max_attempts=2) is None
+    assert queue.stats() == {'failed': 1}
+
+
+def test_extend_keeps_the_lease(open_queue):
+    queue = open_queue()
+    queue.enqueue(ENTRIES[:1], 'doc')
+    job = queue.lease('w1', 0.1)
+    assert queue.extend(job, 60)
+    time.sleep(0.15)
+    assert queue.lease('w2', 60) is None
+
+
+def test_nack_retries_then_fails(open_queue):
+    queue = open_queue()
+    queue.enqueue(ENTRIES[:1], 'doc')
+    job = queue.lease('w', 60)
+    assert queue.nack(job, 'boom', max_attempts=2)
+    job = queue.lease('w', 60)
+    assert job.attempts == 2
+    assert queue.nack(job, 'boom', max_attempts=2)
+    assert queue.lease('w', 60) is None
+    assert queue.stats() == {'failed': 1}
+
+
+def test_concurrent_workers_never_share_a_job(open_queue):
+    queue = open_queue()
+    queue.enqueue(((n, f"https://example.com/{n}") for n in range(1, 101)), 'doc')
+    leased = []
+    lock = threading.Lock()
+
+    def worker(name):
+        handle = open_queue()
+        while True:
+            job = handle.lease(name, 60)
+            if job is None:
+                return
+            with lock:
+                leased.append(job.number)
+            assert handle.ack(job, f"{job.number}.md")
+
+    threads = [threading.Thread(target=worker, args=(f"w{i}",)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(leased) == list(range(1, 101))
+    assert queue.stats() == {'done': 100}
+
+
+class ScriptedProcessor:
+    """Raises the queued outcomes in turn, then converts"""
+    output_dir = 'output'
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+
+    def convert(self, url):
+        if self.outcomes:
+            raise self.outcomes.pop(0)
+        return {'url': url, 'markdown': f"# {url}\n", 'strategy': 'html'}
+
+
+def run_worker(queue, tmp_path, processor, **kwargs):
+    worker = QueueWorker(queue, processor, visibility_timeout=60, poll_interval=0.01,
+                         sink=FileSink(str(tmp_path / 'out')), **kwargs)
+    return worker.run()
+
+
+def test_worker_retries_errors_and_writes_output(open_queue, tmp_path):
+    queue = open_queue()
+    queue.enqueue(ENTRIES[:1], 'doc')
+    assert run_worker(queue, tmp_path, ScriptedProcessor(RuntimeError('flaky')), max_attempts=3) == 2
+    assert queue.stats() == {'done': 1}
+    assert len(list((tmp_path / 'out').iterdir())) == 1
+
+
+def test_worker_timeout_fails_without_retry_by_default(open_queue, tmp_path):
+    queue = open_queue()
+    queue.enqueue(ENTRIES[:1], 'doc')
+    assert run_worker(queue, tmp_path, ScriptedProcessor(DeadlineExceeded('draft', Deadline(0)))) == 1
+    assert queue.stats() == {'failed': 1}
+
+
+def test_worker_timeout_attempts_allow_a_retry(open_queue, tmp_path):
+    queue = open_queue()
+    queue.enqueue(ENTRIES[:1], 'doc')
+    processor = ScriptedProcessor(DeadlineExceeded('draft', Deadline(0)))
+    assert run_worker(queue, tmp_path, processor, timeout_attempts=2) == 2
+    assert queue.stats() == {'done': 1}
@@ -0,0 +1,88 @@
+import json
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from src.layout import analyze_layout, crop_margins, remap_visual_analysis, split_sections
+
+
+def page_image(size, blocks, background=(255, 255, 255), ink=(20, 20, 20)) -> Image.Image:
+    """A synthetic screenshot: filled (left, top, right, bottom) blocks on a plain background"""
+    image = Image.new('RGB', size, background)
+    draw = ImageDraw.Draw(image)
+    for left, top, right, bottom in blocks:
+        draw.rectangle((left, top, right - 1, bottom - 1), fill=ink)
+    return image
+
+
+def test_crop_margins_trims_to_the_content_plus_padding():
+    image = page_image((1000, 800), [(200, 100, 500, 300), (300, 350, 800, 500)])
+    cropped, box = crop_margins(image, padding=16)
+    assert box == (184, 84, 816, 516)
+    assert cropped.size == (632, 432)
+    # Every content pixel survives the crop
+    assert np.array_equal(np.asarray(cropped), np.asarray(image)[84:516, 184:816])
+
+
+def test_crop_margins_works_on_dark_pages():
+    image = page_image((1000, 800), [(100, 200, 900, 600)], background=(30, 30, 30), ink=(230, 230, 230))
+    assert crop_margins(image, padding=0)[1] == (100, 200, 900, 600)
+    assert analyze_layout(image)['background'] == 30
+
+
+def test_crop_margins_keeps_images_it_would_barely_shrink():
+    blank = page_image((400, 300), [])
+    assert crop_margins(blank) == (blank, None)
+    full = page_image((400, 300), [(5, 5, 395, 295)])
+    assert crop_margins(full, padding=16) == (full, None)
+
+
+def test_split_sections_cuts_only_in_whitespace_bands():
+    blocks = [(50, 100, 750, 700), (50, 800, 750, 1500), (50, 1700, 750, 2500), (50, 2700, 750, 3900)]
+    image = page_image((800, 4000), blocks)
+    pieces = split_sections(image, max_height=1600)
+
+    assert len(pieces) == 3
+    assert all(piece.width == 800 for piece in pieces)
+    assert max(piece.height for piece in pieces) <= 1600
+    # Stacked back together the pieces are the original screenshot
+    assert np.array_equal(np.vstack([np.asarray(piece) for piece in pieces]), np.asarray(image))
+    cuts = np.cumsum([piece.height for piece in pieces])[:-1]
+    for cut in cuts:
+        assert not any(top <= cut < bottom for _, top, _, bottom in blocks)
+
+
+def test_split_sections_leaves_a_short_or_blank_screenshot_whole():
+    short = page_image((800, 1000), [(50, 100, 750, 400), (50, 500, 750, 900)])
+    assert [piece.size for piece in split_sections(short, max_height=1600)] == [(800, 1000)]
+    blank = page_image((800, 3000), [])
+    assert split_sections(blank) == [blank]
+
+
+def test_remapped_boxes_line_up_with_the_full_frame():
+    frame_size = (1000, 2000)
+    main = (300, 400, 900, 1600)
+    image = page_image(frame_size, [(100, 300, 200, 1700), main])
+    cropped, box = crop_margins(image)
+
+    # What the vision model would report for the cropped image, as fractions of it
+    left, top = main[0] - box[0], main[1] - box[1]
+    right, bottom = main[2] - box[0], main[3] - box[1]
+    reported = {
+        'main_content': {'left': left / cropped.width, 'top': top / cropped.height,
+                         'right': right / cropped.width, 'bottom': bottom / cropped.height},
+        'hierarchy': [{'level': 1, 'text': 'Title', 'position': top / cropped.height}],
+    }
+    remapped = remap_visual_analysis(reported, box, frame_size)
+    width, height = frame_size
+    content = remapped['main_content']
+    assert [round(content['left'] * width), round(content['top'] * height),
+            round(content['right'] * width), round(content['bottom'] * height)] == list(main)
+    assert round(remapped['hierarchy'][0]['position'] * height) == main[1]
+    # The model's answer itself is left as it was
+    assert reported['main_content']['left'] == left / cropped.width
+
+    # JSON text in gives JSON text out; anything unparseable is returned as it was
+    as_text = remap_visual_analysis('```json\n' + json.dumps(reported) + '\n```', box, frame_size)
+    assert json.loads(as_text)['main_content'] == content
+    assert remap_visual_analysis('no layout found', box, frame_size) == 'no layout found'
@@ -0,0 +1,51 @@
+import json
+import threading
+
+from src.metrics import MetricsRecorder
+
+
+def convert_pages(recorder: MetricsRecorder, count: int):
+    for i in range(count):
+        with recorder.page(f"https://example.com/{i}"), recorder.stage('fetch'):
+            recorder.inc('bytes_fetched', 100)
+
+
+def test_only_the_latest_page_records_are_kept():
+    recorder = MetricsRecorder(max_pages=10)
+    convert_pages(recorder, 50)
+    summary = recorder.summary()
+    assert [page['url'] for page in summary['pages']] == [f"https://example.com/{i}" for i in range(40, 50)]
+    assert summary['pages_recorded'] == 50
+    # Aggregates still cover every page
+    assert summary['counters']['bytes_fetched'][0]['value'] == 5000
+
+
+def test_page_log_writes_records_out_instead_of_keeping_them(tmp_path):
+    recorder = MetricsRecorder()
+    path = tmp_path / 'pages.jsonl'
+    with recorder.page_log(str(path)):
+        convert_pages(recorder, 5)
+    convert_pages(recorder, 1)
+    logged = [json.loads(line) for line in path.read_text(encoding='utf-8').splitlines()]
+    assert [page['url'] for page in logged] == [f"https://example.com/{i}" for i in range(5)]
+    assert logged[0]['counters'] == {'bytes_fetched': 100}
+    assert [page['url'] for page in recorder.summary()['pages']] == ['https://example.com/0']
+
+
+def test_threads_sharing_a_page_record_lose_no_updates():
+    recorder = MetricsRecorder()
+    with recorder.page('https://example.com/') as record:
+        def work():
+            with recorder.bind_page(record):
+                for _ in range(2000):
+                    recorder.inc('retries')
+                    with recorder.stage('draft'):
+                        pass
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    assert record['counters']['retries'] == 16000
+    assert recorder.summary()['histograms']['stage_seconds'][0]['count'] == 16000
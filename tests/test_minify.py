@@ -0,0 +1,79 @@
+import pytest
+from bs4 import BeautifulSoup
+
+from src.benchmark import build_corpus
+from src.convert import filter_and_chunk_content
+from src.minify import estimate_minified_tokens, estimate_prompt_tokens, minification_report, minify_html
+
+CORPUS = build_corpus(huge_sections=50)
+
+
+def test_minify_drops_noise_and_keeps_content():
+    html = '''<html><head><title>T</title><script>x()</script><style>p{}</style></head>
+        <body><nav class="n" style="display:none">Menu</nav><!-- note -->
+        <p class="lead" data-x="1">Hello <span>there</span></p>
+        <a href="/docs" class="btn" onclick="go()">Docs</a><img src="data:image/png;base64,AAAA" alt="Logo">
+        <pre class="language-python x">a  =  1\n  b</pre></body></html>'''
+    minified = minify_html(html)
+    assert '<title>T</title>' in minified
+    for noise in ('script', 'style', 'Menu', 'note', 'class="lead"', 'data-x', 'onclick', 'base64', '<span>'):
+        assert noise not in minified
+    assert '<a href="/docs">Docs</a>' in minified
+    assert '<img alt="Logo"/>' in minified
+    assert '<pre class="language-python">a  =  1\n  b</pre>' in minified
+
+
+def test_minify_adds_only_heading_newlines_to_dense_markup():
+    # No whitespace between elements, as in server-minified pages and the table rows of huge.html
+    rows = ''.join(f'<tr><td>k{i}</td><td>{i}</td></tr>' for i in range(200))
+    html = f'<html><body><h1>T</h1><table>{rows}</table><ul>' + '<li>x</li>' * 200 + '</ul></body></html>'
+    # The only growth allowed is the newline that starts each heading
+    assert len(minify_html(html)) <= len(html) + html.count('<h1>')
+
+
+@pytest.mark.parametrize('path', sorted(CORPUS))
+def test_minify_shrinks_corpus_pages(path):
+    html = CORPUS[path]
+    minified = minify_html(html)
+    assert len(minified) <= len(html)
+    assert minification_report(html, minified)['reduction'] >= 0
+
+
+def test_headings_start_lines_so_chunking_can_split():
+    html = '<div><h2>A</h2><p>' + 'a ' * 300 + '</p><h2>B</h2><p>' + 'b ' * 300 + '</p></div>'
+    minified = minify_html(html)
+    assert '\n<h2>A</h2>' in minified and '\n<h2>B</h2>' in minified
+    chunks = filter_and_chunk_content(minified, max_chunk_size=100)
+    assert chunks[-2].startswith('<h2>A</h2>') and chunks[-1].startswith('<h2>B</h2>')
+
+
+def test_minification_report_is_never_negative():
+    report = minification_report('<p>a</p>', '<p>a</p>\n\n\n\n')
+    assert report['tokens_after'] > report['tokens_before']
+    assert report['reduction'] == 0.0
+    assert minification_report('', '')['reduction'] == 0.0
+
+
+@pytest.mark.parametrize('path', sorted(CORPUS))
+def test_minified_token_estimate_tracks_minify_html(path):
+    html = CORPUS[path]
+    actual = estimate_prompt_tokens(minify_html(html))
+    estimate = estimate_minified_tokens(BeautifulSoup(html, 'html.parser'))
+    assert abs(estimate - actual) <= max(25, 0.15 * actual)
+
+
+def test_crop_and_minify_savings_are_reported_separately(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    from src import convert
+    from src.metrics import metrics
+    html = CORPUS['/huge.html']
+    main = '<main><h1>Huge Page</h1><p class="lead" data-x="1">Only <span>this</span> is kept.</p></main>'
+    monkeypatch.setattr(convert, 'crop_to_main_content', lambda html_content, layout, visual_analysis: main)
+    processor = convert.ContentProcessor()
+    with metrics.page('https://example.com/huge') as page:
+        processor._chunk_html('https://example.com/huge', html, {'elements': []}, {})
+    counters = page['counters']
+    assert counters['prompt_tokens_estimated_raw'] == estimate_prompt_tokens(html)
+    # Minification is measured against the cropped HTML it was given, not the whole page
+    assert counters['prompt_tokens_estimated_cropped'] == estimate_prompt_tokens(main)
+    assert counters['prompt_tokens_estimated_minified'] == estimate_prompt_tokens(minify_html(main))
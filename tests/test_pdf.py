@@ -0,0 +1,50 @@
+import io
+import os
+import re
+
+from PIL import Image
+
+from src.benchmark import offline_pipeline
+from src.metrics import metrics
+from src.pdf import pymupdf
+
+
+def png(color) -> bytes:
+    buffer = io.BytesIO()
+    Image.new('RGB', (120, 120), color).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def pdf_with_image(text: str, image: bytes) -> bytes:
+    document = pymupdf.open()
+    page = document.new_page()
+    page.insert_text((72, 72), text, fontsize=11)
+    page.insert_image(pymupdf.Rect(72, 120, 272, 320), stream=image)
+    data = document.tobytes()
+    document.close()
+    return data
+
+
+def test_pdf_images_of_different_documents_do_not_collide(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    from src.convert import ContentProcessor
+    processor = ContentProcessor()
+    processor.pdf_image_dir = os.path.join(processor.output_dir, 'imgs')
+    documents = {
+        'https://example.com/a/spec.pdf': (pdf_with_image('Specification A with a red figure', png('red')), png('red')),
+        'https://example.com/b/spec.pdf': (pdf_with_image('Specification B with a blue figure', png('blue')), png('blue')),
+    }
+
+    links = {}
+    with offline_pipeline():
+        for url, (data, _) in documents.items():
+            with metrics.page(url) as page:
+                result = processor._convert_pdf(url, page, {'pdf': True, 'content': data})
+            [links[url]] = re.findall(r'!\[[^\]]*\]\(([^)]+)\)', result['markdown'])
+
+    assert links['https://example.com/a/spec.pdf'] != links['https://example.com/b/spec.pdf']
+    for url, link in links.items():
+        assert link.startswith('imgs/spec-')
+        with Image.open(os.path.join(processor.output_dir, link)) as saved:
+            expected = Image.open(io.BytesIO(documents[url][1]))
+            assert saved.convert('RGB').getpixel((60, 60)) == expected.convert('RGB').getpixel((60, 60))
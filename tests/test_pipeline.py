@@ -0,0 +1,103 @@
+import threading
+import time
+
+import pytest
+
+from src import deadlines
+from src.deadlines import Deadline, scope
+from src.metrics import metrics
+from src.pipeline import StageGraph
+
+
+def sleeper(seconds: float, value=None):
+    def stage(*_):
+        time.sleep(seconds)
+        return value
+    return stage
+
+
+def test_add_rejects_duplicates_and_unknown_dependencies():
+    graph = StageGraph().add('fetch', lambda: 1)
+    with pytest.raises(ValueError, match='Duplicate'):
+        graph.add('fetch', lambda: 2)
+    with pytest.raises(ValueError, match='unknown stages: capture'):
+        graph.add('crop', lambda captured: captured, ('capture',))
+
+
+def test_when_skips_a_stage_and_everything_depending_on_it():
+    called = []
+    graph = StageGraph()
+    graph.add('fetch', lambda: ('pdf', b'%PDF'))
+    graph.add('analyze', lambda fetched: called.append('analyze'), ('fetch',), when=lambda fetched: fetched[0] == 'html')
+    graph.add('chunk', lambda fetched, analysis: called.append('chunk'), ('fetch', 'analyze'))
+    graph.add('title', lambda fetched: 'Title', ('fetch',))
+    graph.add('summary', lambda title, chunks: called.append('summary'), ('title', 'chunk'))
+    run = graph.run()
+
+    assert called == []
+    assert run.skipped == {'analyze', 'chunk', 'summary'}
+    assert run.results == {'fetch': ('pdf', b'%PDF'), 'analyze': None, 'chunk': None, 'title': 'Title',
+                           'summary': None}
+    assert run.report()['skipped'] == ['analyze', 'chunk', 'summary']
+    assert set(run.timings) == {'fetch', 'title'}
+
+
+def test_an_error_is_raised_after_running_stages_finish():
+    slow_started = threading.Event()
+    slow_finished = threading.Event()
+    called = []
+
+    def slow():
+        slow_started.set()
+        time.sleep(0.2)
+        slow_finished.set()
+
+    def fail():
+        slow_started.wait(5)
+        raise ValueError('vision failed')
+
+    graph = StageGraph()
+    graph.add('capture', slow)
+    graph.add('vision', fail)
+    graph.add('ocr', lambda captured: called.append('ocr'), ('capture',))
+    with pytest.raises(ValueError, match='vision failed'):
+        graph.run()
+    # The running stage was waited for, and nothing new started after the error
+    assert slow_finished.is_set()
+    assert called == []
+
+
+def test_independent_stages_overlap_and_the_critical_path_is_the_slowest_chain():
+    graph = StageGraph()
+    graph.add('fetch', sleeper(0.05, 'html'))
+    graph.add('capture', sleeper(0.3, 'png'))
+    graph.add('analyze', sleeper(0.02), ('fetch',))
+    graph.add('vision', sleeper(0.1), ('capture',))
+    graph.add('chunk', sleeper(0.05), ('fetch', 'analyze', 'vision'))
+    run = graph.run()
+
+    assert [name for name, _ in run.critical_path()] == ['capture', 'vision', 'chunk']
+    report = run.report()
+    assert report['critical_path_seconds'] == pytest.approx(0.45, abs=0.1)
+    # fetch and analyze ran alongside capture, so the wall time is the critical path, not the sum
+    assert report['wall_seconds'] < report['stage_seconds']
+    assert report['wall_seconds'] == pytest.approx(report['critical_path_seconds'], abs=0.1)
+    assert run.describe().startswith('capture ')
+    assert StageGraph().run().critical_path() == []
+
+
+def test_stage_threads_share_the_callers_page_and_deadline():
+    deadline = Deadline(30)
+    seen = []
+
+    def stage():
+        seen.append(deadlines.current())
+        metrics.inc('stage_calls')
+
+    with metrics.page('https://example.com/a') as page, scope(deadline):
+        graph = StageGraph()
+        graph.add('one', stage)
+        graph.add('two', stage)
+        graph.run()
+    assert seen == [deadline, deadline]
+    assert page['counters']['stage_calls'] == 2
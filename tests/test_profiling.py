@@ -0,0 +1,23 @@
+import glob
+import pstats
+
+from src.pipeline import StageGraph
+from src.profiling import ConversionProfiler
+
+
+def busy_stage_work():
+    return sum(i * i for i in range(200000))
+
+
+def test_cpu_profile_includes_stage_threads(tmp_path):
+    profiler = ConversionProfiler(str(tmp_path), cpu=True)
+    with profiler.profile('https://example.com/page'):
+        graph = StageGraph()
+        graph.add('fetch', busy_stage_work)
+        graph.add('analyze', lambda fetched: busy_stage_work(), ('fetch',))
+        graph.run()
+
+    [dump] = glob.glob(str(tmp_path / '*.pstats'))
+    functions = {name: stat for (_, _, name), stat in pstats.Stats(dump).stats.items()}
+    # Called once on each of the two stage threads, never on the calling thread
+    assert functions['busy_stage_work'][1] == 2
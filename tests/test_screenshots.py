@@ -0,0 +1,50 @@
+import io
+
+from PIL import Image
+
+from src import screenshots
+from src.screenshots import ScreenshotStore
+
+
+def png(color) -> bytes:
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 48), color).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def test_identical_capture_is_stored_once(tmp_path):
+    with ScreenshotStore(str(tmp_path)) as store:
+        first = store.put(png('white'), 'https://example.com/a')
+        store.flush()
+        second = store.put(png('white'), 'https://example.com/b')
+        store.flush()
+        assert first['duplicate'] is None and second['duplicate'] == 'exact'
+        assert store.latest('https://example.com/b')['hash'] == first['hash']
+        assert len(list((tmp_path / 'objects').rglob('*.png'))) == 1
+
+
+def test_failed_write_is_not_treated_as_stored(tmp_path, monkeypatch):
+    url = 'https://example.com/a'
+    open_image = Image.open
+    failures = []
+
+    def failing_open(*args, **kwargs):
+        # The first write fails after the blob file is in place, so the index transaction rolls back
+        if not failures:
+            failures.append(True)
+            raise OSError('disk full')
+        return open_image(*args, **kwargs)
+
+    with ScreenshotStore(str(tmp_path)) as store:
+        monkeypatch.setattr(screenshots.Image, 'open', failing_open)
+        stored = store.put(png('white'), url)
+        store.flush()
+        assert failures
+        assert store.latest(url) is None
+
+        # The same capture again is new content, and this time its blob is indexed
+        retried = store.put(png('white'), url)
+        store.flush()
+        assert retried['duplicate'] is None
+        assert store.latest(url)['hash'] == stored['hash']
+        assert store.history(url)[0]['hash'] == stored['hash']
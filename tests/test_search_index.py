@@ -0,0 +1,119 @@
+import os
+
+from src.search_index import SearchIndex, fts_query, split_sections
+
+GUIDE = """Intro text before any heading.
+
+# Install
+
+Use pip.
+
+## Linux ##
+
+```bash
+# not a heading, just a shell comment
+pip install client
+```
+
+## Windows
+
+Use the installer.
+
+# Usage
+
+Call the client.
+"""
+
+
+def test_split_sections_builds_heading_paths():
+    sections = split_sections(GUIDE)
+    assert [path for path, _ in sections] == ['', 'Install', 'Install > Linux', 'Install > Windows', 'Usage']
+    assert sections[0][1] == 'Intro text before any heading.'
+    # The '#' line inside the fence stays in the body
+    assert '# not a heading, just a shell comment' in sections[2][1]
+    assert sections[3][1] == 'Use the installer.'
+
+
+def test_split_sections_keeps_empty_headed_sections_but_not_empty_preambles():
+    assert split_sections('# Title\n\n## Empty\n## Next\nText') == [
+        ('Title', ''), ('Title > Empty', ''), ('Title > Next', 'Text')]
+    assert split_sections('') == []
+
+
+def test_fts_query_quotes_terms():
+    assert fts_query('pip AND "install" -x') == '"pip" "AND" "install" "x"'
+    assert fts_query('!!!') == ''
+
+
+def test_documents_are_reindexed_only_when_their_text_changes(tmp_path):
+    with SearchIndex(str(tmp_path / 'search.db')) as index:
+        assert index.index_document('doc-001-guide.md', GUIDE, url='https://example.com/guide')
+        assert not index.index_document('doc-001-guide.md', GUIDE, title='Guide')
+        assert index.stats() == {'documents': 1, 'sections': 5}
+        assert index.search('windows')[0]['title'] == 'Guide'
+
+        assert index.index_document('doc-001-guide.md', '# Install\n\nUse conda.')
+        assert index.stats() == {'documents': 1, 'sections': 1}
+        assert index.search('windows') == []
+        assert index.search('conda')[0]['url'] == 'https://example.com/guide'
+
+
+def test_files_are_reread_only_when_their_mtime_changes(tmp_path):
+    path = tmp_path / 'doc-002-usage.md'
+    path.write_text('# Usage\n\nCall the client.', encoding='utf-8')
+    with SearchIndex(str(tmp_path / 'search.db')) as index:
+        assert index.index_file(str(path))
+        hit = index.search('client')[0]
+        assert (hit['prefix'], hit['sequence']) == ('doc', 2)
+
+        # Same mtime: skipped even though the text changed behind the index's back
+        mtime = os.path.getmtime(path)
+        path.write_text('# Usage\n\nCall the server.', encoding='utf-8')
+        os.utime(path, (mtime, mtime))
+        assert not index.index_file(str(path))
+        assert index.search('server') == []
+
+        os.utime(path, (mtime + 10, mtime + 10))
+        assert index.index_file(str(path))
+        assert index.search('server')
+
+
+def test_index_directory_drops_documents_whose_files_are_gone(tmp_path):
+    docs = tmp_path / 'output'
+    docs.mkdir()
+    for name, text in [('doc-001-a.md', '# Alpha\n\nalpha text'), ('doc-002-b.md', '# Beta\n\nbeta text'),
+                       ('doc_combined.md', '# Alpha\n\nalpha again'), ('other-001-c.md', '# Gamma\n\ngamma')]:
+        (docs / name).write_text(text, encoding='utf-8')
+    with SearchIndex(str(tmp_path / 'search.db')) as index:
+        assert index.index_directory(str(docs), prefix='doc') == {'indexed': 2, 'unchanged': 0, 'removed': 0}
+        assert index.search('gamma') == []
+        assert len(index.search('alpha')) == 1
+
+        (docs / 'doc-002-b.md').unlink()
+        assert index.index_directory(str(docs), prefix='doc') == {'indexed': 0, 'unchanged': 1, 'removed': 1}
+        assert index.search('beta') == []
+        # Documents that did not come from this directory are left alone
+        index.index_document('doc-009-record.md', '# Beta\n\nbeta from an archive record', prefix='doc')
+        assert index.index_directory(str(docs), prefix='doc')['removed'] == 0
+        assert len(index.search('beta')) == 1
+
+
+def test_search_ranks_heading_matches_first_and_filters_by_prefix(tmp_path):
+    with SearchIndex(str(tmp_path / 'search.db')) as index:
+        index.index_document('doc-001-body.md', '# Overview\n\nThe cache keeps drafts for a while.', prefix='doc')
+        index.index_document('doc-002-heading.md', '# Cache\n\nKeeps drafts for a while.', prefix='doc')
+        index.index_document('api-001-cache.md', '# Cache\n\nKeeps drafts.', prefix='api')
+
+        hits = index.search('cache', prefix='doc')
+        assert [hit['doc_key'] for hit in hits] == ['doc-002-heading.md', 'doc-001-body.md']
+        assert hits[0]['score'] > hits[1]['score']
+        assert '[cache]' in hits[1]['snippet'].lower()
+        assert {hit['prefix'] for hit in index.search('cache')} == {'doc', 'api'}
+        assert index.search('cache', limit=1, prefix='api')[0]['doc_key'] == 'api-001-cache.md'
+
+        # Porter stemming, raw FTS5 syntax and full section text
+        assert index.search('keeping drafts', prefix='doc')
+        assert [hit['doc_key'] for hit in index.search('heading:cache NOT body:while', raw=True)] == [
+            'api-001-cache.md']
+        assert index.section('doc-002-heading.md', 0) == 'Cache\n\nKeeps drafts for a while.'
+        assert index.search('') == []
@@ -0,0 +1,112 @@
+import json
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+import requests
+
+from src.deadlines import Deadline, DeadlineExceeded
+from src.server import ConversionService, make_handler
+
+
+class StubScraper:
+    def _ensure_driver(self):
+        pass
+
+    def _quit_driver(self):
+        pass
+
+
+class StubProcessor:
+    """Converts instantly, or as the URL asks: /slow waits for a release, /timeout runs out of time"""
+
+    def __init__(self, release: threading.Event):
+        self.visual_scraper = StubScraper()
+        self.url_timeout = None
+        self.release = release
+
+    def convert(self, url):
+        if url.endswith('/slow'):
+            self.release.wait(10)
+        if url.endswith('/timeout'):
+            raise DeadlineExceeded('draft', Deadline(0, label=url))
+        return {'url': url, 'title': 'Stub', 'strategy': 'html', 'markdown': f"# {url}\n", 'timed_out': False}
+
+
+@pytest.fixture
+def release():
+    event = threading.Event()
+    yield event
+    event.set()
+
+
+@pytest.fixture
+def api(release):
+    """Base URL of a server backed by stub processors"""
+    service = ConversionService(workers=2, processor_factory=lambda: StubProcessor(release))
+    service.start()
+    server = ThreadingHTTPServer(('127.0.0.1', 0), make_handler(service))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+    release.set()
+    service.shutdown(grace_period=5)
+
+
+def test_convert_returns_the_result(api):
+    response = requests.post(f"{api}/convert", json={'url': 'https://example.com/a'})
+    assert response.status_code == 200
+    assert response.json()['markdown'] == '# https://example.com/a\n'
+
+
+def test_async_job_is_polled_for_its_result(api, release):
+    response = requests.post(f"{api}/convert", json={'url': 'https://example.com/slow', 'async': True})
+    assert response.status_code == 202
+    status_url = api + response.json()['status_url']
+    assert requests.get(status_url).json()['status'] in ('queued', 'running')
+    release.set()
+    for _ in range(100):
+        job = requests.get(status_url).json()
+        if job['status'] == 'done':
+            break
+        threading.Event().wait(0.05)
+    assert job['result']['title'] == 'Stub'
+
+
+def test_sync_caller_gets_the_job_id_when_it_outlives_the_timeout(api):
+    response = requests.post(f"{api}/convert", json={'url': 'https://example.com/slow', 'timeout': 0.1})
+    assert response.status_code == 202
+    assert response.json()['status_url'].startswith('/jobs/')
+
+
+def test_conversion_deadline_is_a_gateway_timeout(api):
+    response = requests.post(f"{api}/convert", json={'url': 'https://example.com/timeout'})
+    assert response.status_code == 504
+    assert response.json()['status'] == 'timeout'
+
+
+@pytest.mark.parametrize('body', [{'url': 'https://example.com/a', 'timeout': 'soon'},
+                                  {'url': 'https://example.com/a', 'timeout': -1},
+                                  {'url': 'https://example.com/a', 'timeout': None},
+                                  {'timeout': 5}])
+def test_bad_requests_are_rejected(api, body):
+    response = requests.post(f"{api}/convert", data=json.dumps(body))
+    assert response.status_code == 400
+    assert requests.get(f"{api}/health").json()['jobs_tracked'] == 0
+
+
+def test_start_raises_when_a_worker_cannot_build_its_processor(release):
+    built = []
+
+    def factory():
+        if built:
+            raise OSError('Chrome not found')
+        built.append(StubProcessor(release))
+        return built[0]
+
+    service = ConversionService(workers=2, processor_factory=factory)
+    with pytest.raises(RuntimeError, match='Chrome not found'):
+        service.start()
+    # The worker that did start is stopped again
+    assert not any(thread.is_alive() for thread in service._threads)
@@ -0,0 +1,93 @@
+import os
+
+import pytest
+
+from src.sinks import (FileSink, JSONLSink, SQLiteSink, build_record, export_archive, iter_records, open_sink,
+                       sequence_filename)
+
+PNG = b'\x89PNG\r\n\x1a\nfake screenshot'
+
+
+def result(url: str, markdown: str, **extra) -> dict:
+    base = {'url': url, 'markdown': markdown, 'title': 'Title', 'strategy': 'html',
+            'chunk_fingerprints': ['ab', 'cd'], 'timings': {'draft': 1.5}, 'screenshot': PNG}
+    base.update(extra)
+    return base
+
+
+RESULTS = [
+    result('https://example.com/docs/Getting Started/', '# Getting started\n'),
+    result('https://example.com/docs/api.html', '# API\n\nPartial', timed_out=True),
+    result('https://example.com/', '# Home\n', screenshot=None),
+]
+
+
+def write_all(sink, results=RESULTS, prefix='doc'):
+    outputs = [sink.write(build_record(r, number, prefix)) for number, r in enumerate(results, 1)]
+    sink.close()
+    return outputs
+
+
+def test_sequence_filename_cleans_and_truncates():
+    assert sequence_filename('https://example.com/docs/Getting Started/', 'doc', 1) == 'doc-001-getting-started.md'
+    assert sequence_filename('https://example.com/', 'doc', 12) == 'doc-012-.md'
+    assert len(sequence_filename('https://example.com/' + 'a' * 200, 'doc', 3)) == 49
+
+
+def test_file_sink_writes_one_file_per_page(tmp_path):
+    outputs = write_all(FileSink(str(tmp_path)))
+    assert [os.path.basename(path) for path in outputs] == [
+        sequence_filename(r['url'], 'doc', number) for number, r in enumerate(RESULTS, 1)]
+    with open(outputs[1], encoding='utf-8') as f:
+        assert f.read() == '# API\n\nPartial'
+
+
+@pytest.mark.parametrize('name', ['pages.db', 'pages.jsonl', 'pages.jsonl.gz'])
+@pytest.mark.parametrize('screenshots', [False, True])
+def test_archive_round_trip(tmp_path, name, screenshots):
+    path = str(tmp_path / name)
+    sink = open_sink(path, store_screenshots=screenshots)
+    assert isinstance(sink, SQLiteSink if name.endswith('.db') else JSONLSink)
+    # A batch size of 2 makes the writes land in more than one flush (more than one gzip member)
+    sink.batch_size = 2
+    outputs = write_all(sink)
+    assert outputs == [f"{path}#doc-001", f"{path}#doc-002", f"{path}#doc-003"]
+
+    records = list(iter_records(path))
+    assert [record['url'] for record in records] == [r['url'] for r in RESULTS]
+    first, second, third = records
+    assert (first['sequence'], first['prefix'], first['title'], first['strategy']) == (1, 'doc', 'Title', 'html')
+    assert first['markdown'] == '# Getting started\n'
+    assert first['chunk_fingerprints'] == ['ab', 'cd'] and first['timings'] == {'draft': 1.5}
+    assert not first['timed_out'] and second['timed_out']
+    assert first['markdown_sha256'] == build_record(RESULTS[0], 1, 'doc')['markdown_sha256']
+    assert first['screenshot'] == (PNG if screenshots else None)
+    assert third['screenshot'] is None
+
+
+@pytest.mark.parametrize('name', ['pages.db', 'pages.jsonl.gz'])
+def test_export_archive_rebuilds_the_file_layout(tmp_path, name):
+    path = str(tmp_path / name)
+    sink = open_sink(path, store_screenshots=True)
+    write_all(sink)
+    # The page is converted again in a later run, appending a second record for it
+    sink = open_sink(path, store_screenshots=True)
+    sink.write(build_record(result('https://example.com/docs/api.html', '# API\n\nComplete'), 2, 'doc'))
+    sink.close()
+
+    files_dir = tmp_path / 'files'
+    direct_dir = tmp_path / 'direct'
+    write_all(FileSink(str(direct_dir)))
+    exported = export_archive(path, str(files_dir), screenshots=True)
+
+    # Same names as the file sink gives the same pages
+    assert sorted(os.path.basename(p) for p in exported) == sorted(os.listdir(direct_dir))
+    api = files_dir / sequence_filename('https://example.com/docs/api.html', 'doc', 2)
+    assert api.read_text(encoding='utf-8') == '# API\n\nComplete'
+    assert (files_dir / 'doc-001-getting-started.png').read_bytes() == PNG
+    assert not (files_dir / 'doc-003-.png').exists()
+
+    first_dir = tmp_path / 'first'
+    export_archive(path, str(first_dir), latest_only=False)
+    assert (first_dir / api.name).read_text(encoding='utf-8') == '# API\n\nPartial'
+    assert not list(first_dir.glob('*.png'))
@@ -0,0 +1,166 @@
+import gc
+import os
+import sys
+import json
+import subprocess
+import http.server
+import tracemalloc
+from unittest import mock
+
+import pytest
+
+from src.benchmark import FakeVisualScraper, FixtureServer, offline_pipeline
+from src.streaming import StreamingChunker, stream_chunks
+
+SECTION = ('<h2>Section {i}</h2>\n<p>' + 'request model token stream batch latency markdown ' * 20 + '</p>\n'
+           '<table><tr><th>Key</th><th>Value</th></tr><tr><td>k{i}</td><td>{i}</td></tr></table>\n')
+
+
+def generated_page(sections: int):
+    """Yield a large page piece by piece, so the page itself is never held in memory"""
+    yield '<html><head><title>Huge Page</title><script>var x = 1;</script></head><body><main><h1>Huge Page</h1>\n'
+    for i in range(sections):
+        yield SECTION.format(i=i)
+    yield '</main></body></html>'
+
+
+def page_text(sections: int) -> str:
+    return ''.join(generated_page(sections))
+
+
+class GeneratedPageHandler(http.server.BaseHTTPRequestHandler):
+    """Streams generated_page(sections) from the query string, without a Content-Length"""
+    requests_seen = []
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.requests_seen.append(self.path)
+        sections = int(self.path.rsplit('=', 1)[-1])
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.end_headers()
+        try:
+            for piece in generated_page(sections):
+                self.wfile.write(piece.encode('utf-8'))
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+def traced_peak(fn) -> int:
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+@pytest.mark.parametrize('chunk_chars', [20000, 100000])
+def test_chunker_peak_memory_tracks_the_chunk_size(chunk_chars):
+    sections = 5000  # About 5.5 MB of HTML
+    page_size = len(page_text(sections))
+    produced = []
+
+    def run():
+        chunker = StreamingChunker(chunk_chars=chunk_chars)
+        for chunk in stream_chunks(generated_page(sections), chunker):
+            produced.append(len(chunk))
+
+    peak = traced_peak(run)
+    assert page_size > 5 * 1024 * 1024
+    assert sum(produced) > page_size // 2
+    assert max(produced) <= 2 * chunk_chars + len(SECTION) * 2
+    assert peak < 10 * chunk_chars, f"peak {peak} bytes for {chunk_chars}-character chunks"
+
+
+def test_large_page_conversion_peak_memory_tracks_the_chunk_size(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    from src.convert import ContentProcessor
+    page = page_text(5000)
+    drafted = []
+
+    def draft(chunk, visual_analysis):
+        drafted.append(len(chunk))
+        return ['# Drafted']
+
+    with FixtureServer({'/large.html': page}) as server, offline_pipeline():
+        processor = ContentProcessor()
+        # A small capture, so the screenshot's fixed cost does not hide the streaming cost
+        processor.visual_scraper = FakeVisualScraper(str(tmp_path), size=(320, 480))
+        processor.save_screenshots = False
+        processor.large_page_threshold = 1024 * 1024
+        processor.large_page_chunk_size = 50000
+        url = server.url('/large.html')
+        with mock.patch.object(processor, 'draft_chunk', draft):
+            results = []
+            peak = traced_peak(lambda: results.append(processor.convert(url)))
+
+    assert results[0]['strategy'] == 'html-streamed'
+    assert results[0]['title'] == 'Huge Page'
+    assert len(drafted) > 50
+    # What is held at once is a few chunks plus the parser state, however large the page
+    assert peak < 40 * processor.large_page_chunk_size, f"peak {peak} bytes for a {len(page)}-character page"
+
+
+def test_large_page_is_downloaded_only_once(tmp_path, monkeypatch, serve_handler):
+    monkeypatch.chdir(tmp_path)
+    from src.convert import ContentProcessor
+    GeneratedPageHandler.requests_seen = []
+    url = serve_handler(GeneratedPageHandler) + '/large.html?sections=2000'
+
+    with offline_pipeline():
+        processor = ContentProcessor()
+        processor.visual_scraper = FakeVisualScraper(str(tmp_path), size=(320, 480))
+        processor.save_screenshots = False
+        processor.large_page_threshold = 256 * 1024
+        processor.large_page_chunk_size = 50000
+        with mock.patch.object(processor, 'draft_chunk', lambda chunk, visual_analysis: ['# Drafted']):
+            result = processor.convert(url)
+
+    assert result['strategy'] == 'html-streamed'
+    assert result['title'] == 'Huge Page'
+    # The size only shows while downloading, and the streaming pass reuses what prepare() spooled
+    assert GeneratedPageHandler.requests_seen == ['/large.html?sections=2000']
+
+
+RSS_SCRIPT = """
+import json, resource, sys
+from unittest import mock
+from src.benchmark import FakeVisualScraper, offline_pipeline
+from src.convert import ContentProcessor
+
+def max_rss():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+with offline_pipeline():
+    processor = ContentProcessor()
+    processor.visual_scraper = FakeVisualScraper('.', size=(320, 480))
+    processor.save_screenshots = False
+    processor.large_page_threshold = 1024 * 1024
+    processor.large_page_chunk_size = 50000
+    with mock.patch.object(processor, 'draft_chunk', lambda chunk, visual_analysis: ['# Drafted']):
+        # A small streamed page first, so imports and caches are already in the baseline
+        processor.convert(sys.argv[1] + '?sections=2000')
+        baseline = max_rss()
+        result = processor.convert(sys.argv[1] + '?sections=20000')
+print(json.dumps({'baseline': baseline, 'peak': max_rss(), 'strategy': result['strategy']}))
+"""
+
+
+def test_large_page_conversion_resident_memory_stays_flat(tmp_path, serve_handler):
+    # tracemalloc only sees Python allocations; the resident set also covers parser and C buffers
+    url = serve_handler(GeneratedPageHandler) + '/large.html'
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=root)
+    completed = subprocess.run([sys.executable, '-c', RSS_SCRIPT, url], cwd=tmp_path, env=env,
+                               capture_output=True, text=True, timeout=300)
+    assert completed.returncode == 0, completed.stderr[-2000:]
+    usage = json.loads(completed.stdout.strip().splitlines()[-1])
+    page_size = len(page_text(20000))
+    assert usage['strategy'] == 'html-streamed'
+    assert page_size > 20 * 1024 * 1024
+    growth = usage['peak'] - usage['baseline']
+    assert growth < page_size // 4, f"resident set grew {growth} bytes for a {page_size}-byte page"